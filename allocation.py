@@ -0,0 +1,133 @@
+"""First-expired-first-out (FEFO) batch allocation for sales lines.
+
+Each product has a heap of its batches ordered by best_before. Remaining
+quantities come from the inventory ledger, so allocations follow every
+sale, wastage and delivery recorded through data_manager. Exhausted and
+expired batches are dropped from the heap lazily, when an allocation reaches
+them. A batch whose best_before moves earlier is pushed again under the new
+date, and the entry under the old one is skipped when it comes up.
+"""
+import heapq
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+import data_manager as dm
+import ledger
+import shared_cache
+
+
+class FefoAllocator:
+    """Proposes batch splits for a product quantity, earliest best_before first."""
+
+    def __init__(self, inventory):
+        self._ledger = inventory
+        self._lock = threading.Lock()
+        self._heaps = defaultdict(list)   # product -> [(best_before, batch)]
+        self._in_heap = set()             # (product, batch) currently queued
+        self._best_before = {}            # (product, batch) -> earliest best_before
+        self._synced = {}                 # table -> shared_cache generation last reloaded for
+
+    def add_batch(self, product_name, batch_number, best_before):
+        """Queue a batch, or re-queue it after its stock came back."""
+        if not product_name or not batch_number:
+            return
+        key = (product_name, str(batch_number))
+        best_before = pd.to_datetime(best_before, errors='coerce')
+        if pd.isna(best_before):
+            best_before = self._best_before.get(key, pd.Timestamp.max)
+        with self._lock:
+            earliest = self._best_before.get(key)
+            if earliest is None or best_before < earliest:
+                self._best_before[key] = best_before
+            elif key in self._in_heap:
+                return
+            heapq.heappush(self._heaps[product_name], (self._best_before[key], key[1]))
+            self._in_heap.add(key)
+
+    def load(self, stock_in_df):
+        """Queue every batch received so far."""
+        if stock_in_df.empty:
+            return
+        for row in stock_in_df[['product_name', 'batch_number', 'best_before']].itertuples(index=False):
+            self.add_batch(row.product_name, row.batch_number, row.best_before)
+
+    def apply(self, table, action, records):
+        """data_manager write notification: re-queue batches that gained stock."""
+        if action == "refresh" and table in ("stock_in", "stock_out", "wastage"):
+            # Written elsewhere; any batch may have gained stock
+            generation = shared_cache.generation(table)
+            if self._synced.get(table) != generation:
+                self.load(shared_cache.table("stock_in"))
+                self._synced[table] = generation
+        elif (table == "stock_in" and action == "insert") or \
+                (table in ("stock_out", "wastage") and action == "delete"):
+            for record in records:
+                self.add_batch(record.get('product_name'), record.get('batch_number'),
+                               record.get('best_before'))
+
+    def propose(self, product_name, quantity, reserved=None, on_date=None):
+        """Split `quantity` of a product across batches, first expiring first.
+
+        reserved maps batch_number -> quantity already taken by lines that are
+        not saved yet. Batches past their best_before on `on_date` are
+        skipped. Returns (allocations, shortfall) where allocations is a list
+        of dicts with batch_number, best_before and quantity.
+        """
+        reserved = reserved or {}
+        on_date = pd.Timestamp(on_date) if on_date is not None else None
+        # Past this date on both on_date and today, a batch can never be proposed again
+        expired_before = min(on_date, pd.Timestamp.today().normalize()) if on_date is not None else None
+        allocations = []
+        needed = quantity
+
+        with self._lock:
+            heap = self._heaps.get(product_name, [])
+            kept = []
+            while heap and needed > 0:
+                best_before, batch = heapq.heappop(heap)
+                if best_before != self._best_before.get((product_name, batch)):
+                    continue    # re-queued under an earlier date
+                if expired_before is not None and best_before < expired_before:
+                    self._in_heap.discard((product_name, batch))
+                    continue
+                available, _ = self._ledger.batch_on_hand(product_name, batch)
+                if available <= 0:
+                    # Exhausted: leave it out until stock comes back
+                    self._in_heap.discard((product_name, batch))
+                    continue
+                kept.append((best_before, batch))
+                if on_date is not None and best_before < on_date:
+                    continue
+                free = available - reserved.get(batch, 0)
+                if free <= 0:
+                    continue
+                take = min(free, needed)
+                allocations.append({
+                    'batch_number': batch,
+                    'best_before': None if best_before == pd.Timestamp.max else best_before.date(),
+                    'quantity': int(take) if float(take).is_integer() else take
+                })
+                needed -= take
+            for item in kept:
+                heapq.heappush(heap, item)
+
+        return allocations, max(needed, 0)
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+def get_allocator():
+    """Return the process-wide allocator, building it on first use."""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            # The ledger subscribes first, so levels are current when we read them
+            allocator = FefoAllocator(ledger.get_ledger())
+            dm.subscribe(allocator.apply)
+            allocator._synced = {table: shared_cache.generation(table) for table in ("stock_in", "stock_out", "wastage")}
+            allocator.load(shared_cache.table("stock_in"))
+            _allocator = allocator
+        return _allocator
@@ -1,12 +1,32 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import plotly.express as px
-import plotly.graph_objects as go
+import os
+import allocation
+import catalog
+import change_feed
+import cube
 import data_manager as dm
+import forecasting
+import ledger
+import order_numbers
+import partitions
+import profiling
+import range_totals
+import reorder
+import reports
+import shared_cache
+import styles
 import utils
+import warmer
+import wastage_analytics
 import uuid
 
+# Loaded by the first page that draws a chart or market-basket report
+px = utils.LazyModule("plotly.express")
+go = utils.LazyModule("plotly.graph_objects")
+basket = utils.LazyModule("basket")
+
 # Page configuration
 st.set_page_config(
     page_title="Tea Inventory & Sales Dashboard",
@@ -16,109 +36,32 @@ st.set_page_config(
 )
 
 # Apply custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: 700;
-        color: #2c3e50;
-        margin-bottom: 1rem;
-    }
-    .sub-header {
-        font-size: 1.8rem;
-        font-weight: 600;
-        color: #34495e;
-        margin-top: 1rem;
-        margin-bottom: 0.5rem;
-    }
-    .card {
-        background-color: #f8f9fa;
-        border-radius: 0.5rem;
-        padding: 1.5rem;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 1rem;
-    }
-    .stat-card {
-        text-align: center;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        background-color: #f1f8e9;
-    }
-    .metric-label {
-        font-size: 0.9rem;
-        color: #546e7a;
-    }
-    .metric-value {
-        font-size: 1.8rem;
-        font-weight: bold;
-        color: #2e7d32;
-    }
-    .order-container {
-        border: 1px solid #e0e0e0;
-        border-radius: 0.5rem;
-        padding: 1rem;
-        margin-bottom: 0.8rem;
-        background-color: white;
-    }
-    .error-msg {
-        color: #d32f2f;
-        background-color: #ffebee;
-        padding: 0.5rem;
-        border-radius: 0.25rem;
-        margin-bottom: 0.5rem;
-    }
-    .success-msg {
-        color: #2e7d32;
-        background-color: #e8f5e9;
-        padding: 0.5rem;
-        border-radius: 0.25rem;
-        margin-bottom: 0.5rem;
-    }
-    .badge {
-        display: inline-block;
-        padding: 0.25rem 0.5rem;
-        border-radius: 1rem;
-        font-size: 0.75rem;
-        font-weight: 600;
-        color: white;
-    }
-    .badge-success {
-        background-color: #4caf50;
-    }
-    .badge-warning {
-        background-color: #ff9800;
-    }
-    .badge-danger {
-        background-color: #f44336;
-    }
-    .small-button {
-        padding: 0.25rem 0.5rem;
-        font-size: 0.8rem;
-    }
-    .footer {
-        text-align: center;
-        margin-top: 3rem;
-        font-size: 0.8rem;
-        color: #78909c;
-    }
-    .tab-content {
-        padding: 1rem 0;
-    }
-    .color-primary {
-        color: #1976d2;
-    }
-    .form-section {
-        background-color: #f8f9fa;
-        padding: 1.5rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1.5rem;
-    }
-    .table-actions {
-        display: flex;
-        gap: 0.5rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(styles.CUSTOM_CSS, unsafe_allow_html=True)
+
+# Orders shown per page of search results
+SEARCH_PAGE_SIZE = 50
+
+# Dashboard metric periods: label -> days back from today (None for all time)
+METRIC_PERIODS = {"All Time": None, "Last 30 Days": 30, "Last 90 Days": 90, "Last 365 Days": 365}
+
+# Sales cube dimensions as shown in the drill-down report, and its default path
+DIMENSION_LABELS = {"day": "Day", "month": "Month", "product": "Product", "type": "Type",
+                    "customer": "Customer", "delivery_method": "Delivery Method"}
+DRILL_PATH = ["month", "product", "customer"]
+
+# Product types offered in the entry forms, besides any the catalogue fills in
+PRODUCT_TYPES = ["tea", "gear", "books"]
+
+# Catalogue fields copied into each entry form: field -> widget key
+SALES_LOOKUP_FIELDS = {'name': 'new_prod_name', 'type': 'new_prod_type', 'size': 'new_size',
+                       'sku': 'new_sku', 'price': 'new_price'}
+EDIT_LOOKUP_FIELDS = {'name': 'edit_prod_name', 'type': 'edit_prod_type', 'size': 'edit_size',
+                      'sku': 'edit_sku', 'price': 'edit_price'}
+STOCK_LOOKUP_FIELDS = {'name': 'stock_prod_name', 'type': 'stock_prod_type',
+                       'supplier_name': 'stock_supplier', 'package_size': 'stock_package_size',
+                       'cost_per_unit': 'stock_price'}
+WASTAGE_LOOKUP_FIELDS = {'name': 'waste_prod_name', 'package_size': 'waste_package_size',
+                         'cost_per_kg': 'waste_price_kg'}
 
 # Initialize session state
 if 'products' not in st.session_state:
@@ -135,6 +78,15 @@ if 'notifications' not in st.session_state:
     st.session_state.notifications = []
 if 'deleted_product_index' not in st.session_state:
     st.session_state.deleted_product_index = None
+if 'suggested_order' not in st.session_state:
+    st.session_state.suggested_order = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+if 'profiling' not in st.session_state:
+    st.session_state.profiling = profiling.normalize_mode(profiling.PROFILE_MODE)
+# ?profile=1 or ?profile=capture turns profiling on for this session, ?profile=0 off
+if 'profile' in st.query_params:
+    st.session_state.profiling = profiling.normalize_mode(st.query_params['profile'])
 
 def add_notification(message, type="info"):
     """Add a notification to be displayed to the user"""
@@ -147,6 +99,7 @@ def add_notification(message, type="info"):
     })
     return notification_id
 
+@profiling.timed
 def show_notifications():
     """Display any active notifications and allow dismissal"""
     if st.session_state.notifications:
@@ -184,6 +137,112 @@ def clear_form():
     st.session_state.editing_order = None
     st.session_state.viewing_order = None
 
+def allocate_batches(product_data, sale_date):
+    """Split an order line across batches, first expired first out.
+
+    Returns the list of lines to add, or None if there is not enough stock.
+    """
+    # Quantities already claimed by lines in the current order
+    reserved = {}
+    for product in st.session_state.products:
+        if product['product_name'] == product_data['product_name']:
+            batch = product.get('batch_number')
+            reserved[batch] = reserved.get(batch, 0) + product.get('quantity', 0)
+
+    allocations, shortfall = allocation.get_allocator().propose(
+        product_data['product_name'], product_data['quantity'],
+        reserved=reserved, on_date=sale_date
+    )
+    if shortfall:
+        available = product_data['quantity'] - shortfall
+        add_notification(
+            f"Only {available:g} of {product_data['product_name']} available in unexpired batches.",
+            "error"
+        )
+        return None
+
+    return [
+        {**product_data, 'batch_number': alloc['batch_number'],
+         'best_before': alloc['best_before'] or product_data['best_before'],
+         'quantity': alloc['quantity']}
+        for alloc in allocations
+    ]
+
+def fill_form_fields(record, fields):
+    """Copy catalogue values into form widgets through their session state keys."""
+    for field, key in fields.items():
+        value = record.get(field)
+        if value is None:
+            continue
+        if isinstance(value, pd.Timestamp):
+            value = value.date()
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if value <= 0:
+                continue    # below every number input's minimum
+            value = float(value)
+        st.session_state[key] = value
+
+def _lookup_typed(prefix, fields):
+    """Find Product callback: an exact SKU fills the form straight away."""
+    st.session_state[f"{prefix}_lookup_choice"] = None
+    product = catalog.get_catalog().by_sku(st.session_state[f"{prefix}_lookup"])
+    if product:
+        _product_chosen(prefix, fields, product)
+
+def _lookup_chosen(prefix, fields):
+    """Matching Products callback."""
+    name = st.session_state[f"{prefix}_lookup_choice"]
+    product = catalog.get_catalog().product(name) if name else None
+    if product:
+        _product_chosen(prefix, fields, product)
+
+def _product_chosen(prefix, fields, product):
+    fill_form_fields(product, fields)
+    st.session_state[f"{prefix}_lookup_product"] = product['name']
+    st.session_state[f"{prefix}_lookup_batch"] = None
+
+def _batch_chosen(prefix, batch_fields):
+    """Batch callback: fill the batch number and its dates."""
+    batch_number = st.session_state[f"{prefix}_lookup_batch"]
+    product = st.session_state.get(f"{prefix}_lookup_product")
+    for batch in catalog.get_catalog().batches(product) if product and batch_number else []:
+        if batch['batch_number'] == batch_number:
+            fill_form_fields(batch, batch_fields)
+
+def show_product_lookup(prefix, fields, batch_fields=None):
+    """Product search above an entry form; choosing a match fills the form.
+
+    Widgets inside a form only report their values on submit, so the search
+    sits outside it and writes the chosen product into the form's widget keys.
+    """
+    try:
+        products = catalog.get_catalog()
+    except Exception as e:
+        print(f"Error building product catalogue: {str(e)}")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        query = st.text_input("🔎 Find Product", key=f"{prefix}_lookup", placeholder="Name or SKU",
+                              on_change=_lookup_typed, args=(prefix, fields))
+    with col2:
+        suggestions = products.suggest(query) if query else []
+        st.selectbox("Matching Products", suggestions, index=None, key=f"{prefix}_lookup_choice",
+                     placeholder="Choose a product" if suggestions else "Type a name to search",
+                     on_change=_lookup_chosen, args=(prefix, fields), disabled=not suggestions)
+    if batch_fields:
+        with col3:
+            product = st.session_state.get(f"{prefix}_lookup_product")
+            batches = [batch['batch_number'] for batch in products.batches(product)] if product else []
+            st.selectbox("Batch", batches, index=None, key=f"{prefix}_lookup_batch",
+                         placeholder="Earliest best before first" if batches else "Choose a product first",
+                         on_change=_batch_chosen, args=(prefix, batch_fields), disabled=not batches)
+
+def type_options(key):
+    """PRODUCT_TYPES plus the type the catalogue put in a form, if it is another one."""
+    current = st.session_state.get(key)
+    return PRODUCT_TYPES + [current] if current and current not in PRODUCT_TYPES else PRODUCT_TYPES
+
 def remove_product(index):
     """Remove a product from the current order"""
     if 0 <= index < len(st.session_state.products):
@@ -193,6 +252,11 @@ def remove_product(index):
     return False
 
 def main():
+    # Tables and reports are kept warm in the background; the warmer also
+    # picks up writes made by other server processes, so poll here only without it
+    if not warmer.start(warm_tasks()):
+        change_feed.poll()
+    
     # Sidebar navigation
     with st.sidebar:
         st.image("https://via.placeholder.com/150x150.png?text=Tea+Shop+Logo", width=150)
@@ -229,17 +293,25 @@ def main():
             st.session_state.editing_order = None
             st.rerun()
         
+        if st.session_state.profiling:
+            if st.button("🩺 Diagnostics", use_container_width=True,
+                       help="Slowest reruns and where their time went"):
+                st.session_state.active_tab = "diagnostics"
+                st.session_state.viewing_order = None
+                st.session_state.editing_order = None
+                st.rerun()
+        
         # Additional info
         st.markdown("---")
         st.markdown("### System Info")
         try:
-            products_count = len(dm.get_products())
+            products_count = len(shared_cache.table("products"))
         except Exception as e:
             products_count = 0
             print(f"Error loading products: {str(e)}")
 
         try:
-            orders_count = len(dm.get_stock_out().drop_duplicates('order_number'))
+            orders_count = count_orders()
         except Exception as e:
             orders_count = 0
             print(f"Error loading orders: {str(e)}")
@@ -247,9 +319,29 @@ def main():
         st.markdown(f"🏷️ **Products**: {products_count}")
         st.markdown(f"🛒 **Orders**: {orders_count}")
         
+        # Products at or below their reorder level
+        try:
+            low_stock = reorder.get_monitor().low_stock()
+        except Exception as e:
+            low_stock = []
+            print(f"Error checking reorder levels: {str(e)}")
+        
+        if low_stock:
+            st.markdown("---")
+            st.markdown("### ⚠️ Stock Alerts")
+            for item in low_stock[:10]:
+                st.markdown(
+                    f"**{item['product_name']}**: {item['on_hand']:g} left "
+                    f"(reorder at {item['reorder_level']:g})"
+                )
+            if len(low_stock) > 10:
+                st.caption(f"and {len(low_stock) - 10} more")
+        
         st.markdown("---")
         st.markdown("### Quick Actions")
         if st.button("🔄 Refresh Data", use_container_width=True):
+            for table in change_feed.ALL_TABLES:
+                dm.mark_changed(table)
             st.session_state.data_changed = True
             add_notification("Data refreshed", "info")
             st.rerun()
@@ -269,24 +361,12 @@ def main():
         show_stock_management()
     elif st.session_state.active_tab == "search":
         show_search_page()
-    else:
-        show_dashboard()  # Default view
-    
-    # Main content area based on active tab
-    if st.session_state.active_tab == "dashboard":
-        show_dashboard()
-    elif st.session_state.active_tab == "sales_entry":
-        if st.session_state.editing_order:
-            show_edit_form()
-        else:
-            show_data_entry_form()
-    elif st.session_state.active_tab == "stock":
-        show_stock_management()
-    elif st.session_state.active_tab == "search":
-        show_search_page()
+    elif st.session_state.active_tab == "diagnostics":
+        show_diagnostics()
     else:
         show_dashboard()  # Default view
 
+@profiling.timed
 def show_order_details(order_number, order_summary, filtered_df):
     """Show detailed view of an order with edit and delete options"""
     # Header with back button
@@ -371,6 +451,7 @@ def show_order_details(order_number, order_summary, filtered_df):
                     st.warning("Click delete again to confirm")
         st.markdown('</div>', unsafe_allow_html=True)
 
+@profiling.timed
 def show_edit_form():
     """Display form for editing an existing order"""
     # Header with navigation
@@ -470,20 +551,25 @@ def show_edit_form():
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.markdown("#### Add New Product to Order")
         
+        st.session_state.setdefault("edit_price", 10.0)
+        st.session_state.setdefault("edit_best_before", (datetime.now() + timedelta(days=30)).date())
+        show_product_lookup("edit", EDIT_LOOKUP_FIELDS,
+                            {'batch_number': 'edit_batch', 'best_before': 'edit_best_before'})
+        
         with st.form(key='edit_product_form'):
             col1, col2, col3, col4 = st.columns(4)
             with col1:
                 product_name = st.text_input("Product Name", key="edit_prod_name")
-                product_type = st.selectbox("Type", ["tea", "gear", "books"], key="edit_prod_type")
+                product_type = st.selectbox("Type", type_options("edit_prod_type"), key="edit_prod_type")
             with col2:
                 quantity = st.number_input("Quantity", min_value=1, value=1, key="edit_quantity")
                 size = st.text_input("Size/Weight", key="edit_size")
             with col3:
-                price_per_unit = st.number_input("Price per Unit ($)", min_value=0.01, value=10.0, step=0.01, key="edit_price")
+                price_per_unit = st.number_input("Price per Unit ($)", min_value=0.01, step=0.01, key="edit_price")
                 sku = st.text_input("SKU", key="edit_sku")
             with col4:
                 batch_number = st.text_input("Batch Number", key="edit_batch")
-                best_before = st.date_input("Best Before", value=datetime.now() + timedelta(days=30), key="edit_best_before")
+                best_before = st.date_input("Best Before", key="edit_best_before")
 
             # Hidden fields with default values
             production_date = datetime.now()
@@ -544,6 +630,7 @@ def show_edit_form():
             st.session_state.active_tab = "dashboard"
             st.rerun()
 
+@profiling.timed
 def show_data_entry_form():
     """Display form for creating a new sales order"""
     st.markdown("## 📝 New Sales Entry")
@@ -564,8 +651,13 @@ def show_data_entry_form():
             customer_name = st.text_input("Customer Name")
         
         with col3:
-            suggested_order = utils.generate_order_number()
-            order_number = st.text_input("Order Number", value=suggested_order)
+            # One number per order, kept across reruns until the order is submitted
+            if st.session_state.suggested_order is None or st.session_state.suggested_order[0] != sale_date:
+                st.session_state.suggested_order = (sale_date, *order_numbers.next_order_number(sale_date))
+            order_number = st.text_input("Order Number", value=st.session_state.suggested_order[1])
+            if st.session_state.suggested_order[2]:
+                st.warning("Order numbers are unavailable from the database, so this one is random "
+                           "and could repeat an existing order. Check it before submitting.")
             delivery_method = st.selectbox(
                 "Delivery Method",
                 options=['Courier', 'Pickup', 'Post']
@@ -578,24 +670,34 @@ def show_data_entry_form():
         st.markdown('<div class="form-section">', unsafe_allow_html=True)
         st.markdown("#### Add Products")
         
+        # Defaults for the fields the product lookup can fill
+        st.session_state.setdefault("new_price", 10.0)
+        st.session_state.setdefault("new_best_before", (datetime.now() + timedelta(days=30)).date())
+        show_product_lookup("new", SALES_LOOKUP_FIELDS,
+                            {'batch_number': 'new_batch', 'best_before': 'new_best_before'})
+        
         with st.form(key='product_form'):
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 product_name = st.text_input("Product Name", key="new_prod_name")
-                product_type = st.selectbox("Type", ["tea", "gear", "books"], key="new_prod_type")
+                product_type = st.selectbox("Type", type_options("new_prod_type"), key="new_prod_type")
             
             with col2:
                 quantity = st.number_input("Quantity", min_value=1, value=1, key="new_quantity")
                 size = st.text_input("Size/Weight", key="new_size")
             
             with col3:
-                price_per_unit = st.number_input("Price per Unit ($)", min_value=0.01, value=10.0, step=0.01, key="new_price")
+                price_per_unit = st.number_input("Price per Unit ($)", min_value=0.01, step=0.01, key="new_price")
                 sku = st.text_input("SKU", key="new_sku")
             
             with col4:
-                batch_number = st.text_input("Batch Number", key="new_batch")
-                best_before = st.date_input("Best Before", value=datetime.now() + timedelta(days=30), key="new_best_before")
+                batch_number = st.text_input("Batch Number", key="new_batch",
+                                             help="Leave blank to assign batches automatically")
+                best_before = st.date_input("Best Before", key="new_best_before")
+            
+            auto_assign = st.checkbox("Assign batches first-expired-first-out when Batch Number is blank",
+                                      value=True, key="new_auto_fefo")
             
             # Hidden fields with default values
             production_date = datetime.now()
@@ -619,7 +721,20 @@ def show_data_entry_form():
                     'checked_by': checked_by
                 }
                 
-                if add_product_to_order(product_data):
+                if not batch_number and auto_assign and product_name:
+                    try:
+                        lines = allocate_batches(product_data, sale_date)
+                    except Exception as e:
+                        lines = None
+                        add_notification("Could not assign batches automatically.", "error")
+                        print(f"Error allocating batches: {str(e)}")
+                    if lines:
+                        for line in lines:
+                            add_product_to_order(line)
+                        batches = ", ".join(f"{line['batch_number']} ({line['quantity']})" for line in lines)
+                        add_notification(f"Product added to order from batches {batches}", "success")
+                    st.rerun()
+                elif add_product_to_order(product_data):
                     add_notification("Product added to order!", "success")
                     st.rerun()
                 else:
@@ -690,6 +805,7 @@ def show_data_entry_form():
                     dm.add_stock_out_batch(order_data, st.session_state.products)
                     add_notification("Order submitted successfully!", "success")
                     clear_form()
+                    st.session_state.suggested_order = None
                     st.session_state.data_changed = True
                     st.session_state.active_tab = "dashboard"
                     st.rerun()
@@ -700,30 +816,102 @@ def show_data_entry_form():
             if st.button("❌ Clear Order", key="clear_order_btn", on_click=clear_form):
                 st.rerun()
 
+@profiling.timed
 def show_stock_management():
     """Display stock management interface"""
     st.markdown("## 📦 Stock Management")
     
     # Create tabs for different stock functions
-    stock_tab1, stock_tab2, stock_tab3 = st.tabs([
-        "📦 Stock In", "🗑️ Wastage", "📝 Products"
+    stock_tab1, stock_tab2, stock_tab3, stock_tab4 = st.tabs([
+        "📊 Stock on Hand", "📦 Stock In", "🗑️ Wastage", "📝 Products"
     ])
     
     with stock_tab1:
-        show_stock_in_form()
+        show_stock_on_hand()
     
     with stock_tab2:
-        show_wastage_form()
+        show_stock_in_form()
     
     with stock_tab3:
+        show_wastage_form()
+    
+    with stock_tab4:
         show_products_management()
 
+@profiling.timed
+def show_stock_on_hand():
+    """Display current stock levels from the inventory ledger"""
+    st.markdown("### Stock on Hand")
+    
+    try:
+        inventory = ledger.get_ledger()
+    except Exception as e:
+        st.error("Could not load stock levels.")
+        print(f"Error building inventory ledger: {str(e)}")
+        return
+    
+    products_on_hand = inventory.products_frame()
+    if products_on_hand.empty:
+        st.info("No stock movements recorded yet.")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Units on Hand", f"{products_on_hand['on_hand'].sum():,.0f}")
+    with col2:
+        st.metric("Stock Value", f"${products_on_hand['value'].sum():,.2f}")
+    
+    st.markdown("#### By Product")
+    st.dataframe(
+        products_on_hand.sort_values('product_name').style.format({
+            'on_hand': '{:,.0f}',
+            'value': '${:,.2f}'
+        }),
+        use_container_width=True,
+        column_config={
+            "product_name": "Product",
+            "on_hand": "On Hand",
+            "value": "Value"
+        }
+    )
+    
+    st.markdown("#### By Batch")
+    st.dataframe(
+        inventory.batches_frame().sort_values(['product_name', 'batch_number']).style.format({
+            'on_hand': '{:,.0f}',
+            'value': '${:,.2f}'
+        }),
+        use_container_width=True,
+        column_config={
+            "product_name": "Product",
+            "batch_number": "Batch",
+            "on_hand": "On Hand",
+            "value": "Value"
+        }
+    )
+    
+    # Compare the catalogue's recorded stock levels with actual movements
+    products_df = shared_cache.table("products")
+    if not products_df.empty and 'stock_level' in products_df.columns:
+        st.markdown("#### Catalogue Reconciliation")
+        st.dataframe(
+            inventory.reconcile(products_df),
+            use_container_width=True,
+            column_config={
+                "name": "Product",
+                "stock_level": "Recorded Level",
+                "on_hand": "On Hand",
+                "difference": "Difference"
+            }
+        )
+
+@profiling.timed
 def show_stock_in_form():
     """Display form for adding new stock"""
     st.markdown("### Add New Stock")
     
     # Get existing stock data
-    stock_df = dm.get_stock_in()
+    stock_df = shared_cache.table("stock_in")
     
     # Display existing stock
     if not stock_df.empty:
@@ -739,16 +927,18 @@ def show_stock_in_form():
             use_container_width=True
         )
     
+    st.markdown("#### Add Stock Entry")
+    st.session_state.setdefault("stock_package_size", 0.5)
+    st.session_state.setdefault("stock_price", 10.0)
+    show_product_lookup("stock", STOCK_LOOKUP_FIELDS)
+    
     # Add new stock form
     with st.form("stock_in_form"):
-        st.markdown("#### Add Stock Entry")
-        
         col1, col2, col3 = st.columns(3)
         with col1:
-            product_name = st.text_input("📌 Product Name")
-            type_options = ["tea", "gear", "books"]
-            product_type = st.selectbox("🗂️ Type", type_options)
-            supplier_name = st.text_input("🏭 Supplier Name")
+            product_name = st.text_input("📌 Product Name", key="stock_prod_name")
+            product_type = st.selectbox("🗂️ Type", type_options("stock_prod_type"), key="stock_prod_type")
+            supplier_name = st.text_input("🏭 Supplier Name", key="stock_supplier")
         
         with col2:
             invoice_number = st.text_input("📜 Invoice Number")
@@ -758,8 +948,8 @@ def show_stock_in_form():
         
         with col3:
             quantity = st.number_input("📦 Quantity", min_value=1, value=1)
-            package_size = st.number_input("📏 Package Size (kg)", min_value=0.01, value=0.5)
-            price_per_unit = st.number_input("💰 Price per Unit", min_value=0.01, value=10.0)
+            package_size = st.number_input("📏 Package Size (kg)", min_value=0.01, key="stock_package_size")
+            price_per_unit = st.number_input("💰 Price per Unit", min_value=0.01, key="stock_price")
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -796,12 +986,13 @@ def show_stock_in_form():
         st.session_state.data_changed = True
         st.rerun()
 
+@profiling.timed
 def show_wastage_form():
     """Display form for recording wastage"""
     st.markdown("### 🗑️ Wastage Records")
     
     # Get existing wastage data
-    wastage_df = dm.get_wastage()
+    wastage_df = shared_cache.table("wastage")
     
     # Display existing wastage
     if not wastage_df.empty:
@@ -815,26 +1006,33 @@ def show_wastage_form():
             }),
             use_container_width=True
         )
+        
+        show_wastage_analysis()
+    
+    st.markdown("#### Record New Wastage")
+    st.session_state.setdefault("waste_package_size", 0.5)
+    st.session_state.setdefault("waste_price_kg", 10.0)
+    show_product_lookup("waste", WASTAGE_LOOKUP_FIELDS,
+                        {'batch_number': 'waste_batch', 'use_by_date': 'waste_use_by',
+                         'best_before': 'waste_best_before'})
     
     # Add new wastage form
     with st.form("wastage_form"):
-        st.markdown("#### Record New Wastage")
-        
         col1, col2, col3 = st.columns(3)
         with col1:
             date = st.date_input("📅 Date")
-            product_name = st.text_input("📌 Product Name")
+            product_name = st.text_input("📌 Product Name", key="waste_prod_name")
             reason = st.text_input("⚠️ Reason for Wastage")
         
         with col2:
-            batch_number = st.text_input("🏷️ Batch Number")
-            use_by_date = st.date_input("📅 Use By Date")
-            best_before = st.date_input("🗓️ Best Before Date")
+            batch_number = st.text_input("🏷️ Batch Number", key="waste_batch")
+            use_by_date = st.date_input("📅 Use By Date", key="waste_use_by")
+            best_before = st.date_input("🗓️ Best Before Date", key="waste_best_before")
         
         with col3:
             quantity = st.number_input("📦 Quantity", min_value=1, value=1)
-            package_size = st.number_input("📏 Package Size (kg)", min_value=0.01, value=0.5)
-            avg_price_kg = st.number_input("💰 Avg Price per KG", min_value=0.01, value=10.0)
+            package_size = st.number_input("📏 Package Size (kg)", min_value=0.01, key="waste_package_size")
+            avg_price_kg = st.number_input("💰 Avg Price per KG", min_value=0.01, key="waste_price_kg")
         
         checked_by = st.text_input("✅ Checked By")
         
@@ -860,12 +1058,60 @@ def show_wastage_form():
         st.session_state.data_changed = True
         st.rerun()
 
+@profiling.timed
+def show_wastage_analysis():
+    """Display wastage rates joined to the stock-in batches they came from"""
+    try:
+        analytics = wastage_analytics.get_wastage_analytics()
+    except Exception as e:
+        st.error("Could not load wastage analysis.")
+        print(f"Error building wastage analytics: {str(e)}")
+        return
+    
+    st.markdown("#### Wastage Analysis")
+    view = st.radio("Group by", ["Product", "Supplier", "Batch"], horizontal=True, key="wastage_view")
+    
+    if view == "Product":
+        summary = analytics.by_product()
+    elif view == "Supplier":
+        summary = analytics.by_supplier()
+    else:
+        summary = analytics.by_batch()
+    
+    st.dataframe(
+        summary,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "product_name": "Product",
+            "batch_number": "Batch",
+            "supplier_name": "Supplier",
+            "received_qty": "Received",
+            "wasted_qty": "Wasted",
+            "wasted_cost": st.column_config.NumberColumn("Wasted Cost", format="$%.2f"),
+            "wastage_rate": st.column_config.NumberColumn("Wastage Rate", format="percent")
+        }
+    )
+    
+    trend = analytics.cost_trend()
+    if not trend.empty:
+        fig = px.bar(
+            trend,
+            x='month',
+            y='wasted_cost',
+            color='product_name',
+            title='Wastage Cost by Month',
+            labels={'month': 'Month', 'wasted_cost': 'Cost ($)', 'product_name': 'Product'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+@profiling.timed
 def show_products_management():
     """Display products management interface"""
     st.markdown("### 📝 Products Catalog")
     
     # Get existing products
-    products_df = dm.get_products()
+    products_df = shared_cache.table("products")
     
     # Display products with edit/delete options
     if not products_df.empty:
@@ -920,22 +1166,182 @@ def show_products_management():
                 "created_at": datetime.now().strftime("%Y-%m-%d")
             }
             
-            # Call a function to add product (you'll need to implement this)
+            dm.add_product(product_data)
             add_notification("Product added successfully!", "success")
             st.session_state.data_changed = True
             st.rerun()
 
+def load_saved_report(name, table):
+    """Return a precomputed report if it was generated from the rows on screen"""
+    if reports.is_current(reports.load_manifest(), table, shared_cache.fingerprint(table)):
+        return reports.load_report(name)
+    return None
+
+def get_prepared_sales():
+    """Sales with parsed dates, shared by every session until stock_out changes"""
+    return shared_cache.derived(
+        ("prepared_sales",), ("stock_out",),
+        lambda: reports.prepare_sales(shared_cache.table("stock_out"))
+    )
+
+def get_sales_partitions():
+    """Prepared sales split by month of sale, shared like get_prepared_sales()"""
+    return shared_cache.derived(
+        ("sales_partitions",), ("stock_out",),
+        lambda: partitions.PartitionedFrame(get_prepared_sales(), 'date', stats_columns=['best_before'])
+    )
+
+def show_quick_statistics(filtered_df, date_range=None):
+    """Totals for the search results; from running totals when date_range is given"""
+    st.markdown("### Quick Statistics")
+    totals = None
+    if date_range is not None:
+        try:
+            totals = range_totals.get_sales_totals().totals(date_range[0], date_range[1])
+        except Exception as e:
+            print(f"Error computing range totals: {str(e)}")
+    if totals is None:
+        totals = {
+            'revenue': float(filtered_df['total_price'].sum()),
+            'orders': int(filtered_df['order_number'].nunique()),
+            'quantity': int(filtered_df['quantity'].sum())
+        }
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Orders", totals['orders'])
+    with col2:
+        st.metric("Total Products", totals['quantity'])
+    with col3:
+        st.metric("Total Revenue", f"${totals['revenue']:.2f}")
+    with col4:
+        st.metric("Unique Customers", int(filtered_df['customer_name'].nunique()))
+
+def get_sales_cube():
+    """Sales cube over the prepared sales, shared like get_prepared_sales()"""
+    return shared_cache.derived(
+        ("sales_cube",), ("stock_out",),
+        lambda: cube.SalesCube(get_prepared_sales())
+    )
+
+def show_drill_down():
+    """Drill through the sales cube one dimension at a time"""
+    sales_cube = get_sales_cube()
+    path = st.multiselect("Drill path", options=cube.DIMENSIONS, default=DRILL_PATH,
+                          format_func=DIMENSION_LABELS.get, key="drill_path")
+    if not path:
+        st.info("Choose at least one dimension to drill into.")
+        return
+    
+    # One picker per level; each lists the members under the levels picked before it
+    where = {}
+    breakdown = None
+    columns = st.columns(len(path))
+    for column, dimension in zip(columns, path):
+        cells = sales_cube.query([dimension], where)
+        if dimension in ("day", "month"):
+            cells = cells.sort_values(dimension).reset_index(drop=True)
+        with column:
+            member = st.selectbox(
+                DIMENSION_LABELS[dimension],
+                options=["All"] + cells[dimension].tolist(),
+                format_func=lambda value: value.strftime('%Y-%m-%d') if isinstance(value, pd.Timestamp) else str(value),
+                key=f"drill_{dimension}"
+            )
+        if member == "All":
+            breakdown = (dimension, cells)
+            break
+        where[dimension] = member
+    
+    if breakdown is None:
+        # Every level picked: show the one cell
+        totals = sales_cube.query([], where).iloc[0]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Revenue", f"${totals['revenue']:.2f}")
+        with col2:
+            st.metric("Units Sold", f"{totals['quantity']:,.0f}")
+        with col3:
+            st.metric("Orders", int(totals['orders']))
+        return
+    
+    dimension, cells = breakdown
+    label = DIMENSION_LABELS[dimension]
+    chart = cells if dimension in ("day", "month") else cells.head(20)
+    fig = px.bar(
+        chart,
+        x=dimension,
+        y='revenue',
+        title=f"Revenue by {label}" + "".join(f", {DIMENSION_LABELS[d]} {v}" for d, v in where.items()),
+        labels={dimension: label, 'revenue': 'Revenue ($)'},
+        color='revenue',
+        color_continuous_scale='Viridis'
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(
+        cells.style.format({'revenue': '${:.2f}', 'quantity': '{:,.0f}'}),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            dimension: label,
+            "quantity": "Units Sold",
+            "revenue": "Revenue",
+            "orders": "Orders"
+        }
+    )
+
+def cached_sales_report(name, compute, *params):
+    """A report on the prepared sales, shared by every session until stock_out changes"""
+    return shared_cache.derived(
+        (name,) + params, ("stock_out",),
+        lambda: compute(get_prepared_sales(), *params)
+    )
+
+def count_orders():
+    """Distinct order numbers, shared by every session until stock_out changes"""
+    return shared_cache.derived(
+        ("order_count",), ("stock_out",),
+        lambda: shared_cache.table("stock_out")['order_number'].nunique()
+    )
+
+def warm_tasks():
+    """What the background warmer keeps computed: name -> (tables it is built from, compute)
+
+    The singletons are only built by the warmer; they keep themselves
+    current from data_manager's notifications.
+    """
+    return {
+        "prepared_sales": (("stock_out",), get_prepared_sales),
+        "sales_partitions": (("stock_out",), get_sales_partitions),
+        "order_count": (("stock_out",), count_orders),
+        "dashboard_metrics": (("stock_out",),
+                              lambda: cached_sales_report("dashboard_metrics", reports.dashboard_metrics)),
+        "sales_by_product": (("stock_out",),
+                             lambda: cached_sales_report("sales_by_product", reports.sales_by_product)),
+        "sales_cube": (("stock_out",), get_sales_cube),
+        "sales_totals": (("stock_out",), range_totals.get_sales_totals),
+        "ledger": (ledger.LEDGER_TABLES, ledger.get_ledger),
+        "allocator": (("stock_in",), allocation.get_allocator),
+        "wastage_analytics": (("stock_in", "wastage"), wastage_analytics.get_wastage_analytics),
+        "reorder_monitor": (("products",), reorder.get_monitor),
+        "catalog": (catalog.CATALOG_TABLES, catalog.get_catalog)
+    }
+
+@profiling.timed
 def show_search_page():
     """Display comprehensive search and filter interface"""
     st.markdown("## 🔍 Search & Reports")
     
     # Load data
-    df = dm.get_stock_out()
+    df = shared_cache.table("stock_out")
     
     if df.empty:
         st.warning("No sales data available.")
         return
     
+    sales = get_prepared_sales()
+    
     # Create tabs for different search options
     search_tab1, search_tab2, search_tab3 = st.tabs([
         "🔍 Basic Search", "📊 Reports", "📅 Date Analysis"
@@ -951,77 +1357,60 @@ def show_search_page():
         with col2:
             search_type = st.selectbox(
                 "Search by",
-                options=["All Fields", "Order Number", "Product Name", "Batch Number", "Customer Name", "SKU"],
+                options=list(reports.SEARCH_COLUMNS),
                 key="search_type"
             )
         
         # Date filters
         col1, col2 = st.columns(2)
         with col1:
-            min_date = df['date'].min() if not df.empty else datetime.now() - timedelta(days=30)
-            max_date = df['date'].max() if not df.empty else datetime.now()
+            min_date = sales['date'].min()
+            max_date = sales['date'].max()
             date_range = st.date_input(
                 "Sale Date Range",
                 value=(min_date, max_date)
             )
         
         with col2:
-            min_bb = df['best_before'].min() if not df.empty else datetime.now()
-            max_bb = df['best_before'].max() if not df.empty else datetime.now() + timedelta(days=90)
+            min_bb = sales['best_before'].min()
+            max_bb = sales['best_before'].max()
             best_before_range = st.date_input(
                 "Best Before Range",
                 value=(min_bb, max_bb)
             )
         
-        # Apply filters
-        filtered_df = df.copy()
-        
-        # Apply text search
-        if search_text:
-            if search_type == "All Fields":
-                # Search across multiple columns
-                text_columns = ['order_number', 'product_name', 'batch_number', 'customer_name', 'sku']
-                mask = pd.Series(False, index=filtered_df.index)
-                for col in text_columns:
-                    mask |= filtered_df[col].fillna('').str.contains(search_text, case=False, na=False)
-                filtered_df = filtered_df[mask]
-            else:
-                # Search in specific column
-                search_column = {
-                    "Order Number": "order_number",
-                    "Product Name": "product_name",
-                    "Batch Number": "batch_number",
-                    "Customer Name": "customer_name",
-                    "SKU": "sku"
-                }[search_type]
-                filtered_df = filtered_df[filtered_df[search_column].fillna('').str.contains(search_text, case=False, na=False)]
+        # Only the months overlapping both ranges are searched
+        candidates = get_sales_partitions().read(date=date_range, best_before=best_before_range)
+        filtered_df = reports.filter_sales(candidates, search_text, search_type)
         
-        # Apply date range filters
-        filtered_df = filtered_df[
-            (filtered_df['date'] >= pd.to_datetime(date_range[0])) &
-            (filtered_df['date'] <= pd.to_datetime(date_range[1])) &
-            (filtered_df['best_before'] >= pd.to_datetime(best_before_range[0])) &
-            (filtered_df['best_before'] <= pd.to_datetime(best_before_range[1]))
-        ]
+        # A plain date window is answered from running totals instead of the rows
+        whole_window = (not search_text and len(date_range) == 2 and len(best_before_range) == 2
+                        and [pd.Timestamp(day) for day in best_before_range]
+                        == [pd.Timestamp(min_bb).normalize(), pd.Timestamp(max_bb).normalize()])
+        show_quick_statistics(filtered_df, date_range if whole_window else None)
         
         # Display search results
         if filtered_df.empty:
             st.info("No orders found matching your search criteria.")
         else:
             # Get unique order numbers from filtered data
-            orders_summary = filtered_df.groupby('order_number').agg({
-                'date': 'first',
-                'customer_name': 'first',
-                'product_name': lambda x: ', '.join(set(x)),
-                'quantity': 'sum',
-                'total_price': 'sum',
-                'delivery_method': 'first'
-            }).reset_index()
+            orders_summary = reports.orders_summary(filtered_df)
             
             st.markdown(f"### Found {len(orders_summary)} Orders")
             
+            # Render one page of cards; every card is several elements
+            page_count = -(-len(orders_summary) // SEARCH_PAGE_SIZE)
+            page = 1
+            if page_count > 1:
+                # A narrower search can leave the remembered page out of range
+                if st.session_state.get("search_page", 1) > page_count:
+                    st.session_state.search_page = page_count
+                page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count,
+                                       value=1, step=1, key="search_page")
+            page_orders = orders_summary.iloc[(page - 1) * SEARCH_PAGE_SIZE:page * SEARCH_PAGE_SIZE]
+            
             # Display orders with cards
-            for idx, order in orders_summary.iterrows():
+            for idx, order in page_orders.iterrows():
                 with st.container():
                     st.markdown('<div class="order-container">', unsafe_allow_html=True)
                     col1, col2, col3, col4 = st.columns([3, 2, 3, 1])
@@ -1060,16 +1449,17 @@ def show_search_page():
         # Create report options
         report_type = st.selectbox(
             "Select Report Type",
-            options=["Sales by Product", "Sales by Customer", "Sales Trends", "Stock Value"]
+            options=["Sales by Product", "Sales by Customer", "Customer Segments (RFM)",
+                     "Products Bought Together", "Sales Trends", "Stock Value", "Demand Forecast",
+                     "Drill-Down"]
         )
         
         if report_type == "Sales by Product":
             # Product sales report
             if not df.empty:
-                product_sales = df.groupby('product_name').agg({
-                    'quantity': 'sum',
-                    'total_price': 'sum'
-                }).reset_index().sort_values('total_price', ascending=False)
+                product_sales = load_saved_report('sales_by_product', 'stock_out')
+                if product_sales is None:
+                    product_sales = cached_sales_report("sales_by_product", reports.sales_by_product)
                 
                 # Create bar chart
                 fig = px.bar(
@@ -1102,14 +1492,9 @@ def show_search_page():
         elif report_type == "Sales by Customer":
             # Customer sales report
             if not df.empty:
-                customer_sales = df.groupby('customer_name').agg({
-                    'order_number': 'nunique',
-                    'quantity': 'sum',
-                    'total_price': 'sum'
-                }).reset_index().sort_values('total_price', ascending=False)
-                
-                # Rename columns
-                customer_sales.columns = ['Customer', 'Orders', 'Units', 'Total Sales']
+                customer_sales = load_saved_report('sales_by_customer', 'stock_out')
+                if customer_sales is None:
+                    customer_sales = cached_sales_report("sales_by_customer", reports.sales_by_customer)
                 
                 # Create visualization
                 fig = px.pie(
@@ -1130,18 +1515,91 @@ def show_search_page():
             else:
                 st.info("No customer sales data available for reporting.")
         
+        elif report_type == "Customer Segments (RFM)":
+            # Recency, frequency and monetary scoring per customer
+            rfm = cached_sales_report("rfm", reports.rfm_analysis)
+            
+            if rfm.empty:
+                st.info("No customer data available for segmentation.")
+            else:
+                segment_counts = reports.rfm_segment_counts(rfm)
+                
+                fig = px.bar(
+                    segment_counts,
+                    x='segment',
+                    y='customers',
+                    title='Customers by Segment',
+                    labels={'segment': 'Segment', 'customers': 'Customers'},
+                    color='revenue',
+                    color_continuous_scale='Viridis',
+                    category_orders={'segment': reports.RFM_SEGMENTS}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                
+                segment_filter = st.selectbox(
+                    "Show Segment",
+                    options=["All Segments"] + reports.RFM_SEGMENTS
+                )
+                customers = rfm if segment_filter == "All Segments" else rfm[rfm['segment'] == segment_filter]
+                
+                st.markdown(f"#### {len(customers):,} Customers")
+                st.dataframe(
+                    customers,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "customer_name": "Customer",
+                        "last_order": st.column_config.DateColumn("Last Order", format="YYYY-MM-DD"),
+                        "recency_days": "Days Since Last Order",
+                        "frequency": "Orders",
+                        "monetary": st.column_config.NumberColumn("Total Spent", format="$%.2f"),
+                        "r_score": "R",
+                        "f_score": "F",
+                        "m_score": "M",
+                        "rfm_score": "RFM",
+                        "segment": "Segment"
+                    }
+                )
+        
+        elif report_type == "Products Bought Together":
+            # Pairs of products that appear in the same orders
+            col1, col2 = st.columns(2)
+            with col1:
+                min_orders = st.number_input("Minimum Shared Orders", min_value=1, value=2)
+            with col2:
+                per_product = st.number_input("Pairs per Product", min_value=1, max_value=20, value=5)
+            
+            pairs = cached_sales_report("product_pairs", basket.product_pairs, min_orders)
+            
+            if pairs.empty:
+                st.info("No products have been bought together often enough yet.")
+            else:
+                pair_columns = {
+                    "product_name": "Product",
+                    "with_product": "Bought With",
+                    "orders": "Orders",
+                    "support": st.column_config.NumberColumn("Support", format="%.3f"),
+                    "confidence": st.column_config.NumberColumn("Confidence", format="%.2f"),
+                    "lift": st.column_config.NumberColumn("Lift", format="%.2f")
+                }
+                
+                product_filter = st.selectbox(
+                    "Product",
+                    options=["All Products"] + sorted(pairs['product_name'].unique())
+                )
+                if product_filter == "All Products":
+                    shown = basket.top_pairs(pairs, per_product)
+                else:
+                    shown = pairs[pairs['product_name'] == product_filter].head(per_product)
+                
+                st.dataframe(shown, use_container_width=True, hide_index=True, column_config=pair_columns)
+        
         elif report_type == "Sales Trends":
             # Time-based sales analysis
             if not df.empty:
-                # Convert date column to datetime
-                df['date'] = pd.to_datetime(df['date'])
-                
-                # Create monthly sales data
-                df['month'] = df['date'].dt.strftime('%Y-%m')
-                monthly_sales = df.groupby('month').agg({
-                    'order_number': 'nunique',
-                    'total_price': 'sum'
-                }).reset_index()
+                monthly_sales = load_saved_report('monthly_sales', 'stock_out')
+                if monthly_sales is None:
+                    monthly_sales = cached_sales_report("monthly_sales", reports.monthly_sales)
                 
                 # Create line chart
                 fig = px.line(
@@ -1168,17 +1626,15 @@ def show_search_page():
         
         elif report_type == "Stock Value":
             # Stock value report
-            stock_df = dm.get_stock_in()
+            stock_df = shared_cache.table("stock_in")
             
             if not stock_df.empty:
-                # Calculate stock value
-                stock_df['stock_value'] = stock_df['quantity'] * stock_df['package_size'] * stock_df['price_per_unit']
-                
-                # Group by type
-                stock_value_by_type = stock_df.groupby('type').agg({
-                    'stock_value': 'sum',
-                    'quantity': 'sum'
-                }).reset_index()
+                stock_value_by_type = load_saved_report('stock_value_by_type', 'stock_in')
+                stock_details = load_saved_report('stock_value_details', 'stock_in')
+                if stock_value_by_type is None or stock_details is None:
+                    stock = reports.prepare_stock(stock_df)
+                    stock_value_by_type = reports.stock_value_by_type(stock)
+                    stock_details = reports.stock_value_details(stock)
                 
                 # Create pie chart
                 fig = px.pie(
@@ -1191,11 +1647,6 @@ def show_search_page():
                 
                 # Show detailed stock value table
                 st.markdown("#### Detailed Stock Value")
-                stock_details = stock_df.groupby(['type', 'product_name']).agg({
-                    'quantity': 'sum',
-                    'stock_value': 'sum'
-                }).reset_index().sort_values(['type', 'stock_value'], ascending=[True, False])
-                
                 st.dataframe(
                     stock_details.style.format({
                         'stock_value': '${:.2f}'
@@ -1210,6 +1661,65 @@ def show_search_page():
                 )
             else:
                 st.info("No stock data available for reporting.")
+        
+        elif report_type == "Demand Forecast":
+            # Forecast demand per product and suggest reorder quantities
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                horizon = st.number_input("Forecast Horizon (days)", min_value=1, max_value=90, value=14)
+            with col2:
+                lead_time = st.number_input("Supplier Lead Time (days)", min_value=0, max_value=90, value=7)
+            with col3:
+                safety_days = st.number_input("Safety Stock (days)", min_value=0, max_value=60, value=7)
+            
+            forecast = forecasting.forecast_demand(sales, horizon=horizon)
+            
+            try:
+                inventory = ledger.get_ledger()
+                on_hand = {name: inventory.on_hand(name)[0] for name in forecast['product_name']}
+            except Exception as e:
+                on_hand = {}
+                print(f"Error loading stock levels for forecast: {str(e)}")
+            
+            forecast = forecasting.suggest_reorders(forecast, on_hand, lead_time, safety_days)
+            
+            if forecast.empty or forecast['forecast_total'].sum() == 0:
+                st.info(f"No sales in the last {forecasting.DEFAULT_HISTORY_DAYS} days to forecast from.")
+            else:
+                fig = px.bar(
+                    forecast.head(20),
+                    x='product_name',
+                    y='forecast_total',
+                    color='model',
+                    title=f'Forecast Demand, Next {horizon} Days (Top 20)',
+                    labels={'product_name': 'Product', 'forecast_total': 'Units', 'model': 'Model'}
+                )
+                fig.update_layout(xaxis_tickangle=-45)
+                st.plotly_chart(fig, use_container_width=True)
+                
+                st.dataframe(
+                    forecast.style.format({
+                        'daily_forecast': '{:.2f}',
+                        'forecast_total': '{:.1f}',
+                        'on_hand': '{:,.0f}',
+                        'suggested_reorder': '{:,.0f}'
+                    }),
+                    use_container_width=True,
+                    column_config={
+                        "product_name": "Product",
+                        "model": "Model",
+                        "daily_forecast": "Units / Day",
+                        "forecast_total": "Forecast Units",
+                        "on_hand": "On Hand",
+                        "suggested_reorder": "Suggested Reorder"
+                    }
+                )
+        
+        elif report_type == "Drill-Down":
+            if not df.empty:
+                show_drill_down()
+            else:
+                st.info("No sales data available for reporting.")
     
     with search_tab3:
         st.markdown("### Date Analysis")
@@ -1217,44 +1727,28 @@ def show_search_page():
         # Date-based analysis options
         date_analysis = st.selectbox(
             "Select Analysis Type",
-            options=["Expiration Analysis", "Sales by Day of Week", "Sales by Month"]
+            options=["Expiration Analysis", "Sales by Day of Week", "Sales by Month", "Customer Retention"]
         )
         
         if date_analysis == "Expiration Analysis":
             # Expiration date analysis
-            stock_df = dm.get_stock_in()
+            stock_df = shared_cache.table("stock_in")
             
             if not stock_df.empty:
-                # Convert dates to datetime
-                stock_df['best_before'] = pd.to_datetime(stock_df['best_before'])
-                stock_df['use_by_date'] = pd.to_datetime(stock_df['use_by_date'])
-                
-                # Calculate days until expiration
-                today = pd.to_datetime(datetime.now().date())
-                stock_df['days_to_best_before'] = (stock_df['best_before'] - today).dt.days
-                stock_df['days_to_use_by'] = (stock_df['use_by_date'] - today).dt.days
-                
-                # Create expiration categories
-                def get_expiration_category(days):
-                    if days < 0:
-                        return "Expired"
-                    elif days < 30:
-                        return "Expiring Soon (< 30 days)"
-                    elif days < 90:
-                        return "Medium Term (30-90 days)"
-                    else:
-                        return "Long Term (> 90 days)"
-                
-                stock_df['expiration_category'] = stock_df['days_to_best_before'].apply(get_expiration_category)
-                
-                # Create visualization
-                expiration_summary = stock_df.groupby('expiration_category').agg({
-                    'quantity': 'sum',
-                    'stock_value': 'sum'  # Assuming stock_value is calculated
-                }).reset_index()
+                # Expiry reports depend on today's date, so only reuse today's files
+                manifest = reports.load_manifest()
+                expiration_summary = None
+                expiring_soon = None
+                if manifest and manifest['generated_at'][:10] == datetime.now().strftime('%Y-%m-%d'):
+                    expiration_summary = load_saved_report('expiry_summary', 'stock_in')
+                    expiring_soon = load_saved_report('expiring_soon', 'stock_in')
+                if expiration_summary is None or expiring_soon is None:
+                    stock = reports.prepare_stock(stock_df)
+                    expiration_summary = reports.expiry_summary(stock)
+                    expiring_soon = reports.expiring_soon(stock)
                 
                 # Define category order
-                category_order = ["Expired", "Expiring Soon (< 30 days)", "Medium Term (30-90 days)", "Long Term (> 90 days)"]
+                category_order = reports.EXPIRY_CATEGORIES
                 
                 # Create bar chart
                 fig = px.bar(
@@ -1275,10 +1769,8 @@ def show_search_page():
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Show items expiring soon
-                if "Expiring Soon (< 30 days)" in stock_df['expiration_category'].values:
+                if not expiring_soon.empty:
                     st.markdown("#### 🔴 Products Expiring Soon")
-                    expiring_soon = stock_df[stock_df['expiration_category'] == "Expiring Soon (< 30 days)"].sort_values('days_to_best_before')
-                    
                     st.dataframe(
                         expiring_soon[['product_name', 'batch_number', 'quantity', 'best_before', 'days_to_best_before']],
                         use_container_width=True,
@@ -1296,20 +1788,10 @@ def show_search_page():
         elif date_analysis == "Sales by Day of Week":
             # Day of week analysis
             if not df.empty:
-                # Convert to datetime
-                df['date'] = pd.to_datetime(df['date'])
-                
-                # Add day of week
-                df['day_of_week'] = df['date'].dt.day_name()
-                
-                # Group by day of week
-                day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                
-                weekday_sales = df.groupby('day_of_week').agg({
-                    'order_number': 'nunique',
-                    'quantity': 'sum',
-                    'total_price': 'sum'
-                }).reindex(day_order).reset_index()
+                day_order = reports.DAY_ORDER
+                weekday_sales = load_saved_report('weekday_sales', 'stock_out')
+                if weekday_sales is None:
+                    weekday_sales = cached_sales_report("weekday_sales", reports.weekday_sales)
                 
                 # Create visualization
                 fig = px.bar(
@@ -1340,67 +1822,98 @@ def show_search_page():
         elif date_analysis == "Sales by Month":
             # Monthly analysis
             if not df.empty:
-                # Convert to datetime
-                df['date'] = pd.to_datetime(df['date'])
-                
-                # Extract month and year
-                df['month_year'] = df['date'].dt.strftime('%Y-%m')
-                
-                # Group by month
-                monthly_sales = df.groupby('month_year').agg({
-                    'order_number': 'nunique',
-                    'quantity': 'sum',
-                    'total_price': 'sum'
-                }).reset_index()
+                monthly_sales = load_saved_report('monthly_sales', 'stock_out')
+                if monthly_sales is None:
+                    monthly_sales = cached_sales_report("monthly_sales", reports.monthly_sales)
                 
                 # Create monthly sales visualization
                 fig = px.bar(
                     monthly_sales, 
-                    x='month_year', 
+                    x='month', 
                     y='total_price',
                     title='Sales by Month',
-                    labels={'month_year': 'Month', 'total_price': 'Sales ($)'}
+                    labels={'month': 'Month', 'total_price': 'Sales ($)'}
                 )
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Create monthly items sold visualization
                 fig2 = px.line(
                     monthly_sales, 
-                    x='month_year', 
+                    x='month', 
                     y='quantity',
                     markers=True,
                     title='Items Sold by Month',
-                    labels={'month_year': 'Month', 'quantity': 'Quantity Sold'}
+                    labels={'month': 'Month', 'quantity': 'Quantity Sold'}
                 )
                 st.plotly_chart(fig2, use_container_width=True)
             else:
                 st.info("No sales data available for monthly analysis.")
+        
+        elif date_analysis == "Customer Retention":
+            # Share of each first-purchase cohort still ordering N months later
+            retention, cohort_sizes = cached_sales_report("cohort_retention", reports.cohort_retention)
+            
+            if retention.empty:
+                st.info("No customer data available for retention analysis.")
+            else:
+                fig = px.imshow(
+                    retention * 100,
+                    text_auto='.0f',
+                    aspect='auto',
+                    color_continuous_scale='Greens',
+                    title='Customer Retention by First-Purchase Month (%)',
+                    labels={'x': 'Months Since First Purchase', 'y': 'Cohort', 'color': 'Retained (%)'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                
+                st.markdown("#### Cohort Sizes")
+                st.dataframe(
+                    cohort_sizes.rename('Customers').rename_axis('Cohort').reset_index(),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+def metric_period_range(period):
+    """(start, end) dates for a METRIC_PERIODS label; None for an open end"""
+    days = METRIC_PERIODS.get(period)
+    if days is None:
+        return None, None
+    end_date = datetime.now().date()
+    return end_date - timedelta(days=days - 1), end_date
 
+def count_customers(start_date, end_date):
+    """Distinct customers with sales between two dates (None for all time)"""
+    if start_date is None and end_date is None:
+        return cached_sales_report("dashboard_metrics", reports.dashboard_metrics)['total_customers']
+    window = get_sales_partitions().read(date=(start_date, end_date))
+    return int(window['customer_name'].nunique())
+
+@profiling.timed
 def show_dashboard():
     """Display main dashboard with key metrics and charts"""
     st.markdown("## 📊 Tea Shop Dashboard")
     
     # Load data with error handling
     try:
-        sales_df = dm.get_stock_out()
+        sales_df = shared_cache.table("stock_out")
     except Exception as e:
         sales_df = pd.DataFrame()
         print(f"Error loading sales data: {str(e)}")
     
     try:
-        stock_df = dm.get_stock_in()
+        stock_df = shared_cache.table("stock_in")
     except Exception as e:
         stock_df = pd.DataFrame()
         print(f"Error loading stock data: {str(e)}")
     
     try:
-        products_df = dm.get_products()
+        products_df = shared_cache.table("products")
     except Exception as e:
         products_df = pd.DataFrame()
         print(f"Error loading products data: {str(e)}")
     
     try:
-        wastage_df = dm.get_wastage()
+        wastage_df = shared_cache.table("wastage")
     except Exception as e:
         wastage_df = pd.DataFrame()
         print(f"Error loading wastage data: {str(e)}")
@@ -1409,16 +1922,29 @@ def show_dashboard():
         st.info("No sales data available yet. Begin by adding sales orders.")
         return
     
-    # Calculate key metrics
-    total_revenue = sales_df['total_price'].sum()
-    total_orders = sales_df['order_number'].nunique()
-    total_customers = sales_df['customer_name'].nunique()
-    total_products_sold = sales_df['quantity'].sum()
-    
-    # Rest of the function remains the same...
-    
     # Key performance metrics
     st.markdown("### Key Metrics")
+    period = st.radio("Period", options=list(METRIC_PERIODS), horizontal=True,
+                      key="metrics_period", label_visibility="collapsed")
+    start_date, end_date = metric_period_range(period)
+    
+    # Totals for any window come from per-day running totals
+    try:
+        totals = range_totals.get_sales_totals()
+        period_totals = totals.totals(start_date, end_date)
+        total_revenue = period_totals['revenue']
+        total_orders = period_totals['orders']
+        total_products_sold = period_totals['quantity']
+        top_products = totals.by_product(start_date, end_date).rename(columns={'revenue': 'total_price'})
+    except Exception as e:
+        print(f"Error computing period totals: {str(e)}")
+        metrics = cached_sales_report("dashboard_metrics", reports.dashboard_metrics)
+        total_revenue = metrics['total_revenue']
+        total_orders = metrics['total_orders']
+        total_products_sold = metrics['total_products_sold']
+        top_products = cached_sales_report("sales_by_product", reports.sales_by_product)
+    total_customers = count_customers(start_date, end_date)
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -1450,24 +1976,9 @@ def show_dashboard():
     
     with col1:
         st.markdown("### Sales Trend")
-        # Convert date to datetime
-        sales_df['date'] = pd.to_datetime(sales_df['date'])
-        
-        # Group by date
-        daily_sales = sales_df.groupby('date').agg({
-            'total_price': 'sum'
-        }).reset_index()
-        
-        # Create a date range for the last 30 days
         end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
-        date_range = pd.date_range(start=start_date, end=end_date)
-        
-        # Create a dataframe with all dates
-        all_dates = pd.DataFrame({'date': date_range})
-        
-        # Merge with sales data
-        complete_daily_sales = all_dates.merge(daily_sales, on='date', how='left').fillna(0)
+        recent = get_sales_partitions().read(date=(end_date - timedelta(days=30), end_date))
+        complete_daily_sales = reports.daily_sales(recent, days=30, end_date=end_date)
         
         # Create trends chart
         fig = px.line(
@@ -1483,11 +1994,7 @@ def show_dashboard():
     
     with col2:
         st.markdown("### Top Products")
-        # Group sales by product
-        product_sales = sales_df.groupby('product_name').agg({
-            'quantity': 'sum',
-            'total_price': 'sum'
-        }).reset_index().sort_values('total_price', ascending=False).head(5)
+        product_sales = top_products.head(5)
         
         # Create bar chart
         fig = px.bar(
@@ -1505,20 +2012,11 @@ def show_dashboard():
     # Recent orders
     st.markdown("### Recent Orders")
     
-    # Get unique order numbers
-    recent_orders = sales_df.sort_values('date', ascending=False)
-    recent_order_numbers = recent_orders['order_number'].unique()[:5]
+    # Latest five orders
+    recent_orders = cached_sales_report("orders_summary", reports.orders_summary).sort_values('date', ascending=False).head(5)
     
     # Display recent orders
-    for order_num in recent_order_numbers:
-        order_data = sales_df[sales_df['order_number'] == order_num]
-        
-        # Get order summary
-        order_date = order_data['date'].iloc[0]
-        customer = order_data['customer_name'].iloc[0]
-        total = order_data['total_price'].sum()
-        items = order_data['quantity'].sum()
-        
+    for _, order in recent_orders.iterrows():
         # Create order card
         with st.container():
             st.markdown('<div class="order-container">', unsafe_allow_html=True)
@@ -1543,5 +2041,94 @@ def show_dashboard():
             
             st.markdown('</div>', unsafe_allow_html=True)
 
+@profiling.timed
+def show_diagnostics():
+    """Display the slowest profiled reruns and cache statistics"""
+    st.markdown("## 🩺 Diagnostics")
+    st.caption(
+        "Reruns are recorded while profiling is on (SALES_PROFILE=1 or ?profile=1). "
+        "With SALES_PROFILE=capture or ?profile=capture each rerun's sampled stacks are "
+        f"also written to {profiling.PROFILE_DIR} for flame graphs."
+    )
+    
+    stats = shared_cache.cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cached Tables", f"{stats['tables']} ({stats['table_mb']:.1f} MB)")
+    col2.metric("Derived Artefacts", f"{stats['derived']} ({stats['derived_mb']:.1f} MB)")
+    col3.metric("Cache Hits / Downloads", f"{stats['hits']} / {stats['misses']}")
+    col4.metric("Unchanged Refreshes / Evictions", f"{stats['revalidated']} / {stats['evictions']}")
+    
+    background = warmer.get_warmer()
+    if background is not None:
+        st.markdown("### Background Warmer")
+        st.caption(f"Revalidates every table every {background.interval:g}s; "
+                   f"{background.cycles} passes so far.")
+        st.dataframe(pd.DataFrame(background.status()), hide_index=True, use_container_width=True,
+                     column_config={
+                         'task': "Task",
+                         'last_run': st.column_config.DatetimeColumn("Last Run", format="HH:mm:ss"),
+                         'seconds': st.column_config.NumberColumn("Last Run (s)", format="%.3f"),
+                         'runs': "Runs",
+                         'failures': "Failures",
+                         'retry_in': st.column_config.NumberColumn("Retry In (s)", format="%.0f"),
+                         'error': "Last Error"
+                     })
+    
+    reruns = profiling.slowest_reruns()
+    if not reruns:
+        st.info("No profiled reruns yet. Use the app with profiling on, then come back.")
+        return
+    
+    st.markdown("### Slowest Reruns")
+    summary = pd.DataFrame([
+        {
+            'Time': profile.started.strftime('%H:%M:%S'),
+            'Session': profile.session_id,
+            'Page': profile.page,
+            'Total (ms)': profile.total * 1000,
+            'Breakdown': ", ".join(f"{name} {seconds * 1000:.0f}ms"
+                                   for name, seconds in profile.breakdown()[:3])
+        }
+        for profile in reruns
+    ])
+    st.dataframe(summary, hide_index=True, use_container_width=True,
+                 column_config={'Total (ms)': st.column_config.NumberColumn(format="%.0f")})
+    
+    selected = st.selectbox(
+        "Rerun details",
+        options=range(len(reruns)),
+        format_func=lambda i: f"{reruns[i].started:%H:%M:%S} {reruns[i].page} ({reruns[i].total * 1000:.0f} ms)"
+    )
+    profile = reruns[selected]
+    details = pd.DataFrame([
+        {
+            'Call': "\u2003" * depth + name,
+            'Time (ms)': seconds * 1000,
+            'Share of Rerun': 100 * seconds / profile.total if profile.total else 0.0
+        }
+        for depth, name, seconds in profile.sections
+    ])
+    if details.empty:
+        st.info("Nothing was timed in this rerun.")
+    else:
+        st.dataframe(details, hide_index=True, use_container_width=True, column_config={
+            'Time (ms)': st.column_config.NumberColumn(format="%.1f"),
+            'Share of Rerun': st.column_config.ProgressColumn(min_value=0.0, max_value=100.0, format="%.0f%%")
+        })
+    
+    if profile.profile_file:
+        try:
+            with open(profile.profile_file, "rb") as f:
+                st.download_button("Download Sampled Stacks", f.read(),
+                                   file_name=os.path.basename(profile.profile_file))
+        except OSError as e:
+            print(f"Error reading profile: {str(e)}")
+    
+    if st.button("Clear Recorded Reruns"):
+        profiling.clear()
+        st.rerun()
+
 if __name__ == "__main__":
-    main()
+    with profiling.rerun(st.session_state.session_id, st.session_state.active_tab,
+                         st.session_state.profiling):
+        main()
@@ -0,0 +1,58 @@
+"""Market-basket analysis: which products are bought in the same order.
+
+Orders are turned into a sparse order x product incidence matrix X. The
+product x product co-occurrence counts are then X.T @ X, whose diagonal
+holds how many orders contain each product. Support, confidence and lift
+for every pair follow from those counts without looping over orders.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+PAIR_COLUMNS = ['product_name', 'with_product', 'orders', 'support', 'confidence', 'lift']
+
+
+def incidence_matrix(sales):
+    """Binary order x product matrix. Returns (matrix, product_names)."""
+    lines = sales[['order_number', 'product_name']].dropna().drop_duplicates()
+    order_codes, _ = pd.factorize(lines['order_number'])
+    product_codes, product_names = pd.factorize(lines['product_name'])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(lines), dtype=np.int32), (order_codes, product_codes)),
+        shape=(order_codes.max() + 1 if len(lines) else 0, len(product_names))
+    )
+    return matrix, np.asarray(product_names)
+
+def product_pairs(sales, min_orders=2):
+    """Association statistics for every ordered product pair.
+
+    A row (A, B) reads "orders with A also contain B": support is the share
+    of all orders with both, confidence is P(B | A) and lift is confidence
+    divided by P(B). Pairs seen in fewer than `min_orders` orders are dropped.
+    """
+    matrix, product_names = incidence_matrix(sales)
+    n_orders = matrix.shape[0]
+    if n_orders == 0:
+        return pd.DataFrame(columns=PAIR_COLUMNS)
+
+    co_occurrence = (matrix.T @ matrix).tocoo()
+    item_orders = matrix.sum(axis=0).A1
+
+    keep = (co_occurrence.row != co_occurrence.col) & (co_occurrence.data >= min_orders)
+    a = co_occurrence.row[keep]
+    b = co_occurrence.col[keep]
+    both = co_occurrence.data[keep].astype(float)
+
+    confidence = both / item_orders[a]
+    return pd.DataFrame({
+        'product_name': product_names[a],
+        'with_product': product_names[b],
+        'orders': both.astype(int),
+        'support': both / n_orders,
+        'confidence': confidence,
+        'lift': confidence / (item_orders[b] / n_orders)
+    }).sort_values(['lift', 'orders'], ascending=False, ignore_index=True)
+
+def top_pairs(pairs, per_product=5):
+    """The `per_product` strongest companions of each product, by lift."""
+    return pairs.groupby('product_name', sort=False).head(per_product)
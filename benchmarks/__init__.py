@@ -0,0 +1,11 @@
+"""Benchmarks for the analytics behind the dashboard.
+
+    python -m benchmarks.run --rows 10000 100000 1000000
+    python -m benchmarks.load_test --sessions 10 --rows 100000
+    python -m benchmarks.startup
+
+See benchmarks.datagen for the synthetic data, benchmarks.run for the timed
+analytics cases, benchmarks.load_test for the concurrent-session test and
+benchmarks.startup for cold-start timings. The last two run app.py against
+benchmarks.fake_supabase without network access.
+"""
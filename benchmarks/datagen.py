@@ -0,0 +1,174 @@
+"""Synthetic tea-shop data shaped like the Supabase tables.
+
+The generated frames have the same columns as stock_out, stock_in, wastage
+and products, with string dates as Supabase returns them. They are meant
+to stress the analytics the way real trading does:
+
+- product popularity and customer loyalty follow a Zipf-like curve, so a
+  few teas and regulars account for most sales;
+- orders have one to eight lines (mostly one or two) for one customer on
+  one date;
+- weekends sell more than weekdays;
+- every sale, and some wastage, points at a real stock_in batch.
+
+Everything is built with array operations, so 10M sales lines take tens of
+seconds and a few GB of memory.
+"""
+import numpy as np
+import pandas as pd
+
+TEA_TYPES = ["Black", "Green", "Oolong", "White", "Herbal", "Rooibos", "Chai", "Matcha"]
+SIZES = ["50g", "100g", "250g", "1kg"]
+DELIVERY_METHODS = ["Post", "Courier", "Collection", "Local Delivery"]
+SUPPLIERS = ["Leaf & Co", "Hillside Estates", "Silk Road Imports", "Darjeeling Direct",
+             "Green Valley", "Harbour Traders"]
+WASTAGE_REASONS = ["Expired", "Damaged", "Quality", "Spillage"]
+
+# Relative sales per weekday, Monday first
+WEEKDAY_WEIGHTS = np.array([0.9, 0.9, 1.0, 1.0, 1.1, 1.4, 1.2])
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _date_strings(days):
+    return np.asarray(pd.DatetimeIndex(days).strftime('%Y-%m-%d'), dtype=object)
+
+
+def generate(rows, seed=0, days=730, end_date=None):
+    """Build all four tables with about `rows` stock_out lines.
+
+    Returns a dict of DataFrames keyed by table name.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = pd.Timestamp(end_date or pd.Timestamp.now()).normalize()
+    n_products = int(np.clip(rows // 2000, 40, 2000))
+    n_customers = max(rows // 15, 50)
+
+    products = _products(rng, n_products)
+    stock_in = _stock_in(rng, products, max(rows // 50, 1), end_date, days)
+    stock_out = _stock_out(rng, rows, products, stock_in, n_customers, end_date, days)
+    wastage = _wastage(rng, stock_in, end_date)
+    return {"stock_out": stock_out, "stock_in": stock_in, "wastage": wastage, "products": products}
+
+
+def _products(rng, n):
+    types = rng.choice(TEA_TYPES, n)
+    names = np.array([f"{t} Tea {i + 1}" for i, t in enumerate(types)], dtype=object)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'name': names,
+        'category': types,
+        'sku': np.array([f"SKU-{i + 1:05d}" for i in range(n)], dtype=object),
+        'description': "",
+        'price': rng.uniform(4, 40, n).round(2),
+        'stock_level': rng.integers(0, 500, n),
+        'size': rng.choice(SIZES, n),
+        'reorder_level': rng.integers(10, 60, n),
+        'created_at': "2024-01-01"
+    })
+
+
+def _stock_in(rng, products, n_batches, end_date, days):
+    n_products = len(products)
+    # Popular products are restocked more often; every product has a few batches
+    batches_per_product = 3 + rng.multinomial(n_batches, _zipf_weights(n_products))
+    product_idx = np.repeat(np.arange(n_products), batches_per_product)
+    batch_seq = np.concatenate([np.arange(k) for k in batches_per_product])
+    n = len(product_idx)
+
+    received = end_date - pd.to_timedelta(rng.integers(0, days, n), unit='D')
+    best_before = received + pd.to_timedelta(rng.integers(120, 540, n), unit='D')
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'product_name': products['name'].to_numpy()[product_idx],
+        'type': products['category'].to_numpy()[product_idx],
+        'supplier_name': rng.choice(SUPPLIERS, n),
+        'invoice_number': np.array([f"INV-{i:06d}" for i in range(n)], dtype=object),
+        'batch_number': np.array([f"B{p:04d}-{s:03d}" for p, s in zip(product_idx, batch_seq)],
+                                 dtype=object),
+        'use_by_date': _date_strings(best_before + pd.Timedelta(days=60)),
+        'best_before': _date_strings(best_before),
+        'quantity': rng.integers(50, 1000, n),
+        'package_size': rng.choice([0.05, 0.1, 0.25, 1.0], n),
+        'price_per_unit': rng.uniform(8, 80, n).round(2),
+        'product_free_from_damage': True,
+        'labelling_match': True,
+        'product_status': "accepted",
+        'checked_by': "bench",
+        'date': _date_strings(received)
+    })
+
+
+def _stock_out(rng, rows, products, stock_in, n_customers, end_date, days):
+    # Lines per order: mostly one or two, occasionally up to eight
+    lines_per_order = np.minimum(rng.geometric(0.55, rows), 8)
+    lines_per_order = lines_per_order[:np.searchsorted(np.cumsum(lines_per_order), rows) + 1]
+    n_orders = len(lines_per_order)
+    order_idx = np.repeat(np.arange(n_orders), lines_per_order)[:rows]
+    n = len(order_idx)
+
+    # Order-level attributes
+    day_offsets = np.arange(days)
+    calendar = end_date - pd.to_timedelta(day_offsets, unit='D')
+    day_weights = WEEKDAY_WEIGHTS[calendar.dayofweek] * np.linspace(1.3, 0.7, days)
+    order_day = rng.choice(days, n_orders, p=day_weights / day_weights.sum())
+    order_dates = _date_strings(calendar)[order_day]
+    customers = np.array([f"Customer {i + 1}" for i in range(n_customers)], dtype=object)
+    order_customer = customers[rng.choice(n_customers, n_orders, p=_zipf_weights(n_customers, 0.8))]
+    order_numbers = np.array([f"ORD-{i:08d}" for i in range(n_orders)], dtype=object)
+    order_delivery = rng.choice(DELIVERY_METHODS, n_orders)
+
+    # Line-level attributes: a product and one of its batches
+    product_idx = rng.choice(len(products), n, p=_zipf_weights(len(products)))
+    counts = stock_in.groupby('product_name', sort=False).size().reindex(products['name']).to_numpy()
+    # stock_in rows are grouped by product, so batch k of product p is at starts[p] + k
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    batch_row = starts[product_idx] + rng.integers(0, 1 << 30, n) % counts[product_idx]
+
+    quantity = np.minimum(rng.geometric(0.6, n), 12)
+    price = products['price'].to_numpy()[product_idx]
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'date': order_dates[order_idx],
+        'customer_name': order_customer[order_idx],
+        'delivery_method': order_delivery[order_idx],
+        'order_number': order_numbers[order_idx],
+        'product_name': products['name'].to_numpy()[product_idx],
+        'type': products['category'].to_numpy()[product_idx],
+        'size': products['size'].to_numpy()[product_idx],
+        'sku': products['sku'].to_numpy()[product_idx],
+        'quantity': quantity,
+        'price_per_unit': price,
+        'total_price': (quantity * price).round(2),
+        'batch_number': stock_in['batch_number'].to_numpy()[batch_row],
+        'production_date': stock_in['date'].to_numpy()[batch_row],
+        'best_before': stock_in['best_before'].to_numpy()[batch_row],
+        'labelling_match': True,
+        'checked_by': "bench"
+    })
+
+
+def _wastage(rng, stock_in, end_date):
+    n = max(len(stock_in) // 5, 1)
+    rows = rng.choice(len(stock_in), n)
+    quantity = rng.integers(1, 20, n)
+    package_size = stock_in['package_size'].to_numpy()[rows]
+    price_per_kg = rng.uniform(20, 200, n).round(2)
+    dates = pd.to_datetime(stock_in['best_before'].to_numpy()[rows])
+    dates = dates.where(dates <= end_date, end_date)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'date': _date_strings(dates),
+        'product_name': stock_in['product_name'].to_numpy()[rows],
+        'reason': rng.choice(WASTAGE_REASONS, n),
+        'batch_number': stock_in['batch_number'].to_numpy()[rows],
+        'use_by_date': stock_in['use_by_date'].to_numpy()[rows],
+        'best_before': stock_in['best_before'].to_numpy()[rows],
+        'quantity': quantity,
+        'package_size': package_size,
+        'avg_price_per_kg': price_per_kg,
+        'total_cost': (price_per_kg * quantity * package_size).round(2),
+        'checked_by': "bench"
+    })
@@ -0,0 +1,239 @@
+"""In-memory stand-in for the Supabase client, for offline load tests.
+
+Supports the query builder calls the app makes: select, insert, upsert,
+update and delete with eq/neq/gt/gte/lt/lte/in_ filters, order, limit and
+range, csv() for the text/csv encoding, plus rpc() for the database
+functions the app calls. Rows live in
+plain lists of dicts behind one lock, and an optional per-request latency
+imitates the network round trip. Selecting or ordering by a column the
+rows do not have fails with PostgREST's undefined-column error.
+
+install() must run before data_manager makes its first query, since
+data_manager creates its client then.
+"""
+import csv
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+_OPERATORS = {
+    "eq": lambda value, target: value == target,
+    "neq": lambda value, target: value != target,
+    "gt": lambda value, target: value is not None and value > target,
+    "gte": lambda value, target: value is not None and value >= target,
+    "lt": lambda value, target: value is not None and value < target,
+    "lte": lambda value, target: value is not None and value <= target,
+    "in_": lambda value, targets: value in targets
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+def to_csv(rows):
+    """rows as PostgREST's text/csv body: a header line, NULLs as empty fields."""
+    if not rows:
+        return ""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    columns = list(rows[0])
+    writer.writerow(columns)
+    writer.writerows([_csv_value(row.get(column)) for column in columns] for row in rows)
+    return buffer.getvalue()
+
+
+class FakeQuery:
+    """One table query, built up the way postgrest's builder is."""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._payload = None
+        self._on_conflict = None
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._offset = 0
+        self._columns = None
+        self._csv = False
+
+    def select(self, *columns, **kwargs):
+        self._action = "select"
+        if columns and columns != ("*",):
+            self._columns = [column.strip() for text in columns for column in text.split(",")]
+        return self
+
+    def insert(self, data, **kwargs):
+        self._action, self._payload = "insert", data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict=None, **kwargs):
+        self._action, self._payload = "upsert", data if isinstance(data, list) else [data]
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, data, **kwargs):
+        self._action, self._payload = "update", data
+        return self
+
+    def delete(self, **kwargs):
+        self._action = "delete"
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, size, **kwargs):
+        self._limit = size
+        return self
+
+    def range(self, start, end, **kwargs):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def csv(self):
+        self._csv = True
+        return self
+
+    def __getattr__(self, name):
+        if name in _OPERATORS:
+            def add_filter(column, value):
+                self._filters.append((column, _OPERATORS[name], value))
+                return self
+            return add_filter
+        raise AttributeError(name)
+
+    def _matches(self, row):
+        return all(test(row.get(column), value) for column, test, value in self._filters)
+
+    def execute(self):
+        if self._client.latency:
+            time.sleep(self._client.latency)
+        with self._client.lock:
+            rows = self._client.tables.setdefault(self._table, [])
+            if self._action == "select":
+                self._check_columns(rows)
+                data = [row for row in rows if self._matches(row)] if self._filters else list(rows)
+                if self._order:
+                    column, desc = self._order
+                    data.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+                count = len(data)
+                data = data[self._offset:self._offset + self._limit if self._limit else None]
+                if self._columns:
+                    data = [{column: row.get(column) for column in self._columns} for row in data]
+                else:
+                    data = [dict(row) for row in data]
+                if self._csv:
+                    data = to_csv(data)
+            else:
+                count = None
+            if self._action == "insert":
+                data = [self._client.add_row(self._table, row) for row in self._payload]
+            elif self._action == "upsert":
+                data = [self._upsert(rows, row) for row in self._payload]
+            elif self._action == "update":
+                data = []
+                for row in rows:
+                    if self._matches(row):
+                        row.update(self._payload)
+                        data.append(dict(row))
+            elif self._action == "delete":
+                data = [dict(row) for row in rows if self._matches(row)]
+                self._client.tables[self._table] = [row for row in rows if not self._matches(row)]
+        return SimpleNamespace(data=data, count=len(data) if count is None else count)
+
+    def _check_columns(self, rows):
+        """Reject unknown columns the way PostgREST does (SQLSTATE 42703)."""
+        if not rows:
+            return
+        wanted = list(self._columns or []) + ([self._order[0]] if self._order else [])
+        missing = [column for column in wanted if column not in rows[0]]
+        if missing:
+            from postgrest.exceptions import APIError
+            raise APIError({"code": "42703", "message": f"column {self._table}.{missing[0]} does not exist"})
+
+    def _upsert(self, rows, record):
+        key = self._on_conflict or next(iter(record))
+        for row in rows:
+            if row.get(key) == record.get(key):
+                row.update(record)
+                return dict(row)
+        return self._client.add_row(self._table, record)
+
+
+class FakeSupabase:
+    """Holds the tables; hands out FakeQuery objects like Client.table()."""
+
+    def __init__(self, tables=None, latency=0.0):
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.tables = {}
+        self._next_id = {}
+        self.requests = 0
+        for name, rows in (tables or {}).items():
+            self.load(name, rows)
+
+    def load(self, name, rows):
+        """Replace a table with rows, given as a DataFrame or a list of dicts."""
+        if hasattr(rows, "to_dict"):
+            rows = rows.to_dict("records")
+        self.tables[name] = [dict(row) for row in rows]
+        self._next_id[name] = max((row.get("id") or 0 for row in self.tables[name]), default=0) + 1
+
+    def add_row(self, name, record):
+        row = dict(record)
+        if row.get("id") is None:
+            row["id"] = self._next_id.get(name, 1)
+        self._next_id[name] = max(self._next_id.get(name, 1), row["id"] + 1)
+        self.tables.setdefault(name, []).append(row)
+        return dict(row)
+
+    def table(self, name):
+        self.requests += 1
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name, params=None):
+        self.requests += 1
+        return FakeCall(self, getattr(self, "_rpc_" + name), params or {})
+
+    def _rpc_reserve_order_numbers(self, params):
+        sequences = self.tables.setdefault("order_sequences", [])
+        for row in sequences:
+            if row["day"] == params["p_day"]:
+                row["last_value"] += params["p_count"]
+                return row["last_value"]
+        sequences.append({"day": params["p_day"], "last_value": params["p_count"]})
+        return params["p_count"]
+
+
+class FakeCall:
+    """A pending rpc() call."""
+
+    def __init__(self, client, function, params):
+        self._client = client
+        self._function = function
+        self._params = params
+
+    def execute(self):
+        if self._client.latency:
+            time.sleep(self._client.latency)
+        with self._client.lock:
+            return SimpleNamespace(data=self._function(self._params))
+
+
+def install(tables=None, latency=0.0):
+    """Make supabase.create_client return a FakeSupabase. Returns the fake."""
+    import supabase
+
+    fake = FakeSupabase(tables, latency)
+    supabase.create_client = lambda *args, **kwargs: fake
+    return fake
@@ -0,0 +1,259 @@
+"""Concurrent-session load test for app.py, fully offline.
+
+Usage:
+    python -m benchmarks.load_test [--sessions 10] [--rows 100000]
+                                   [--iterations 3] [--latency-ms 0]
+
+The Supabase client is replaced by benchmarks.fake_supabase, seeded with
+benchmarks.datagen data, and every session drives app.py through
+Streamlit's AppTest in its own thread, the way the server runs one script
+thread per browser session in a single process. Each session clicks
+through Dashboard, Sales Entry, Stock Management and Search (including a
+few report types) --iterations times.
+
+One warm-up session runs first so the shared caches are loaded; its
+timings are reported separately as cold. The results list rerun latency
+percentiles per step, process CPU seconds and resident memory growth per
+session, and are written to JSON (default data/benchmarks/load-<timestamp>.json).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import datagen, fake_supabase
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+RESULTS_DIR = os.path.join("data", "benchmarks")
+PERCENTILES = (50, 90, 95, 99)
+
+NAVIGATION = [
+    ("sales_entry", "📝 New Sales Entry"),
+    ("stock", "📦 Stock Management"),
+    ("search", "🔍 Search Orders"),
+]
+REPORT_TYPES = ["Sales by Customer", "Sales Trends", "Stock Value"]
+
+
+def rss_mb():
+    """Resident memory of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def share_test_runtime():
+    """Let AppTest sessions run in parallel threads.
+
+    AppTest installs a mock Runtime singleton before each run and clears it
+    afterwards, so one session finishing would pull the runtime from under
+    the others still running. Keep serving the last runtime installed, and
+    set the app-test config flag globally rather than per run.
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+
+    latest = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest["runtime"] = cls._instance
+        if "runtime" not in latest:
+            raise RuntimeError("Runtime hasn't been created!")
+        return latest["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in latest)
+    config.set_option("global.appTest", True)
+
+
+def share_script_cache():
+    """Compile app.py once for every session.
+
+    AppTest gives each run a new ScriptCache, so every rerun parses the
+    script again, and on Python 3.11 ast.parse in parallel threads fails
+    with "AST constructor recursion depth mismatch". Route every instance
+    to one cache, whose lock lets a single thread compile, as the server's
+    shared cache does.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+
+def _sidebar_button(at, label):
+    return next(button for button in at.sidebar.button if button.label == label)
+
+def _selectbox(at, label):
+    return next(box for box in at.selectbox if box.label == label)
+
+
+class Session:
+    """One simulated user clicking through the app."""
+
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings = []     # (step, seconds)
+        self.errors = []
+
+    def _step(self, name, action):
+        started = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            self.errors.append(f"{name}: {type(e).__name__}: {str(e)}")
+            return
+        self.timings.append((name, time.perf_counter() - started))
+        if self.at.exception:
+            self.errors.extend(f"{name}: {exc.value}" for exc in self.at.exception)
+
+    def run(self, iterations):
+        self._step("dashboard", self.at.run)
+        for _ in range(iterations):
+            for name, label in NAVIGATION:
+                self._step(name, lambda: _sidebar_button(self.at, label).click().run())
+            for report in REPORT_TYPES:
+                self._step(f"search: {report}",
+                           lambda: _selectbox(self.at, "Select Report Type").select(report).run())
+            self._step("dashboard", lambda: _sidebar_button(self.at, "📊 Dashboard").click().run())
+        return self
+
+
+def summarize(timings):
+    """Latency percentiles in ms per step and overall."""
+    by_step = {}
+    for name, seconds in timings:
+        by_step.setdefault(name, []).append(seconds * 1000)
+    by_step["all"] = [seconds * 1000 for _, seconds in timings]
+
+    summary = {}
+    for name, values in by_step.items():
+        values = np.array(values)
+        summary[name] = {"count": len(values), "mean": float(values.mean()),
+                         "max": float(values.max())}
+        summary[name].update({f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES})
+    return summary
+
+
+def run(sessions, rows, iterations, latency_ms=0.0, timeout=120, seed=0):
+    """Seed the fake backend, warm up, then run the sessions concurrently."""
+    os.environ.setdefault("SALES_CHANGE_FEED", "none")
+    started = time.perf_counter()
+    fake = fake_supabase.install(datagen.generate(rows, seed=seed), latency=latency_ms / 1000)
+    print(f"Seeded fake backend with {rows:,} sales lines in {time.perf_counter() - started:.1f}s")
+
+    share_test_runtime()
+    share_script_cache()
+    rss_start = rss_mb()
+    warm = Session(timeout).run(1)
+    rss_warm = rss_mb()
+    print(f"Warm-up session: {sum(s for _, s in warm.timings):.2f}s, "
+          f"+{rss_warm - rss_start:.0f} MB for shared tables and caches")
+
+    requests_before = fake.requests
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    barrier = threading.Barrier(sessions)
+
+    def simulate(_):
+        session = Session(timeout)
+        barrier.wait()
+        return session.run(iterations)
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        finished = list(pool.map(simulate, range(sessions)))
+
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    rss_end = rss_mb()
+    timings = [timing for session in finished for timing in session.timings]
+    errors = [error for session in finished for error in session.errors]
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "sessions": sessions,
+            "rows": rows,
+            "iterations": iterations,
+            "latency_ms": latency_ms,
+            "cpus": os.cpu_count()
+        },
+        "cold": summarize(warm.timings),
+        "latency_ms": summarize(timings),
+        "reruns": len(timings),
+        "reruns_per_second": len(timings) / wall if wall else 0.0,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_session": cpu / sessions,
+        "cpu_utilisation": cpu / wall if wall else 0.0,
+        "rss_mb": {"start": rss_start, "warm": rss_warm, "end": rss_end},
+        "rss_mb_per_session": (rss_end - rss_warm) / sessions,
+        "backend_requests": fake.requests - requests_before,
+        "errors": errors[:50],
+        "error_count": len(errors)
+    }
+
+
+def print_report(results):
+    print(f"\n{results['meta']['sessions']} sessions, {results['reruns']} reruns in "
+          f"{results['wall_seconds']:.1f}s ({results['reruns_per_second']:.1f} reruns/s)")
+    header = "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+    print(f"  {'step':<28}{header}{'max':>9}  (ms)")
+    for name, stats in results["latency_ms"].items():
+        values = "".join(f"{stats['p' + str(p)]:>9.0f}" for p in PERCENTILES)
+        print(f"  {name:<28}{values}{stats['max']:>9.0f}")
+    print(f"CPU: {results['cpu_seconds']:.1f}s total, {results['cpu_seconds_per_session']:.2f}s "
+          f"per session, {results['cpu_utilisation']:.2f} cores busy on average")
+    print(f"Memory: {results['rss_mb']['end']:.0f} MB resident, "
+          f"{results['rss_mb_per_session']:.1f} MB per session beyond the shared caches")
+    print(f"Backend requests during the run: {results['backend_requests']}")
+    if results["error_count"]:
+        print(f"{results['error_count']} errors, first: {results['errors'][0]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for app.py")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent sessions")
+    parser.add_argument("--rows", type=int, default=100_000, help="stock_out lines to seed")
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Times each session clicks through the pages")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Simulated round trip per backend request")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per rerun")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the data")
+    parser.add_argument("--output", help="Results file (default data/benchmarks/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sessions, args.rows, args.iterations, args.latency_ms, args.timeout, args.seed)
+    print_report(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, "load-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 1 if results["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Time every analytics path behind the app on synthetic data.
+
+Usage:
+    python -m benchmarks.run [--rows 10000 100000 1000000] [--repeat 3]
+                             [--only search] [--output FILE] [--baseline FILE]
+
+Each case is run --repeat times per dataset size and the fastest and median
+times are written to a JSON file (default data/benchmarks/<timestamp>.json)
+together with the git commit and library versions. With --baseline, the
+results are compared with an earlier file and cases that got slower than
+--threshold are reported; the exit status is 1 if there are any.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import basket
+import cube
+import data_manager as dm
+import forecasting
+import partitions
+import range_totals
+import reports
+from benchmarks import datagen, fake_supabase
+from ledger import InventoryLedger
+from wastage_analytics import WastageAnalytics
+
+RESULTS_DIR = os.path.join("data", "benchmarks")
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+
+def _search_text(sales):
+    """A customer name fragment that matches a realistic share of rows."""
+    return str(sales['customer_name'].iloc[len(sales) // 2])[:-1]
+
+def _date_window(sales, days=90):
+    end = sales['date'].max()
+    return end - pd.Timedelta(days=days), end
+
+def _wastage_views(stock_in, wastage):
+    analytics = WastageAnalytics()
+    analytics.load(stock_in, wastage)
+    return analytics.by_product(), analytics.by_supplier(), analytics.cost_trend()
+
+def _ledger(stock_in, stock_out, wastage):
+    inventory = InventoryLedger()
+    inventory.load(stock_in, stock_out, wastage)
+    return inventory.products_frame()
+
+
+def build_cases(data):
+    """name -> zero-argument callable, in the order the app reaches them.
+
+    Raw tables are prepared once up front; the prepare_* cases time that
+    step on its own.
+    """
+    sales = reports.prepare_sales(data["stock_out"])
+    stock = reports.prepare_stock(data["stock_in"])
+    search = _search_text(sales)
+    window = _date_window(sales)
+    full_range = (sales['best_before'].min(), sales['best_before'].max())
+    by_month = partitions.PartitionedFrame(sales, 'date', stats_columns=['best_before'])
+    sales_cube = cube.SalesCube(sales)
+    last_month = sales['month'].max()
+    top_product = sales['product_name'].mode().iloc[0]
+    running = range_totals.SalesTotals()
+    running.load(data["stock_out"])
+    # stock_out as the API would send it in each wire format
+    json_body = data["stock_out"].to_json(orient="records")
+    csv_body = fake_supabase.to_csv(json.loads(json_body))
+
+    return {
+        # Decoding a whole-table response
+        "decode_json_stock_out": lambda: pd.DataFrame(json.loads(json_body)),
+        "decode_csv_stock_out": lambda: dm.parse_csv("stock_out", csv_body),
+        "prepare_sales": lambda: reports.prepare_sales(data["stock_out"]),
+        "prepare_stock": lambda: reports.prepare_stock(data["stock_in"]),
+        # Dashboard
+        "dashboard_metrics": lambda: reports.dashboard_metrics(sales),
+        "range_totals_build": lambda: range_totals.SalesTotals().load(data["stock_out"]),
+        "range_totals_query": lambda: running.totals(*window),
+        "range_totals_by_product": lambda: running.by_product(*window),
+        "daily_sales": lambda: reports.daily_sales(sales),
+        "orders_summary": lambda: reports.orders_summary(sales),
+        # Search page
+        "search_all_fields": lambda: reports.filter_sales(sales, search, "All Fields", window, full_range),
+        "search_customer": lambda: reports.filter_sales(sales, search, "Customer Name", window, full_range),
+        "search_dates_only": lambda: reports.filter_sales(sales, "", "All Fields", window, full_range),
+        "search_results_summary": lambda: reports.orders_summary(
+            reports.filter_sales(sales, search, "All Fields", window, full_range)),
+        "partition_sales": lambda: partitions.PartitionedFrame(sales, 'date', stats_columns=['best_before']),
+        "search_all_fields_partitioned": lambda: reports.filter_sales(
+            by_month.read(date=window, best_before=full_range), search, "All Fields"),
+        "daily_sales_partitioned": lambda: reports.daily_sales(
+            by_month.read(date=(window[1] - pd.Timedelta(days=30), window[1])), days=30,
+            end_date=window[1].date()),
+        # Reports
+        "sales_cube_build": lambda: cube.SalesCube(sales),
+        "drill_month_product": lambda: sales_cube.query(['product'], where={'month': last_month}),
+        "drill_product_customer": lambda: sales_cube.query(
+            ['customer'], where={'month': last_month, 'product': top_product}),
+        "drill_from_lines": lambda: sales[(sales['month'] == last_month)
+                                                    & (sales['product_name'] == top_product)].groupby(
+            'customer_name').agg(quantity=('quantity', 'sum'), revenue=('total_price', 'sum'),
+                                 orders=('order_number', 'nunique')),
+        "sales_by_product": lambda: reports.sales_by_product(sales),
+        "sales_by_customer": lambda: reports.sales_by_customer(sales),
+        "monthly_sales": lambda: reports.monthly_sales(sales),
+        "weekday_sales": lambda: reports.weekday_sales(sales),
+        "rfm_analysis": lambda: reports.rfm_segment_counts(reports.rfm_analysis(sales)),
+        "cohort_retention": lambda: reports.cohort_retention(sales),
+        "product_pairs": lambda: basket.top_pairs(basket.product_pairs(sales)),
+        "forecast_demand": lambda: forecasting.forecast_demand(sales),
+        # Stock and expiry
+        "stock_value_by_type": lambda: reports.stock_value_by_type(stock),
+        "stock_value_details": lambda: reports.stock_value_details(stock),
+        "expiry_summary": lambda: reports.expiry_summary(stock),
+        "expiring_soon": lambda: reports.expiring_soon(stock),
+        "wastage_analysis": lambda: _wastage_views(data["stock_in"], data["wastage"]),
+        "inventory_ledger": lambda: _ledger(data["stock_in"], data["stock_out"], data["wastage"]),
+        # Headless report runner
+        "compute_all_reports": lambda: reports.compute_all_reports(data["stock_out"], data["stock_in"])
+    }
+
+
+def time_case(func, repeat):
+    """Run func `repeat` times and return the wall-clock seconds of each run."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def run(rows_list, repeat=3, only=None, seed=0):
+    """Benchmark every case at each dataset size. Returns the results dict."""
+    results = {"meta": _metadata(repeat, seed), "datasets": []}
+    for rows in rows_list:
+        started = time.perf_counter()
+        data = datagen.generate(rows, seed=seed)
+        generated = time.perf_counter() - started
+        print(f"\n{rows:,} sales lines ({len(data['stock_in']):,} batches, "
+              f"{data['stock_out']['order_number'].nunique():,} orders), generated in {generated:.1f}s")
+
+        cases = {}
+        for name, func in build_cases(data).items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            timings = time_case(func, repeat)
+            cases[name] = {"min": min(timings), "median": statistics.median(timings)}
+            print(f"  {name:<24}{cases[name]['min'] * 1000:>11.1f} ms")
+
+        results["datasets"].append({
+            "rows": rows,
+            "tables": {table: len(df) for table, df in data.items()},
+            "cases": cases
+        })
+        del data
+    return results
+
+def _metadata(repeat, seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "seed": seed
+    }
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than `threshold` x their baseline minimum time."""
+    previous = {
+        (dataset["rows"], name): case["min"]
+        for dataset in baseline["datasets"] for name, case in dataset["cases"].items()
+    }
+    regressions = []
+    for dataset in results["datasets"]:
+        for name, case in dataset["cases"].items():
+            before = previous.get((dataset["rows"], name))
+            if before and case["min"] > before * threshold:
+                regressions.append((dataset["rows"], name, before, case["min"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard analytics")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="stock_out sizes to generate, e.g. 10000 1000000 10000000")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument("--only", nargs="+", help="Run only cases whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the data")
+    parser.add_argument("--output", help="Results file (default data/benchmarks/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slowdown factor reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.repeat, args.only, args.seed)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for rows, name, before, after in regressions:
+            print(f"Slower: {name} at {rows:,} rows, {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
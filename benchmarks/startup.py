@@ -0,0 +1,141 @@
+"""Cold-start timing report for app.py.
+
+Usage:
+    python -m benchmarks.startup [--live] [--rows 20000] [--top 15] [--output FILE]
+
+Each measurement runs in a fresh interpreter, as a new worker or replica
+would:
+
+- imports: `python -X importtime -c "import app"`, broken down by the
+  modules app.py pulls in directly;
+- first render: app.py run once through AppTest (cold, including data
+  loading) and then again (warm), against benchmarks.fake_supabase seeded
+  with --rows sales lines, or against the real backend with --live.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _child_env():
+    env = dict(os.environ)
+    env.setdefault("SALES_CHANGE_FEED", "none")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times():
+    """(total seconds, {module: cumulative seconds}) for importing app.py."""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            cwd=REPO_DIR, env=_child_env(), capture_output=True, text=True)
+    wall = time.perf_counter() - started
+
+    direct = {}
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue    # header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        seconds = int(cumulative) / 1e6
+        # Imports finish innermost first, so app's own line comes last
+        if name.strip() == "app" and depth == 0:
+            total = seconds
+        elif depth == 1:
+            direct[name.strip()] = direct.get(name.strip(), 0.0) + seconds
+    return {"wall": wall, "app_import": total, "modules": direct}
+
+
+def first_render(live, rows):
+    """Run the render measurement in a fresh interpreter and return its timings."""
+    command = [sys.executable, "-m", "benchmarks.startup", "--child-render", "--rows", str(rows)]
+    if live:
+        command.append("--live")
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_DIR, env=_child_env(), capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    try:
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError(f"Render run failed:\n{result.stderr[-2000:]}")
+    timings["process_wall"] = wall
+    return timings
+
+
+def _render_in_process(live, rows):
+    started = time.perf_counter()
+    if not live:
+        from benchmarks import datagen, fake_supabase
+        fake_supabase.install(datagen.generate(rows))
+    seeded = time.perf_counter()
+
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=300)
+    harness = time.perf_counter()
+    at.run()
+    first = time.perf_counter()
+    at.run()
+    second = time.perf_counter()
+
+    return {
+        "seed_backend": seeded - started,
+        "import_harness": harness - seeded,
+        "first_render": first - harness,
+        "warm_render": second - first,
+        "errors": [str(exc.value) for exc in at.exception]
+    }
+
+
+def print_report(report, top):
+    imports = report["imports"]
+    print(f"Importing app.py: {imports['app_import'] or 0:.2f}s "
+          f"({imports['wall']:.2f}s including interpreter start)")
+    for name, seconds in sorted(imports["modules"].items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:<32}{seconds * 1000:>9.0f} ms")
+
+    render = report["render"]
+    backend = "live backend" if report["live"] else f"fake backend, {report['rows']:,} sales lines"
+    print(f"\nFirst render ({backend}):")
+    print(f"  {'first rerun (cold)':<32}{render['first_render'] * 1000:>9.0f} ms")
+    print(f"  {'second rerun (warm)':<32}{render['warm_render'] * 1000:>9.0f} ms")
+    print(f"  {'whole process':<32}{render['process_wall'] * 1000:>9.0f} ms")
+    if render["errors"]:
+        print(f"  errors: {render['errors'][:3]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start timing report for app.py")
+    parser.add_argument("--live", action="store_true", help="Use the real Supabase backend")
+    parser.add_argument("--rows", type=int, default=20_000, help="Sales lines for the fake backend")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--output", help="Also write the report as JSON")
+    parser.add_argument("--child-render", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child_render:
+        print(json.dumps(_render_in_process(args.live, args.rows)))
+        return 0
+
+    report = {
+        "live": args.live,
+        "rows": args.rows,
+        "imports": import_times(),
+        "render": first_render(args.live, args.rows)
+    }
+    print_report(report, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["render"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
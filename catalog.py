@@ -0,0 +1,340 @@
+"""Product catalogue lookups for the entry forms.
+
+Built once from the products and stock_in tables and kept up to date from
+data_manager's write notifications. Three structures back the lookups:
+
+- a prefix trie over product names, indexed from the start of every word,
+  so "gre" suggests "Sencha Green Tea";
+- a map from SKU to product record;
+- the batches received for each product, with their dates.
+
+Suggestions walk only the part of the trie under the typed prefix and stop
+after `limit` names, so they take well under a millisecond however large
+the catalogue is.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+import data_manager as dm
+import shared_cache
+
+CATALOG_TABLES = ("products", "stock_in")
+
+# Suggestions returned by default
+SUGGESTION_LIMIT = 10
+
+# Trie depth; keys longer than this share the node at this depth
+TRIE_DEPTH = 4
+
+# Columns read from each table
+PRODUCT_COLUMNS = ['id', 'name', 'category', 'size', 'sku', 'price']
+STOCK_COLUMNS = ['id', 'product_name', 'batch_number', 'best_before', 'use_by_date', 'type',
+                 'supplier_name', 'package_size', 'price_per_unit']
+
+# Trie key holding the sorted (key, value) pairs stored at a node
+_END = ""
+
+
+def _clean(value):
+    """value, or None when it is missing."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+def _records(df, columns):
+    """Rows of df as dicts, limited to the columns it has out of `columns`."""
+    if df.empty:
+        return []
+    return df[[column for column in columns if column in df.columns]].to_dict('records')
+
+def _keys(name):
+    """Trie keys for a name: the lowercased name from the start of each word."""
+    words = name.lower().split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+class PrefixTrie:
+    """Maps string keys to values; finds every value under a prefix.
+
+    Nodes go `depth` characters deep. Each node keeps the (key, value)
+    pairs that end there, or that are longer than `depth`, in a sorted
+    list, so a long prefix is finished off with a binary search. That
+    keeps building fast without making lookups slower.
+    """
+
+    def __init__(self, depth=TRIE_DEPTH):
+        self.depth = depth
+        self._root = {}
+
+    def _node(self, key, create=False):
+        node = self._root
+        for char in key[:self.depth]:
+            child = node.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node[char] = {}
+            node = child
+        return node
+
+    def insert(self, key, value):
+        items = self._node(key, create=True).setdefault(_END, [])
+        index = bisect.bisect_left(items, (key, value))
+        if index == len(items) or items[index] != (key, value):
+            items.insert(index, (key, value))
+
+    def extend(self, pairs):
+        """Insert many (key, value) pairs, sorting each node once."""
+        touched = {}
+        for key, value in pairs:
+            items = self._node(key, create=True).setdefault(_END, [])
+            items.append((key, value))
+            touched[id(items)] = items
+        for items in touched.values():
+            items[:] = sorted(set(items))
+
+    def remove(self, key, value):
+        node = self._node(key)
+        items = node.get(_END, []) if node is not None else []
+        index = bisect.bisect_left(items, (key, value))
+        if index < len(items) and items[index] == (key, value):
+            del items[index]
+
+    def complete(self, prefix, limit):
+        """Up to `limit` distinct values whose key starts with prefix, by key order."""
+        node = self._node(prefix)
+        if node is None:
+            return []
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            items = node.get(_END, [])
+            for index in range(bisect.bisect_left(items, (prefix,)), len(items)):
+                key, value = items[index]
+                if not key.startswith(prefix) or len(found) >= limit:
+                    break
+                if value not in found:
+                    found.append(value)
+            # Reversed so the smallest child is visited next
+            stack.extend(node[char] for char in sorted(node, reverse=True) if char != _END)
+        return found
+
+
+class Catalog:
+    """Product records by name and SKU, name suggestions and batches per product."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._synced = {}   # table -> shared_cache generation last loaded from
+        self._reset()
+
+    def _reset(self):
+        self._trie = PrefixTrie()
+        self._products = {}                 # name -> product record
+        self._by_sku = {}                   # SKU (upper case) -> product record
+        self._product_ids = {}              # products id -> name
+        self._batches = defaultdict(dict)   # name -> {batch: batch record}
+        self._stock_rows = {}               # stock_in id -> (name, batch)
+        self._batch_rows = defaultdict(set) # (name, batch) -> stock_in ids
+        self._name_rows = defaultdict(set)  # name -> stock_in ids, None for rows without one
+        self._last_stock = {}               # name -> latest stock_in record
+
+    ### READING ###
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        """Product names with a word starting with prefix."""
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+        with self._lock:
+            return self._trie.complete(prefix, limit)
+
+    def product(self, name):
+        """Everything known about a product: its catalogue entry merged with its last delivery."""
+        with self._lock:
+            record = self._products.get(name)
+            stock = self._last_stock.get(name)
+        if record is None and stock is None:
+            return None
+        merged = {'name': name, 'type': None, 'size': None, 'sku': None, 'price': None,
+                  'supplier_name': None, 'package_size': None, 'cost_per_unit': None}
+        if stock:
+            merged.update(type=stock['type'], supplier_name=stock['supplier_name'],
+                          package_size=stock['package_size'], cost_per_unit=stock['price_per_unit'])
+        if record:
+            merged.update({key: value for key, value in record.items() if value is not None})
+        if merged['cost_per_unit'] and merged['package_size']:
+            merged['cost_per_kg'] = merged['cost_per_unit'] / merged['package_size']
+        else:
+            merged['cost_per_kg'] = None
+        return merged
+
+    def by_sku(self, sku):
+        """The product with this SKU, or None."""
+        with self._lock:
+            record = self._by_sku.get(str(sku).strip().upper())
+        return self.product(record['name']) if record else None
+
+    def batches(self, name):
+        """Batches received for a product, earliest best_before first."""
+        with self._lock:
+            batches = list(self._batches.get(name, {}).values())
+        return sorted(batches, key=lambda batch: (batch['best_before'] is None, batch['best_before']))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._products.keys() | self._last_stock.keys())
+
+    ### UPDATING ###
+
+    def load(self, products_df, stock_in_df):
+        """Add every row of both tables. Rows already loaded are replaced."""
+        products = _records(products_df, PRODUCT_COLUMNS)
+        stock_in_df = stock_in_df.copy()
+        for column in ('best_before', 'use_by_date'):
+            if column in stock_in_df.columns:
+                stock_in_df[column] = pd.to_datetime(stock_in_df[column], errors='coerce')
+        stock = _records(stock_in_df, STOCK_COLUMNS)
+        with self._lock:
+            names = {self._add_product(record, index=False) for record in products}
+            names |= {self._add_stock(record, index=False) for record in stock}
+            names.discard(None)
+            self._trie.extend((key, name) for name in names for key in _keys(name))
+
+    def apply(self, table, action, records):
+        """data_manager write notification."""
+        if table not in CATALOG_TABLES:
+            return
+        if action == "refresh":
+            generations = {name: shared_cache.generation(name) for name in CATALOG_TABLES}
+            if generations != self._synced:
+                products_df, stock_in_df = shared_cache.table("products"), shared_cache.table("stock_in")
+                with self._lock:
+                    self._reset()
+                    self.load(products_df, stock_in_df)
+                self._synced = generations
+            return
+        with self._lock:
+            for record in records:
+                if table == "products":
+                    (self._add_product if action == "insert" else self._remove_product)(record)
+                else:
+                    (self._add_stock if action == "insert" else self._remove_stock)(record)
+
+    def _index(self, name):
+        for key in _keys(name):
+            self._trie.insert(key, name)
+
+    def _unindex(self, name):
+        if name in self._products or name in self._last_stock:
+            return
+        for key in _keys(name):
+            self._trie.remove(key, name)
+
+    def _add_product(self, record, index=True):
+        name = _clean(record.get('name'))
+        if not name:
+            return
+        sku = _clean(record.get('sku'))
+        product = {
+            'name': name,
+            'type': _clean(record.get('category')),
+            'size': _clean(record.get('size')),
+            'sku': str(sku) if sku is not None else None,
+            'price': _clean(record.get('price'))
+        }
+        self._products[name] = product
+        if product['sku']:
+            self._by_sku[product['sku'].strip().upper()] = product
+        if record.get('id') is not None:
+            self._product_ids[record['id']] = name
+        if index:
+            self._index(name)
+        return name
+
+    def _remove_product(self, record):
+        name = _clean(record.get('name')) or self._product_ids.get(record.get('id'))
+        product = self._products.pop(name, None)
+        self._product_ids.pop(record.get('id'), None)
+        if product is None:
+            return
+        if product['sku']:
+            self._by_sku.pop(product['sku'].strip().upper(), None)
+        self._unindex(name)
+
+    def _add_stock(self, record, index=True):
+        name = _clean(record.get('product_name'))
+        if not name:
+            return
+        batch = _clean(record.get('batch_number'))
+        if batch is not None:
+            batch = str(batch)
+            entry = {
+                'batch_number': batch,
+                'best_before': _clean(pd.to_datetime(record.get('best_before'), errors='coerce')),
+                'use_by_date': _clean(pd.to_datetime(record.get('use_by_date'), errors='coerce'))
+            }
+            existing = self._batches[name].get(batch)
+            if existing is None or (entry['best_before'] is not None and (
+                    existing['best_before'] is None or entry['best_before'] < existing['best_before'])):
+                self._batches[name][batch] = entry
+            if record.get('id') is not None:
+                self._batch_rows[(name, batch)].add(record['id'])
+        if record.get('id') is not None:
+            self._stock_rows[record['id']] = (name, batch)
+        self._name_rows[name].add(record.get('id'))
+        self._last_stock[name] = {
+            'type': _clean(record.get('type')),
+            'supplier_name': _clean(record.get('supplier_name')),
+            'package_size': _clean(record.get('package_size')),
+            'price_per_unit': _clean(record.get('price_per_unit'))
+        }
+        if index:
+            self._index(name)
+        return name
+
+    def _remove_stock(self, record):
+        key = self._stock_rows.pop(record.get('id'), None)
+        if key is None:
+            return
+        name, batch = key
+        if batch is not None:
+            ids = self._batch_rows[key]
+            ids.discard(record.get('id'))
+            if not ids:
+                del self._batch_rows[key]
+                self._batches[name].pop(batch, None)
+        rows = self._name_rows[name]
+        rows.discard(record.get('id'))
+        if not rows:
+            # Its last stock row is gone; keep the name only if it is still a product
+            del self._name_rows[name]
+            self._batches.pop(name, None)
+            self._last_stock.pop(name, None)
+            self._unindex(name)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """Return the process-wide catalogue, building it on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            catalog = Catalog()
+            # Subscribe before loading so no write is missed
+            dm.subscribe(catalog.apply)
+            catalog._synced = {name: shared_cache.generation(name) for name in CATALOG_TABLES}
+            catalog.load(shared_cache.table("products"), shared_cache.table("stock_in"))
+            _catalog = catalog
+        return _catalog
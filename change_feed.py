@@ -0,0 +1,205 @@
+"""Change feed that keeps several app server processes in step.
+
+Every write made through data_manager is published as a table-changed
+event. Each process polls the feed and, for events published by other
+processes, calls data_manager.mark_changed(table). That bumps the local
+table version, so the shared cache and anything derived from the table
+reload, and tells incremental structures (ledger, allocator, ...) to
+re-sync that one table. Tables nobody changed stay cached.
+
+Backends, chosen with SALES_CHANGE_FEED:
+
+- "file" (default): an append-only log file shared by processes on one
+  host, at SALES_CHANGE_FEED_PATH.
+- "supabase": an append-only events table read by its serial id, for
+  processes on different hosts. Ids are only ever read past the highest
+  one seen, and each event keeps its own source, so events from several
+  processes on the same table are never merged. Events older than
+  SALES_CHANGE_FEED_RETENTION seconds are pruned by whichever process
+  publishes. See migrations/table_changes.sql for the table.
+- "none": no cross-process invalidation.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import data_manager as dm
+
+FEED_BACKEND = os.environ.get("SALES_CHANGE_FEED", "file")
+FEED_PATH = os.environ.get("SALES_CHANGE_FEED_PATH", os.path.join("data", "change_feed.log"))
+POLL_INTERVAL = float(os.environ.get("SALES_CHANGE_FEED_POLL", "1.0"))
+
+# Events kept in the supabase feed; far longer than any process goes without polling
+RETENTION_SECONDS = float(os.environ.get("SALES_CHANGE_FEED_RETENTION", "86400"))
+
+# Ids below the highest one read that are read again, for late commits
+ID_OVERLAP = 100
+
+# Start a fresh log file once it grows past this size
+MAX_FEED_BYTES = 1_000_000
+
+ALL_TABLES = ("stock_out", "stock_in", "wastage", "products")
+
+# Identifies this process in published events
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class FileChangeFeed:
+    """Change events as JSON lines appended to a shared file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = None
+        self._inode = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def publish(self, table):
+        line = json.dumps({"table": table, "source": INSTANCE_ID, "time": time.time()}) + "\n"
+        try:
+            if os.path.getsize(self.path) > MAX_FEED_BYTES:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass
+        # A single O_APPEND write keeps lines from different processes whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def poll(self):
+        """Tables changed by other processes since the last poll."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._offset is None:
+                # Nothing published yet; read the file from the start once it appears
+                self._offset, self._inode = 0, None
+            return set()
+
+        if self._offset is None:
+            # First poll: only later events matter
+            self._offset, self._inode = stat.st_size, stat.st_ino
+            return set()
+
+        changed = set()
+        if self._inode is None:
+            self._inode = stat.st_ino
+        elif stat.st_ino != self._inode or stat.st_size < self._offset:
+            # The log was rotated and events may have been missed
+            self._offset, self._inode = 0, stat.st_ino
+            changed = set(ALL_TABLES)
+        if stat.st_size == self._offset:
+            return changed
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Leave a partly written last line for the next poll
+        complete = data.rfind(b"\n") + 1
+        self._offset += complete
+        for line in data[:complete].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("source") != INSTANCE_ID:
+                changed.add(event.get("table"))
+        return changed
+
+
+class SupabaseChangeFeed:
+    """Change events as rows of the table_changes table, read by increasing id."""
+
+    TABLE = "table_changes"
+
+    def __init__(self):
+        self._last_id = None
+        self._seen = set()      # ids read within ID_OVERLAP of the cursor
+        self._last_prune = 0.0
+
+    def publish(self, table):
+        client = dm.get_client()
+        client.table(self.TABLE).insert({"table_name": table, "source": INSTANCE_ID}).execute()
+        now = time.time()
+        if now - self._last_prune >= RETENTION_SECONDS / 10:
+            self._last_prune = now
+            cutoff = datetime.fromtimestamp(now - RETENTION_SECONDS, timezone.utc).isoformat()
+            client.table(self.TABLE).delete().lt("changed_at", cutoff).execute()
+
+    def poll(self):
+        query = dm.get_client().table(self.TABLE).select("id, table_name, source")
+        if self._last_id is None:
+            # First poll: only later events matter
+            latest = query.order("id", desc=True).limit(ID_OVERLAP).execute().data or []
+            self._last_id = latest[0]["id"] if latest else 0
+            self._seen = {row["id"] for row in latest}
+            return set()
+        # Ids are handed out before commit, so a lower id can still appear
+        # after a higher one was read; re-read a short overlap for those
+        rows = query.gt("id", self._last_id - ID_OVERLAP).order("id").execute().data or []
+        rows = [row for row in rows if row["id"] not in self._seen]
+        for row in rows:
+            self._seen.add(row["id"])
+            self._last_id = max(self._last_id, row["id"])
+        self._seen = {seen for seen in self._seen if seen > self._last_id - ID_OVERLAP}
+        return {row["table_name"] for row in rows if row["source"] != INSTANCE_ID}
+
+
+def _create_feed():
+    if FEED_BACKEND == "file":
+        return FileChangeFeed(FEED_PATH)
+    if FEED_BACKEND == "supabase":
+        return SupabaseChangeFeed()
+    return None
+
+_feed = _create_feed()
+_poll_lock = threading.Lock()
+_last_poll = 0.0
+
+
+def _publish(table, action, records):
+    """data_manager write notification: tell the other processes."""
+    if action == "refresh":
+        # Came from the feed, or from a manual refresh; nothing new to announce
+        return
+    try:
+        _feed.publish(table)
+    except Exception as e:
+        print(f"Error publishing change for {table}: {str(e)}")
+
+def poll(force=False):
+    """Apply changes published by other processes. Returns the tables invalidated.
+
+    Cheap to call on every rerun: it does nothing if polled less than
+    SALES_CHANGE_FEED_POLL seconds ago.
+    """
+    global _last_poll
+    if _feed is None:
+        return set()
+    with _poll_lock:
+        now = time.monotonic()
+        if not force and now - _last_poll < POLL_INTERVAL:
+            return set()
+        _last_poll = now
+        try:
+            changed = _feed.poll()
+        except Exception as e:
+            print(f"Error polling change feed: {str(e)}")
+            return set()
+    for table in changed:
+        if table in ALL_TABLES:
+            dm.mark_changed(table)
+    return changed
+
+
+if _feed is not None:
+    dm.subscribe(_publish)
+    # Record the current position so older events are not replayed
+    poll(force=True)
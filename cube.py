@@ -0,0 +1,130 @@
+"""A small OLAP cube over the sales lines, for drill-down reports.
+
+Dimensions are day, month, product, type, customer and delivery_method;
+measures are quantity, revenue and distinct orders. The cube keeps:
+
+- the base cuboid: quantity and revenue summed for every combination of
+  all six dimensions;
+- the distinct order keys: each order once per combination of dimensions
+  it appears under, so distinct orders can be counted for any grouping
+  (they cannot be added up across products the way quantity can);
+- coarse cuboids, materialised up front for the groupings the reports use,
+  with exact order counts.
+
+A query names the dimensions to group by and the members to slice on. It is
+answered straight from a materialised cuboid when one has exactly those
+dimensions, and otherwise rolled up from the smallest cuboid that covers
+them. The sales lines themselves are not read again after the build.
+
+    sales_cube = SalesCube(sales)
+    sales_cube.query(['product'], where={'month': '2025-03'})
+"""
+import pandas as pd
+
+DIMENSIONS = ["day", "month", "product", "type", "customer", "delivery_method"]
+MEASURES = ["quantity", "revenue", "orders"]
+
+# Sales columns behind each dimension; day and month come from 'date'
+SOURCE_COLUMNS = {"product": "product_name", "type": "type",
+                  "customer": "customer_name", "delivery_method": "delivery_method"}
+
+# Groupings materialised when the cube is built
+MATERIALISED = [
+    (),
+    ("month",), ("product",), ("type",), ("customer",), ("delivery_method",),
+    ("month", "product"), ("month", "type"), ("month", "customer"), ("month", "delivery_method"),
+    ("type", "product"), ("month", "type", "product"), ("month", "product", "customer")
+]
+
+# Member shown for a missing value
+MISSING = "(none)"
+
+
+def _dimension_frame(sales):
+    """One row per sales line: the dimensions, the order and the additive measures."""
+    dates = pd.to_datetime(sales['date'], errors='coerce').dt.normalize()
+    # Month labels are built once per distinct month rather than once per line
+    codes = (dates.dt.year * 100 + dates.dt.month).fillna(0).astype(int)
+    months = {code: f"{code // 100:04d}-{code % 100:02d}" if code else MISSING for code in codes.unique()}
+    frame = pd.DataFrame({
+        "day": dates,
+        "month": pd.Categorical(codes.map(months)),
+        "quantity": pd.to_numeric(sales['quantity'], errors='coerce').fillna(0),
+        "revenue": pd.to_numeric(sales['total_price'], errors='coerce').fillna(0.0),
+        "order": pd.Categorical(sales['order_number'].fillna(MISSING).astype(str))
+    })
+    for dimension, column in SOURCE_COLUMNS.items():
+        values = sales[column] if column in sales.columns else pd.Series(MISSING, index=sales.index)
+        frame[dimension] = pd.Categorical(values.fillna(MISSING).astype(str))
+    return frame
+
+def _select(cells, where):
+    """Cells matching every slice; a slice is one member or a list of members."""
+    for dimension, members in where.items():
+        if isinstance(members, (list, tuple, set)):
+            cells = cells[cells[dimension].isin(list(members))]
+        else:
+            cells = cells[cells[dimension] == members]
+    return cells
+
+def _group(cells, by):
+    return cells.groupby(list(by), observed=True, dropna=False, sort=False)
+
+def _roll_up(cells, orders, by):
+    """Sum quantity and revenue of the cells and count the distinct orders, by `by`."""
+    if not by:
+        return pd.DataFrame({"quantity": [cells['quantity'].sum()], "revenue": [cells['revenue'].sum()],
+                             "orders": [orders['order'].nunique()]})
+    sums = _group(cells, by)[["quantity", "revenue"]].sum()
+    counts = _group(orders, by)['order'].nunique()
+    sums["orders"] = counts.reindex(sums.index, fill_value=0)
+    return sums.reset_index()
+
+
+class SalesCube:
+    """Quantity, revenue and distinct orders over the sales dimensions."""
+
+    def __init__(self, sales, materialised=MATERIALISED):
+        frame = _dimension_frame(sales)
+        self._base = _group(frame, DIMENSIONS)[["quantity", "revenue"]].sum().reset_index()
+        self._base = self._base[(self._base['quantity'] != 0) | (self._base['revenue'] != 0)]
+        self._orders = frame[DIMENSIONS + ["order"]].drop_duplicates()
+        self._cuboids = {}  # frozenset of dimensions -> cells with every measure
+        for grain in materialised:
+            self._cuboids[frozenset(grain)] = _roll_up(self._base, self._orders, list(grain))
+
+    def cuboids(self):
+        """Materialised groupings with their cell counts, coarsest first."""
+        rows = [{'dimensions': ", ".join(d for d in DIMENSIONS if d in grain) or "(total)", 'cells': len(cells)}
+                for grain, cells in self._cuboids.items()]
+        rows.append({'dimensions': "(base) " + ", ".join(DIMENSIONS), 'cells': len(self._base)})
+        return pd.DataFrame(rows).sort_values('cells', kind='stable').reset_index(drop=True)
+
+    def query(self, by=(), where=None):
+        """Measures grouped by the `by` dimensions, for the cells in every slice of `where`.
+
+        `where` maps dimensions to one member or a list of members. Rows come
+        back by revenue, largest first.
+        """
+        by = list(by)
+        where = {dimension: members for dimension, members in (where or {}).items() if members is not None}
+        needed = frozenset(by) | frozenset(where)
+
+        single = all(not isinstance(members, (list, tuple, set)) for members in where.values())
+        if needed in self._cuboids and single:
+            # Slicing single members of a cuboid with exactly these dimensions keeps its order counts
+            result = _select(self._cuboids[needed], where)
+            result = result[by + MEASURES] if by else result[MEASURES]
+        else:
+            covering = [grain for grain in self._cuboids if needed <= grain]
+            cells = self._cuboids[min(covering, key=lambda grain: len(self._cuboids[grain]))] if covering else self._base
+            result = _roll_up(_select(cells, where), _select(self._orders, where), by)
+
+        if not by:
+            return result.reset_index(drop=True) if len(result) else pd.DataFrame({measure: [0] for measure in MEASURES})
+        result = result[result['orders'] > 0]
+        return result.sort_values('revenue', ascending=False, kind='stable').reset_index(drop=True)
+
+    def members(self, dimension, where=None):
+        """Members of a dimension present in the slice, in their natural order."""
+        return sorted(self.query([dimension], where)[dimension].tolist(), key=str)
@@ -0,0 +1,111 @@
+"""Per-product demand forecasting on stock_out.
+
+Sales are pivoted into a dense product x day matrix and every product is
+fitted at once with array operations:
+
+- simple exponential smoothing, where the final level is a weighted sum of
+  the history, i.e. one matrix-vector product for all products;
+- seasonal naive, repeating the last week.
+
+Each product uses whichever model had the lower error on a holdout of the
+most recent weeks.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SEASON_LENGTH = 7
+DEFAULT_HISTORY_DAYS = 180
+DEFAULT_ALPHA = 0.3
+
+
+def demand_matrix(sales, history_days=DEFAULT_HISTORY_DAYS, end_date=None):
+    """Daily quantity sold per product.
+
+    Returns (product_names, dates, matrix) where matrix[i, j] is the quantity
+    of product i sold on dates[j]. Days without sales are zero.
+    """
+    end = pd.Timestamp(end_date or datetime.now().date()).normalize()
+    start = end - pd.Timedelta(days=history_days - 1)
+    dates = pd.date_range(start, end)
+
+    days = (sales['date'].dt.normalize() - start).dt.days.to_numpy(dtype=float)
+    codes, product_names = pd.factorize(sales['product_name'])
+    quantity = np.nan_to_num(pd.to_numeric(sales['quantity'], errors='coerce').to_numpy(dtype=float))
+
+    # Lines without a product (code -1) or a date (NaN) cannot be placed
+    in_window = (codes >= 0) & ~np.isnan(days)
+    in_window[in_window] &= (days[in_window] >= 0) & (days[in_window] < history_days)
+    flat_index = codes[in_window] * history_days + days[in_window].astype(int)
+    matrix = np.bincount(
+        flat_index, weights=quantity[in_window],
+        minlength=len(product_names) * history_days
+    ).reshape(len(product_names), history_days)
+    return np.asarray(product_names), dates, matrix
+
+def ses_level(matrix, alpha=DEFAULT_ALPHA):
+    """Final simple-exponential-smoothing level of every row.
+
+    With level_0 = x_0 and level_t = alpha * x_t + (1 - alpha) * level_t-1,
+    the last level is sum(w_t * x_t), so all rows share one weight vector.
+    """
+    n = matrix.shape[1]
+    if n == 0:
+        return np.zeros(matrix.shape[0])
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (n - 1)
+    return matrix @ weights
+
+def seasonal_naive(matrix, horizon, season=SEASON_LENGTH):
+    """Repeat the last season of every row over the horizon."""
+    last_season = matrix[:, -season:]
+    reps = -(-horizon // season)
+    return np.tile(last_season, reps)[:, :horizon]
+
+def forecast_demand(sales, horizon=14, history_days=DEFAULT_HISTORY_DAYS,
+                    alpha=DEFAULT_ALPHA, end_date=None):
+    """Forecast demand per product over the next `horizon` days.
+
+    `sales` is a prepared sales frame (see reports.prepare_sales). Returns a
+    DataFrame with the chosen model, average daily forecast and total
+    forecast for the horizon.
+    """
+    product_names, _, matrix = demand_matrix(sales, history_days, end_date)
+    columns = ['product_name', 'model', 'daily_forecast', 'forecast_total']
+    if len(product_names) == 0:
+        return pd.DataFrame(columns=columns)
+
+    # Score both models on the last two seasons of history
+    holdout = min(2 * SEASON_LENGTH, max(history_days - SEASON_LENGTH, 0))
+    if holdout:
+        train, actual = matrix[:, :-holdout], matrix[:, -holdout:]
+        ses_error = np.abs(actual - ses_level(train, alpha)[:, None]).mean(axis=1)
+        naive_error = np.abs(actual - seasonal_naive(train, holdout)).mean(axis=1)
+        use_naive = naive_error < ses_error
+    else:
+        use_naive = np.zeros(len(product_names), dtype=bool)
+
+    ses_total = ses_level(matrix, alpha) * horizon
+    naive_total = seasonal_naive(matrix, horizon).sum(axis=1)
+    total = np.where(use_naive, naive_total, ses_total)
+
+    return pd.DataFrame({
+        'product_name': product_names,
+        'model': np.where(use_naive, 'seasonal naive', 'exponential smoothing'),
+        'daily_forecast': total / horizon,
+        'forecast_total': total
+    }).sort_values('forecast_total', ascending=False, ignore_index=True)
+
+def suggest_reorders(forecast, on_hand, lead_time_days=7, safety_days=7):
+    """Add on-hand stock and a suggested reorder quantity to a forecast.
+
+    The suggestion covers forecast demand for the lead time plus a safety
+    margin, less what is already on hand. `on_hand` maps product name to
+    quantity.
+    """
+    result = forecast.copy()
+    result['on_hand'] = result['product_name'].map(on_hand).fillna(0.0)
+    cover = result['daily_forecast'] * (lead_time_days + safety_days)
+    result['suggested_reorder'] = np.ceil((cover - result['on_hand']).clip(lower=0))
+    return result
@@ -0,0 +1,171 @@
+"""Bulk import of legacy sales spreadsheets into the stock_out table.
+
+Usage:
+    python importer.py data/sales.csv [more.csv ...] [--dry-run] [--assign-order-numbers]
+
+Files are read in chunks, mapped from the legacy column layout onto the
+stock_out schema and validated column-wise. Rows that fail validation are
+written to a quarantine CSV together with the reason; the rest are loaded
+through data_manager.bulk_insert. With --assign-order-numbers, rows without
+an order number get one from the order sequence, reserved in one block per
+sale date and chunk.
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+import data_manager as dm
+import order_numbers
+
+# Legacy column -> stock_out column
+LEGACY_COLUMN_MAP = {
+    'date_of_sale': 'date',
+}
+
+STOCK_OUT_COLUMNS = [
+    'date', 'product_name', 'size', 'type', 'sku', 'customer_name',
+    'order_number', 'batch_number', 'best_before', 'production_date',
+    'quantity', 'price_per_unit', 'total_price', 'delivery_method',
+    'labelling_match', 'checked_by'
+]
+
+DATE_COLUMNS = ['date', 'best_before', 'production_date']
+REQUIRED_COLUMNS = ['date', 'product_name', 'order_number']
+DATE_FORMAT = '%Y-%m-%d'
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def map_legacy_columns(chunk):
+    """Rename legacy columns and add any stock_out columns that are missing."""
+    chunk = chunk.rename(columns=LEGACY_COLUMN_MAP)
+    for col in STOCK_OUT_COLUMNS:
+        if col not in chunk.columns:
+            chunk[col] = pd.NA
+    return chunk[STOCK_OUT_COLUMNS]
+
+
+def validate_chunk(chunk, required=REQUIRED_COLUMNS):
+    """Validate a mapped chunk and split it into good rows and rejected rows.
+
+    Dates are parsed for the whole column at once; a value is invalid when it
+    is present but does not parse as YYYY-MM-DD. Returns (good_df, bad_df),
+    where bad_df keeps the original values plus a `reject_reason` column.
+    """
+    raw_chunk = chunk.copy()
+    reasons = pd.Series('', index=chunk.index)
+
+    def reject(mask, reason):
+        nonlocal reasons
+        reasons = reasons.mask(mask & (reasons == ''), reason)
+
+    for col in required:
+        values = chunk[col].astype('string').str.strip()
+        reject(values.isna() | (values == ''), f"missing {col}")
+
+    for col in DATE_COLUMNS:
+        raw = chunk[col].astype('string').str.strip()
+        parsed = pd.to_datetime(raw, format=DATE_FORMAT, errors='coerce')
+        reject(raw.notna() & (raw != '') & parsed.isna(), f"invalid {col}")
+        chunk[col] = parsed.dt.strftime(DATE_FORMAT)
+
+    quantity = pd.to_numeric(chunk['quantity'], errors='coerce')
+    reject(quantity.isna() | (quantity <= 0) | (quantity % 1 != 0), "invalid quantity")
+    chunk['quantity'] = quantity.round().astype('Int64')
+
+    price = pd.to_numeric(chunk['price_per_unit'], errors='coerce')
+    reject(chunk['price_per_unit'].notna() & price.isna(), "invalid price_per_unit")
+    chunk['price_per_unit'] = price
+
+    total = pd.to_numeric(chunk['total_price'], errors='coerce')
+    chunk['total_price'] = total.fillna(quantity * price)
+
+    labelling = chunk['labelling_match'].astype('string').str.strip().str.lower()
+    chunk['labelling_match'] = labelling.map({'yes': True, 'true': True, 'no': False, 'false': False})
+
+    bad_mask = reasons != ''
+    bad = raw_chunk[bad_mask].assign(reject_reason=reasons[bad_mask])
+    return chunk[~bad_mask], bad
+
+
+def assign_order_numbers(chunk):
+    """Give rows without an order number a newly reserved one for their date."""
+    values = chunk['order_number'].astype('string').str.strip()
+    missing = values.isna() | (values == '')
+    if missing.any():
+        chunk = chunk.copy()
+        chunk.loc[missing, 'order_number'] = order_numbers.reserve_for_dates(chunk.loc[missing, 'date'])
+    return chunk, int(missing.sum())
+
+def read_legacy_csv(path, chunk_size=DEFAULT_CHUNK_SIZE, allow_missing_order=False):
+    """Yield (good_df, bad_df) for each chunk of a legacy sales CSV."""
+    required = [col for col in REQUIRED_COLUMNS if not (allow_missing_order and col == 'order_number')]
+    for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_size, keep_default_na=True):
+        yield validate_chunk(map_legacy_columns(chunk), required)
+
+
+def import_file(path, quarantine_path=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False,
+                assign_numbers=False):
+    """Import one legacy CSV. Returns a dict with loaded, rejected and numbered counts."""
+    if quarantine_path is None:
+        root, _ = os.path.splitext(path)
+        quarantine_path = f"{root}.rejected.csv"
+
+    loaded = 0
+    rejected = 0
+    numbered = 0
+    wrote_header = False
+
+    for good, bad in read_legacy_csv(path, chunk_size, allow_missing_order=assign_numbers):
+        if not bad.empty:
+            bad.to_csv(quarantine_path, mode='a' if wrote_header else 'w',
+                       header=not wrote_header, index=False)
+            wrote_header = True
+            rejected += len(bad)
+
+        if not good.empty:
+            if not dry_run:
+                if assign_numbers:
+                    good, assigned = assign_order_numbers(good)
+                    numbered += assigned
+                dm.bulk_insert("stock_out", good.to_dict('records'))
+            loaded += len(good)
+
+    return {
+        "file": path,
+        "loaded": loaded,
+        "rejected": rejected,
+        "numbered": numbered,
+        "quarantine": quarantine_path if rejected else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import legacy sales CSVs into stock_out")
+    parser.add_argument("files", nargs="+", help="Legacy sales CSV files")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows read per chunk")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Validate only, do not insert")
+    parser.add_argument("--assign-order-numbers", action="store_true",
+                        help="Number rows that have no order number instead of rejecting them")
+    args = parser.parse_args(argv)
+
+    total_rejected = 0
+    for path in args.files:
+        result = import_file(path, chunk_size=args.chunk_size, dry_run=args.dry_run,
+                             assign_numbers=args.assign_order_numbers)
+        total_rejected += result["rejected"]
+        line = f"{path}: {result['loaded']} loaded, {result['rejected']} rejected"
+        if result["numbered"]:
+            line += f", {result['numbered']} given new order numbers"
+        if result["quarantine"]:
+            line += f" (see {result['quarantine']})"
+        print(line)
+
+    return 1 if total_rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Inventory ledger: stock on hand per product and per batch.
+
+On hand = stock_in - stock_out - wastage. The ledger is built once from the
+three tables and then kept up to date from data_manager's write
+notifications, so reading a level is a dictionary lookup.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+import data_manager as dm
+import shared_cache
+
+LEDGER_TABLES = ("stock_in", "stock_out", "wastage")
+
+
+def to_number(value):
+    """Coerce a possibly missing numeric field to float."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(value) else value
+
+def record_key(record):
+    """(product_name, batch_number) for a record, with missing batches as ''."""
+    batch = record.get('batch_number')
+    if batch is None or (isinstance(batch, float) and pd.isna(batch)):
+        batch = ''
+    return record.get('product_name') or '', str(batch)
+
+
+class InventoryLedger:
+    """Running stock on hand, maintained one movement at a time."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._product_qty = defaultdict(float)
+        self._product_value = defaultdict(float)
+        self._batch_qty = defaultdict(float)
+        self._batch_value = defaultdict(float)
+        # Received quantity and value per batch, for the batch unit cost
+        self._received_qty = defaultdict(float)
+        self._received_value = defaultdict(float)
+        # (table, id) -> (key, qty delta, value delta), so deletes can be reversed
+        self._entries = {}
+        self._listeners = []
+        # table -> shared_cache generation last synced from
+        self._synced = {}
+
+    ### READING ###
+
+    def on_hand(self, product_name):
+        """(quantity, value) on hand for a product."""
+        return self._product_qty.get(product_name, 0.0), self._product_value.get(product_name, 0.0)
+
+    def batch_on_hand(self, product_name, batch_number):
+        """(quantity, value) on hand for one batch of a product."""
+        key = (product_name, batch_number or '')
+        return self._batch_qty.get(key, 0.0), self._batch_value.get(key, 0.0)
+
+    def unit_cost(self, product_name, batch_number=None):
+        """Average cost per unit received, for a batch or else the whole product."""
+        key = (product_name, batch_number or '')
+        if self._received_qty.get(key):
+            return self._received_value[key] / self._received_qty[key]
+        qty = self._product_qty.get(product_name, 0.0)
+        if qty > 0:
+            return self._product_value[product_name] / qty
+        return 0.0
+
+    def products_frame(self):
+        """Stock on hand for every product."""
+        with self._lock:
+            rows = [
+                {'product_name': name, 'on_hand': qty, 'value': self._product_value[name]}
+                for name, qty in self._product_qty.items()
+            ]
+        return pd.DataFrame(rows, columns=['product_name', 'on_hand', 'value'])
+
+    def batches_frame(self):
+        """Stock on hand for every product batch."""
+        with self._lock:
+            rows = [
+                {'product_name': product, 'batch_number': batch, 'on_hand': qty,
+                 'value': self._batch_value[(product, batch)]}
+                for (product, batch), qty in self._batch_qty.items()
+            ]
+        return pd.DataFrame(rows, columns=['product_name', 'batch_number', 'on_hand', 'value'])
+
+    def reconcile(self, products_df):
+        """Compare the recorded stock_level of each product with the ledger."""
+        if products_df.empty:
+            return pd.DataFrame(columns=['name', 'stock_level', 'on_hand', 'difference'])
+        result = products_df[['name', 'stock_level']].copy()
+        result['on_hand'] = result['name'].map(lambda name: self.on_hand(name)[0])
+        result['difference'] = result['on_hand'] - result['stock_level']
+        return result
+
+    ### UPDATING ###
+
+    def on_change(self, callback):
+        """Register callback(product_name, quantity) run after a product's level changes."""
+        self._listeners.append(callback)
+
+    def apply(self, table, action, records):
+        """Apply a data_manager write notification to the ledger."""
+        if table not in LEDGER_TABLES:
+            return
+        if action == "refresh":
+            # Nothing to do if the rows were not downloaded again since the last sync
+            generation = shared_cache.generation(table)
+            if self._synced.get(table) != generation:
+                self.sync(table, shared_cache.table(table))
+                self._synced[table] = generation
+            return
+        changed = set()
+        with self._lock:
+            for record in records:
+                if action == "insert":
+                    key = self._add(table, record)
+                else:
+                    key = self._remove(table, record)
+                if key:
+                    changed.add(key[0])
+        for product_name in changed:
+            qty = self._product_qty.get(product_name, 0.0)
+            for callback in self._listeners:
+                callback(product_name, qty)
+
+    def load(self, stock_in_df, stock_out_df, wastage_df):
+        """Apply every existing row. Rows already in the ledger are skipped."""
+        # Stock in first so sales and wastage are valued at their batch cost
+        for table, df in (("stock_in", stock_in_df), ("stock_out", stock_out_df), ("wastage", wastage_df)):
+            if not df.empty:
+                self.apply(table, "insert", df.to_dict('records'))
+
+    def sync(self, table, df):
+        """Bring one table's rows in line with its current contents."""
+        current = df.to_dict('records') if not df.empty else []
+        ids = {record.get('id') for record in current}
+        with self._lock:
+            stale = [{'id': entry_id} for (entry_table, entry_id) in self._entries
+                     if entry_table == table and entry_id not in ids]
+        self.apply(table, "delete", stale)
+        self.apply(table, "insert", current)
+
+    def _add(self, table, record):
+        entry_id = (table, record.get('id'))
+        if record.get('id') is not None and entry_id in self._entries:
+            return None
+        key = record_key(record)
+        qty = to_number(record.get('quantity'))
+
+        if table == "stock_in":
+            value = qty * to_number(record.get('package_size')) * to_number(record.get('price_per_unit'))
+            self._received_qty[key] += qty
+            self._received_value[key] += value
+            delta = (qty, value)
+        else:
+            cost = self.unit_cost(*key)
+            if table == "wastage" and not cost:
+                value = to_number(record.get('total_cost'))
+            else:
+                value = qty * cost
+            delta = (-qty, -value)
+
+        self._move(key, *delta)
+        if record.get('id') is not None:
+            self._entries[entry_id] = (key, delta)
+        return key
+
+    def _remove(self, table, record):
+        entry = self._entries.pop((table, record.get('id')), None)
+        if entry is None:
+            return None
+        key, (qty, value) = entry
+        if table == "stock_in":
+            self._received_qty[key] -= qty
+            self._received_value[key] -= value
+        self._move(key, -qty, -value)
+        return key
+
+    def _move(self, key, qty, value):
+        product_name = key[0]
+        self._product_qty[product_name] += qty
+        self._product_value[product_name] += value
+        self._batch_qty[key] += qty
+        self._batch_value[key] += value
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    """Return the process-wide ledger, building it on first use."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            ledger = InventoryLedger()
+            # Subscribe before loading; rows seen twice are skipped by id
+            dm.subscribe(ledger.apply)
+            try:
+                # From the shared cache, so the refresh branch knows which rows it holds
+                ledger._synced = {table: shared_cache.generation(table) for table in LEDGER_TABLES}
+                ledger.load(shared_cache.table("stock_in"), shared_cache.table("stock_out"),
+                            shared_cache.table("wastage"))
+            except Exception:
+                dm.unsubscribe(ledger.apply)
+                raise
+            _ledger = ledger
+        return _ledger
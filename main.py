@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import data_manager as dm
+import order_store as dm
 import utils
 
 # Page configuration
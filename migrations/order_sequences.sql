@@ -0,0 +1,13 @@
+-- Per-day order number sequence (see order_numbers.py).
+create table if not exists order_sequences (
+    day date primary key,
+    last_value bigint not null default 0
+);
+
+-- Advance a day's sequence by p_count and return its new last value
+create or replace function reserve_order_numbers(p_day date, p_count integer)
+returns bigint language sql as $$
+    insert into order_sequences as s (day, last_value) values (p_day, p_count)
+    on conflict (day) do update set last_value = s.last_value + excluded.last_value
+    returning last_value;
+$$;
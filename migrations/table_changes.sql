@@ -0,0 +1,9 @@
+-- Change feed for SALES_CHANGE_FEED=supabase (see change_feed.py).
+-- One row per published change; readers follow the serial id.
+create table if not exists table_changes (
+    id bigserial primary key,
+    table_name text not null,
+    source text not null,
+    changed_at timestamptz not null default now()
+);
+create index if not exists table_changes_changed_at on table_changes (changed_at);
@@ -0,0 +1,99 @@
+"""Collision-free order numbers from a per-day sequence in the database.
+
+Numbers look like ORD-20250301-S0042: the sale date and that day's sequence
+value. The S keeps them apart from the random ORD-20250301-XXXX numbers of
+utils.generate_order_number(), whose suffix is four characters. The
+sequence lives in Supabase and is advanced atomically by a function, so two
+processes can never be handed the same value. Each process reserves a block
+of ORDER_NUMBER_BLOCK_SIZE values at a time and hands them out locally, and
+bulk callers reserve exactly what they need in one call, so most numbers
+cost no round trip. Values from a block a process never used are skipped,
+leaving gaps but no duplicates.
+
+The table and function are created by migrations/order_sequences.sql.
+
+If the function is unavailable, next_order_number() falls back to a random
+utils.generate_order_number() and says so, since that one can repeat.
+"""
+import os
+import threading
+from datetime import date, datetime
+
+import pandas as pd
+
+import data_manager as dm
+import utils
+
+BLOCK_SIZE = int(os.environ.get("ORDER_NUMBER_BLOCK_SIZE", "20"))
+
+
+def format_order_number(day, value):
+    return f"ORD-{day.strftime('%Y%m%d')}-S{value:04d}"
+
+def _as_date(day):
+    if day is None:
+        return datetime.now().date()
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    return pd.Timestamp(day).date()
+
+
+class OrderNumberAllocator:
+    """Hands out order numbers from blocks reserved in the database."""
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}   # day -> [next value, last value]
+
+    def next_number(self, day=None):
+        """One order number for `day` (default today)."""
+        day = _as_date(day)
+        with self._lock:
+            block = self._blocks.get(day)
+            if block is None or block[0] > block[1]:
+                last = dm.reserve_order_numbers(day, self.block_size)
+                block = self._blocks[day] = [last - self.block_size + 1, last]
+                # Earlier days' blocks will not be used again
+                for old in [old for old in self._blocks if old < day]:
+                    del self._blocks[old]
+            value = block[0]
+            block[0] += 1
+        return format_order_number(day, value)
+
+    def reserve(self, count, day=None):
+        """`count` consecutive order numbers for `day`, in one round trip."""
+        if count <= 0:
+            return []
+        day = _as_date(day)
+        last = dm.reserve_order_numbers(day, count)
+        return [format_order_number(day, value) for value in range(last - count + 1, last + 1)]
+
+    def reserve_for_dates(self, dates):
+        """One order number per entry of `dates`, one round trip per distinct day."""
+        days = pd.to_datetime(pd.Series(dates)).dt.date
+        numbers = pd.Series(index=days.index, dtype=object)
+        for day, group in days.groupby(days, sort=True):
+            numbers[group.index] = self.reserve(len(group), day)
+        return numbers.tolist()
+
+
+_allocator = OrderNumberAllocator()
+
+def next_order_number(day=None):
+    """(order number, None), or (random order number, error) if the sequence is unavailable."""
+    try:
+        return _allocator.next_number(day), None
+    except Exception as e:
+        print(f"Error allocating order number: {str(e)}")
+        return utils.generate_order_number(), str(e)
+
+def reserve_order_numbers(count, day=None):
+    """`count` order numbers for one day, for bulk loads."""
+    return _allocator.reserve(count, day)
+
+def reserve_for_dates(dates):
+    """One order number per sale date, for bulk loads."""
+    return _allocator.reserve_for_dates(dates)
@@ -0,0 +1,291 @@
+"""File-backed order store for the single-terminal app (main.py).
+
+Orders live in a snapshot, data/sales.csv (or data/sales.parquet with
+SALES_ORDER_STORE_FORMAT=parquet), plus an append-only log of the changes
+made since, data/sales.log.jsonl. Every write appends one line to the log
+and updates an in-memory index of lines by order_number, so an edit costs
+one small fsync'd append instead of rewriting the whole file.
+
+Each log event carries the order's complete lines after the change (or
+marks it deleted), so replaying an event that is already in the snapshot
+changes nothing. That makes compaction crash-safe without any bookkeeping:
+after SALES_ORDER_STORE_COMPACT events the index is written to a temporary
+file, fsync'd and renamed over the snapshot, and only then is the log
+emptied. A crash at any point leaves a snapshot plus a log that replay to
+the same orders; a half-written last log line is dropped on start-up.
+
+The store is meant for one server process; sessions within it share it.
+"""
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pandas as pd
+
+DATA_DIR = "data"
+SNAPSHOT_FORMAT = os.environ.get("SALES_ORDER_STORE_FORMAT", "csv").lower()
+LOG_PATH = os.path.join(DATA_DIR, "sales.log.jsonl")
+COMPACT_EVERY = int(os.environ.get("SALES_ORDER_STORE_COMPACT", "200"))
+
+SNAPSHOT_PATHS = {"csv": os.path.join(DATA_DIR, "sales.csv"),
+                  "parquet": os.path.join(DATA_DIR, "sales.parquet")}
+
+COLUMNS = ['date_of_sale', 'product_name', 'size', 'type', 'sku', 'customer_name', 'order_number',
+           'batch_number', 'best_before', 'production_date', 'quantity', 'price_per_unit',
+           'total_price', 'delivery_method', 'labelling_match', 'checked_by']
+DATE_COLUMNS = ['date_of_sale', 'best_before', 'production_date']
+NUMERIC_COLUMNS = ['quantity', 'price_per_unit', 'total_price']
+
+# Order fields copied onto every line of the order
+ORDER_FIELDS = ['date_of_sale', 'customer_name', 'delivery_method', 'order_number']
+
+
+def _snapshot_format():
+    if SNAPSHOT_FORMAT == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("Error: parquet snapshots need pyarrow; using csv")
+        return "csv"
+    return SNAPSHOT_FORMAT if SNAPSHOT_FORMAT in SNAPSHOT_PATHS else "csv"
+
+def _to_json_value(value):
+    """Dates as YYYY-MM-DD, missing values as None, numpy scalars as Python ones."""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+def _line(order_data, product):
+    """One stored line: the product's fields with the order's, total_price worked out."""
+    line = {column: _to_json_value(product.get(column)) for column in COLUMNS}
+    for field in ORDER_FIELDS:
+        line[field] = _to_json_value(order_data.get(field))
+    try:
+        line['total_price'] = float(line['quantity']) * float(line['price_per_unit'])
+    except (TypeError, ValueError):
+        line['total_price'] = _to_json_value(product.get('total_price'))
+    return line
+
+def _frame(lines):
+    """Lines as the frame main.py expects: dates as date objects, numbers as numbers."""
+    df = pd.DataFrame(lines, columns=COLUMNS)
+    for column in DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors='coerce').dt.date
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+def _typed(df):
+    """Numbers as floats and everything else as text, so each column has one type."""
+    df = df.copy()
+    for column in COLUMNS:
+        if column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        else:
+            df[column] = df[column].map(lambda value: None if value is None else str(value))
+    return df
+
+def _fsync_directory(path):
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class OrderStore:
+    """Orders indexed by order_number, persisted as a snapshot plus an event log."""
+
+    def __init__(self, snapshot_path, log_path, compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._orders = OrderedDict()    # order_number -> [line dict]
+        self._logged = 0                # events in the log since the last compaction
+        self._frame = None              # load_data() result, patched on every write
+        self._open()
+
+    ### LOADING ###
+
+    def _open(self):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        for line in self._read_snapshot():
+            self._orders.setdefault(line['order_number'], []).append(line)
+        for event in self._read_log():
+            self._apply(event)
+            self._logged += 1
+
+    def _read_snapshot(self):
+        path = self.snapshot_path
+        if not os.path.exists(path):
+            # A csv snapshot is still read when switching to parquet
+            path = SNAPSHOT_PATHS["csv"]
+            if not os.path.exists(path):
+                return []
+        try:
+            if path.endswith(".parquet"):
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+        except Exception as e:
+            print(f"Error reading order snapshot: {str(e)}")
+            return []
+        df = df.reindex(columns=COLUMNS).astype(object)
+        return df.where(df.notna(), None).to_dict('records')
+
+    def _read_log(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # A crash cut the last event short; drop it so the next one starts on its own line
+            with open(self.log_path, "rb+") as f:
+                f.truncate(complete)
+                os.fsync(f.fileno())
+        events = []
+        for raw in data[:complete].splitlines():
+            try:
+                events.append(json.loads(raw))
+            except ValueError:
+                print("Error reading order log: skipped a damaged event")
+        return events
+
+    ### READING ###
+
+    def load_data(self):
+        """Every line of every order."""
+        with self._lock:
+            if self._frame is None:
+                self._frame = _frame([line for lines in self._orders.values() for line in lines])
+            return self._frame.copy()
+
+    def get_order_details(self, order_number):
+        """The lines of one order (empty if there is no such order)."""
+        with self._lock:
+            return _frame(list(self._orders.get(order_number, [])))
+
+    ### WRITING ###
+
+    def add_products_to_order(self, order_data, products):
+        """Add product lines to an order, creating it if it is new."""
+        with self._lock:
+            order_number = order_data['order_number']
+            lines = self._orders.get(order_number, []) + [_line(order_data, product) for product in products]
+            self._write({"op": "put", "order_number": order_number, "lines": lines})
+
+    def update_order(self, order_number, order_data, products):
+        """Replace an order's details and lines."""
+        with self._lock:
+            order_data = {**order_data, 'order_number': order_number}
+            lines = [_line(order_data, product) for product in products]
+            self._write({"op": "put", "order_number": order_number, "lines": lines})
+
+    def delete_order(self, order_number):
+        with self._lock:
+            if order_number in self._orders:
+                self._write({"op": "delete", "order_number": order_number})
+
+    def _write(self, event):
+        """Log an event durably, then apply it."""
+        line = (json.dumps(event) + "\n").encode()
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._apply(event)
+        self._logged += 1
+        if self._logged >= self.compact_every:
+            try:
+                self.compact()
+            except OSError as e:
+                # The log still holds everything; compaction is retried after the next write
+                print(f"Error compacting orders: {str(e)}")
+
+    def _apply(self, event):
+        order_number = event.get("order_number")
+        lines = event["lines"] if event.get("op") == "put" else None
+        # A changed order moves to the end, in the index and in the frame alike
+        self._orders.pop(order_number, None)
+        if lines:
+            self._orders[order_number] = lines
+        if self._frame is not None:
+            kept = self._frame[self._frame['order_number'] != order_number]
+            self._frame = pd.concat([kept, _frame(lines)], ignore_index=True) if lines else kept.reset_index(drop=True)
+
+    ### COMPACTION ###
+
+    def compact(self):
+        """Write every order to a new snapshot and empty the log."""
+        with self._lock:
+            df = pd.DataFrame([line for lines in self._orders.values() for line in lines], columns=COLUMNS)
+            temp_path = self.snapshot_path + ".tmp"
+            if self.snapshot_path.endswith(".parquet"):
+                _typed(df).to_parquet(temp_path, index=False)
+            else:
+                df.to_csv(temp_path, index=False)
+            with open(temp_path, "rb+") as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            _fsync_directory(self.snapshot_path)
+            # Replaying the old log over the new snapshot would change nothing, so this can come last
+            with open(self.log_path, "wb") as f:
+                os.fsync(f.fileno())
+            self._logged = 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide order store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = OrderStore(SNAPSHOT_PATHS[_snapshot_format()], LOG_PATH)
+        return _store
+
+def load_data():
+    """Every sales line, with dates as date objects."""
+    return get_store().load_data()
+
+def get_order_details(order_number):
+    """The lines of one order."""
+    return get_store().get_order_details(order_number)
+
+def add_products_to_order(order_data, products):
+    """Save the products as lines of the order described by order_data."""
+    get_store().add_products_to_order(order_data, products)
+
+def update_order(order_number, order_data, products):
+    """Replace an order's details and lines."""
+    get_store().update_order(order_number, order_data, products)
+
+def delete_order(order_number):
+    """Remove an order and all its lines."""
+    get_store().delete_order(order_number)
+
+def compact():
+    """Fold the event log into the snapshot now."""
+    get_store().compact()
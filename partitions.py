@@ -0,0 +1,111 @@
+"""Month partitions of a table, for date-range reads.
+
+A PartitionedFrame splits a frame by calendar month of one date column and
+records the min and max of that column and of any other date columns for
+every partition. A range read only touches partitions whose [min, max]
+overlaps the range, so a 30-day view reads one or two months whatever the
+history held.
+
+    by_month = PartitionedFrame(sales, 'date', stats_columns=['best_before'])
+    recent = by_month.read(date=(start, end))
+"""
+import pandas as pd
+
+
+class PartitionedFrame:
+    """A frame split by month of `column`, with min/max statistics per partition."""
+
+    def __init__(self, df, column, stats_columns=()):
+        self.column = column
+        self.stats_columns = [column] + [name for name in stats_columns if name != column]
+        self._frame = df
+        self._partitions = {}   # "YYYY-MM" (None for a missing date) -> frame
+        self._stats = {}        # same key -> {column: (min, max)}
+        if df.empty:
+            return
+        # yyyymm as an integer, 0 for a missing date; much cheaper than strftime
+        dates = df[column]
+        codes = (dates.dt.year * 100 + dates.dt.month).fillna(0).astype(int).to_numpy()
+        for code, part in df.groupby(codes, sort=True):
+            month = f"{code // 100:04d}-{code % 100:02d}" if code else None
+            self._partitions[month] = part
+            self._stats[month] = {
+                name: (part[name].min(), part[name].max())
+                for name in self.stats_columns if name in part.columns
+            }
+
+    def __len__(self):
+        return len(self._frame)
+
+    def months(self):
+        """Partition keys with their row counts and statistics, oldest first."""
+        return [
+            {'month': month, 'rows': len(self._partitions[month]), **{
+                f"{name}_{bound}": value
+                for name, (low, high) in self._stats[month].items()
+                for bound, value in (("min", low), ("max", high))
+            }}
+            for month in sorted(self._partitions, key=lambda month: month or "")
+        ]
+
+    def matching(self, **ranges):
+        """Keys of the partitions that may hold rows inside every range."""
+        bounds = {name: _bounds(value) for name, value in ranges.items() if value is not None}
+        keys = []
+        for month, stats in self._stats.items():
+            if all(_overlaps(stats.get(name), low, high) for name, (low, high) in bounds.items()):
+                keys.append(month)
+        return keys
+
+    def read(self, **ranges):
+        """Rows whose columns fall inside the given inclusive (start, end) ranges.
+
+        Either end may be None for an open range. Rows keep their original
+        index labels and come back month by month.
+        """
+        bounds = {name: _bounds(value) for name, value in ranges.items() if value is not None}
+        parts = []
+        trimmed = False
+        for key in self.matching(**ranges):
+            part = self._partitions[key]
+            # Only partitions straddling a range boundary need their rows checked
+            for name, (low, high) in bounds.items():
+                if not _within(self._stats[key].get(name), low, high):
+                    part = _between(part, name, low, high)
+                    trimmed = True
+            parts.append(part)
+        if not trimmed and len(parts) == len(self._partitions):
+            return self._frame
+        if not parts:
+            return self._frame.iloc[0:0]
+        return parts[0] if len(parts) == 1 else pd.concat(parts)
+
+
+def _bounds(value):
+    """(low, high) Timestamps from a (start, end) pair; missing ends are None."""
+    low, high = (tuple(value) + (None, None))[:2]
+    return (pd.Timestamp(low) if low is not None else None,
+            pd.Timestamp(high) if high is not None else None)
+
+def _within(stats, low, high):
+    """Whether every value of a partition's column lies in [low, high]."""
+    if stats is None or pd.isna(stats[0]):
+        return False
+    minimum, maximum = stats
+    return (low is None or minimum >= low) and (high is None or maximum <= high)
+
+def _between(df, name, low, high):
+    if low is not None:
+        df = df[df[name] >= low]
+    if high is not None:
+        df = df[df[name] <= high]
+    return df
+
+def _overlaps(stats, low, high):
+    """Whether a partition's (min, max) can hold a value in [low, high]."""
+    if stats is None:
+        return True     # column not tracked, so it cannot be ruled out
+    minimum, maximum = stats
+    if pd.isna(minimum):
+        return low is None and high is None
+    return (low is None or maximum >= low) and (high is None or minimum <= high)
@@ -0,0 +1,187 @@
+"""Per-rerun profiling for the Streamlit app.
+
+Off by default. Turn it on for every session with SALES_PROFILE=1, or for a
+single browser session by opening the app with ?profile=1. While it is on,
+each rerun records how long every page function (decorated with timed) and
+every data_manager call took, and the slowest reruns are listed on the
+Diagnostics page.
+
+SALES_PROFILE=capture (or ?profile=capture) also samples the rerun's stack
+every SALES_PROFILE_INTERVAL seconds and writes one file per rerun to
+data/profiles/ in folded-stack format, which flamegraph.pl, speedscope and
+inferno read directly.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import data_manager as dm
+
+PROFILE_MODE = os.environ.get("SALES_PROFILE", "").lower()
+SAMPLE_INTERVAL = float(os.environ.get("SALES_PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.path.join("data", "profiles")
+
+# Reruns kept for the Diagnostics page
+MAX_RERUNS = 200
+
+MODES = ("on", "capture")
+
+_local = threading.local()
+_reruns = deque(maxlen=MAX_RERUNS)
+_reruns_lock = threading.Lock()
+
+
+def normalize_mode(value):
+    """'on', 'capture' or '' for a flag value such as '1', 'true' or 'capture'."""
+    value = (value or "").strip().lower()
+    if value == "capture":
+        return "capture"
+    if value in ("1", "true", "yes", "on"):
+        return "on"
+    return ""
+
+
+class RerunProfile:
+    """Timings collected during one script rerun."""
+
+    def __init__(self, session_id, page):
+        self.session_id = session_id
+        self.page = page
+        self.started = datetime.now()
+        self.total = 0.0
+        self.sections = []      # [depth, name, seconds], in call order
+        self.profile_file = None
+        self._depth = 0
+
+    @contextmanager
+    def section(self, name):
+        entry = [self._depth, name, 0.0]
+        self.sections.append(entry)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[2] = time.perf_counter() - started
+            self._depth -= 1
+
+    def breakdown(self):
+        """Top-level sections summed by name, slowest first."""
+        totals = Counter()
+        for depth, name, seconds in self.sections:
+            if depth == 0:
+                totals[name] += seconds
+        return totals.most_common()
+
+
+class StackSampler(threading.Thread):
+    """Samples another thread's stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()    # "outer;...;inner" -> count
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_folded(samples, profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{profile.started:%Y%m%d-%H%M%S-%f}-{profile.page}.folded"
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w") as f:
+        for stack, count in samples.items():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+@contextmanager
+def rerun(session_id, page, mode):
+    """Profile the enclosed rerun when mode is 'on' or 'capture'."""
+    if mode not in MODES:
+        yield None
+        return
+
+    profile = RerunProfile(session_id, page)
+    _local.profile = profile
+    sampler = None
+    if mode == "capture":
+        sampler = StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+        sampler.start()
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        # st.rerun() and st.stop() end a rerun with an exception; still record it
+        profile.total = time.perf_counter() - started
+        _local.profile = None
+        if sampler is not None:
+            sampler.stop()
+            try:
+                profile.profile_file = _write_folded(sampler.samples, profile)
+            except OSError as e:
+                print(f"Error writing profile: {str(e)}")
+        with _reruns_lock:
+            _reruns.append(profile)
+
+
+def timed(func=None, name=None):
+    """Decorator recording the call's duration in the current rerun profile."""
+    if func is None:
+        return functools.partial(timed, name=name)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = getattr(_local, "profile", None)
+        if profile is None:
+            return func(*args, **kwargs)
+        with profile.section(label):
+            return func(*args, **kwargs)
+
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def instrument(module, names, prefix=""):
+    """Replace module functions with timed wrappers. Safe to call repeatedly."""
+    for name in names:
+        func = getattr(module, name, None)
+        if callable(func) and not getattr(func, "__profiled__", False):
+            setattr(module, name, timed(func, name=prefix + name))
+
+
+def slowest_reruns(limit=20):
+    """Recorded reruns, slowest first."""
+    with _reruns_lock:
+        reruns = list(_reruns)
+    return sorted(reruns, key=lambda profile: profile.total, reverse=True)[:limit]
+
+def clear():
+    with _reruns_lock:
+        _reruns.clear()
+
+
+# Every read and write goes through these, so they are timed wherever they are called from
+instrument(dm, [name for name in dir(dm) if name.startswith(("get_", "add_", "delete_"))
+                and name not in ("get_client", "get_table_version")] + ["bulk_insert", "reserve_order_numbers"], prefix="dm.")
@@ -0,0 +1,312 @@
+"""Sales totals over any date range in constant time.
+
+For every day since the first sale, and separately for every product, the
+running totals of revenue, quantity and distinct orders are kept in a
+cumulative array, so the totals between two dates are one subtraction
+whatever the range. Built once from stock_out and then kept up to date
+from data_manager's write notifications: a sale on a new day extends the
+arrays, a back-dated one adds to the running totals after it, and
+deleting the only sales at either end trims them.
+
+Distinct customers cannot be added up this way and are not covered.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import data_manager as dm
+import shared_cache
+
+MEASURES = ("revenue", "quantity", "orders")
+
+_EPOCH = pd.Timestamp("1970-01-01")
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def day_number(value):
+    """Days since 1970-01-01 for a date, or None if it is missing."""
+    if value is None or value is pd.NaT:
+        return None
+    if not isinstance(value, date):
+        try:
+            value = pd.Timestamp(value)
+        except (TypeError, ValueError):
+            return None
+        if pd.isna(value):
+            return None
+    return value.toordinal() - _EPOCH_ORDINAL
+
+def _to_date(day):
+    return (_EPOCH + pd.Timedelta(days=int(day))).date()
+
+
+class DailyTotals:
+    """Cumulative per-day sums of MEASURES over a contiguous run of days."""
+
+    def __init__(self):
+        self.first_day = None
+        # Row k holds the totals of the first k days; row 0 is all zeros
+        self._cum = np.zeros((1, len(MEASURES)))
+
+    @classmethod
+    def from_days(cls, days, values):
+        """Build from per-day totals; days must be sorted and distinct."""
+        totals = cls()
+        if len(days):
+            totals.first_day = int(days[0])
+            dense = np.zeros((int(days[-1]) - totals.first_day + 1, len(MEASURES)))
+            dense[np.asarray(days) - totals.first_day] = values
+            totals._cum = np.vstack([np.zeros((1, len(MEASURES))), np.cumsum(dense, axis=0)])
+        return totals
+
+    @property
+    def last_day(self):
+        return None if self.first_day is None else self.first_day + len(self._cum) - 2
+
+    def add(self, day, values):
+        """Add values (one per measure) to a day, extending the run if needed."""
+        if self.first_day is None:
+            self.first_day = day
+        if day < self.first_day:
+            # Days before the run all start from zero
+            self._cum = np.vstack([np.zeros((self.first_day - day, len(MEASURES))), self._cum])
+            self.first_day = day
+        elif day > self.last_day:
+            extra = day - self.last_day
+            self._cum = np.vstack([self._cum, np.repeat(self._cum[-1:], extra, axis=0)])
+        self._cum[day - self.first_day + 1:] += values
+
+    def trim(self):
+        """Drop days with nothing recorded from both ends of the run."""
+        if self.first_day is None:
+            return
+        days = len(self._cum) - 1
+        low, high = 0, days
+        while low < high and self._is_empty(low):
+            low += 1
+        while high > low and self._is_empty(high - 1):
+            high -= 1
+        if low == high:
+            self.first_day = None
+            self._cum = np.zeros((1, len(MEASURES)))
+        elif (low, high) != (0, days):
+            self._cum = self._cum[low:high + 1] - self._cum[low]
+            self.first_day += low
+
+    def _is_empty(self, index):
+        # Removed lines can leave rounding residue rather than exact zeros
+        return np.allclose(self._cum[index + 1], self._cum[index])
+
+    def total(self, start=None, end=None):
+        """MEASURES summed over days start..end (inclusive day numbers; None for open)."""
+        if self.first_day is None:
+            return np.zeros(len(MEASURES))
+        days = len(self._cum) - 1
+        low = 0 if start is None else min(max(start - self.first_day, 0), days)
+        high = days if end is None else min(max(end - self.first_day + 1, 0), days)
+        if high <= low:
+            return np.zeros(len(MEASURES))
+        return self._cum[high] - self._cum[low]
+
+
+class SalesTotals:
+    """Revenue, quantity and orders by day, overall and per product."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._overall = DailyTotals()
+        self._products = {}     # product name -> DailyTotals
+        self._lines = {}        # stock_out id -> (day, product, order, revenue, quantity)
+        self._orders = {}       # order number -> [day, lines]
+        self._product_orders = {}   # (product, order) -> [day, lines]
+        self._synced = None     # stock_out generation last loaded from
+
+    ### READING ###
+
+    def totals(self, start=None, end=None, product=None):
+        """{measure: total} between two dates (inclusive), overall or for one product."""
+        start, end = day_number(start), day_number(end)
+        with self._lock:
+            series = self._overall if product is None else self._products.get(product)
+            values = series.total(start, end) if series is not None else np.zeros(len(MEASURES))
+        result = dict(zip(MEASURES, values.tolist()))
+        result["quantity"] = int(round(result["quantity"]))
+        result["orders"] = int(round(result["orders"]))
+        return result
+
+    def by_product(self, start=None, end=None):
+        """Totals for every product with sales between two dates, by revenue."""
+        start, end = day_number(start), day_number(end)
+        with self._lock:
+            rows = [(name, *series.total(start, end)) for name, series in self._products.items()]
+        result = pd.DataFrame(rows, columns=["product_name", *MEASURES])
+        result = result[(result["quantity"] != 0) | (result["revenue"] != 0)]
+        return result.sort_values("revenue", ascending=False).reset_index(drop=True)
+
+    def date_span(self):
+        """(first date, last date) with recorded sales, or (None, None)."""
+        with self._lock:
+            if self._overall.first_day is None:
+                return None, None
+            return _to_date(self._overall.first_day), _to_date(self._overall.last_day)
+
+    ### UPDATING ###
+
+    def load(self, sales_df):
+        """Rebuild from the whole stock_out table."""
+        lines = _lines_frame(sales_df)
+        with self._lock:
+            self._overall = _daily(lines)
+            self._products = _daily_by_product(lines)
+            with_id = lines[lines["id"].notna()]
+            self._lines = dict(zip(with_id["id"].tolist(), zip(
+                with_id["day"].tolist(), with_id["product"].tolist(), with_id["order"].tolist(),
+                with_id["revenue"].tolist(), with_id["quantity"].tolist())))
+            self._orders = _line_counts(lines, "order")
+            self._product_orders = _line_counts(lines, ["product", "order"])
+
+    def apply(self, table, action, records):
+        """data_manager write notification for stock_out."""
+        if table != "stock_out":
+            return
+        if action == "refresh":
+            generation = shared_cache.generation(table)
+            if self._synced != generation:
+                self.load(shared_cache.table(table))
+                self._synced = generation
+            return
+        with self._lock:
+            for record in records:
+                if action == "insert":
+                    self._add(record)
+                else:
+                    self._remove(record)
+
+    def _add(self, record):
+        line_id = record.get("id")
+        if line_id is not None and line_id in self._lines:
+            return
+        day = day_number(record.get("date"))
+        if day is None:
+            return
+        product = record.get("product_name") or ""
+        order = record.get("order_number") or ""
+        revenue, quantity = _number(record.get("total_price")), _number(record.get("quantity"))
+        if line_id is not None:
+            self._lines[line_id] = (day, product, order, revenue, quantity)
+        self._change(day, product, order, revenue, quantity, 1)
+
+    def _remove(self, record):
+        line = self._lines.pop(record.get("id"), None)
+        if line is not None:
+            day, product, order, revenue, quantity = line
+            self._change(day, product, order, -revenue, -quantity, -1)
+            # So date_span and the default ranges only cover days that still have sales
+            self._overall.trim()
+            self._products[product].trim()
+
+    def _change(self, day, product, order, revenue, quantity, lines):
+        """Apply one line's revenue and quantity, counting orders on their first line's day."""
+        new_order = _count_line(self._orders, order, day, lines)
+        self._overall.add(day, [revenue, quantity, 0])
+        if new_order:
+            self._overall.add(new_order[0], [0, 0, new_order[1]])
+        series = self._products.setdefault(product, DailyTotals())
+        new_order = _count_line(self._product_orders, (product, order), day, lines)
+        series.add(day, [revenue, quantity, 0])
+        if new_order:
+            series.add(new_order[0], [0, 0, new_order[1]])
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if pd.isna(value) else value
+
+def _count_line(counts, key, day, lines):
+    """Track lines per order; (day, +1/-1) when the order appears or disappears."""
+    entry = counts.get(key)
+    if entry is None:
+        if lines < 0:
+            return None
+        counts[key] = [day, lines]
+        return day, 1
+    entry[1] += lines
+    if entry[1] <= 0:
+        del counts[key]
+        return entry[0], -1
+    return None
+
+def _line_counts(lines, keys):
+    """key -> [day of the first line, number of lines]."""
+    counts = lines.groupby(keys)["day"].agg(["min", "size"])
+    return {key: [int(day), int(size)] for key, day, size in
+            zip(counts.index.tolist(), counts["min"].tolist(), counts["size"].tolist())}
+
+def _lines_frame(sales_df):
+    """stock_out rows reduced to the columns the totals need, with day numbers."""
+    if sales_df.empty:
+        return pd.DataFrame(columns=["id", "day", "product", "order", "revenue", "quantity"])
+    dates = pd.to_datetime(sales_df["date"], errors="coerce").dt.normalize()
+    lines = pd.DataFrame({
+        "id": sales_df["id"] if "id" in sales_df.columns else np.nan,
+        "day": (dates - _EPOCH).dt.days,
+        "product": sales_df["product_name"].fillna("").astype(str),
+        "order": sales_df["order_number"].fillna("").astype(str),
+        "revenue": pd.to_numeric(sales_df["total_price"], errors="coerce").fillna(0.0),
+        "quantity": pd.to_numeric(sales_df["quantity"], errors="coerce").fillna(0.0)
+    })
+    lines = lines[lines["day"].notna()]
+    lines["day"] = lines["day"].astype(int)
+    return lines
+
+def _daily(lines):
+    """DailyTotals from line rows, counting each order on the day of its first line."""
+    per_day = lines.groupby("day")[["revenue", "quantity"]].sum()
+    first_days = lines.groupby("order")["day"].min()
+    per_day["orders"] = first_days.value_counts().reindex(per_day.index, fill_value=0)
+    return DailyTotals.from_days(per_day.index.to_numpy(), per_day[list(MEASURES)].to_numpy())
+
+
+def _daily_by_product(lines):
+    """{product: DailyTotals} with one groupby for all products."""
+    per_day = lines.groupby(["product", "day"])[["revenue", "quantity"]].sum()
+    first_days = lines.groupby(["product", "order"])["day"].min()
+    new_orders = first_days.groupby(level=0).value_counts()
+    new_orders.index = new_orders.index.set_names(["product", "day"])
+    per_day["orders"] = new_orders.reindex(per_day.index, fill_value=0)
+
+    products = per_day.index.get_level_values(0)
+    days = per_day.index.get_level_values(1).to_numpy()
+    values = per_day[list(MEASURES)].to_numpy()
+    # Rows are grouped by product, so each product is one slice
+    names, starts = np.unique(products, return_index=True)
+    ends = list(starts[1:]) + [len(per_day)]
+    return {name: DailyTotals.from_days(days[start:end], values[start:end])
+            for name, start, end in zip(names, starts, ends)}
+
+
+_totals = None
+_totals_lock = threading.Lock()
+
+def get_sales_totals():
+    """Return the process-wide sales totals, building them on first use."""
+    global _totals
+    with _totals_lock:
+        if _totals is None:
+            totals = SalesTotals()
+            # Subscribe before loading; lines seen twice are skipped by id
+            dm.subscribe(totals.apply)
+            while True:
+                version = dm.get_table_version("stock_out")
+                totals._synced = shared_cache.generation("stock_out")
+                totals.load(shared_cache.table("stock_out"))
+                # A write during the download was overwritten by the load, so go again
+                if dm.get_table_version("stock_out") == version:
+                    break
+            _totals = totals
+        return _totals
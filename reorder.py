@@ -0,0 +1,140 @@
+"""Reorder-level monitoring against live stock.
+
+The monitor listens to the inventory ledger and only re-checks the product
+whose level just changed, flagging it when it falls to or below its
+reorder_level from the products catalogue.
+
+Usage (scheduled check, exits 1 when anything needs reordering):
+    python reorder.py
+"""
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+import data_manager as dm
+import ledger
+import shared_cache
+
+# Number of crossing events kept for display
+MAX_ALERTS = 50
+
+
+class ReorderMonitor:
+    """Tracks which products are at or below their reorder level."""
+
+    def __init__(self, inventory):
+        self._ledger = inventory
+        self._lock = threading.Lock()
+        self._levels = {}       # product name -> reorder_level
+        self._below = {}        # product name -> on-hand quantity when flagged
+        self._alerts = deque(maxlen=MAX_ALERTS)
+        self._synced = None     # products generation the levels were loaded from
+
+    def set_levels(self, products_df):
+        """Replace the reorder levels with the products table's and re-check every product."""
+        if products_df.empty or 'reorder_level' not in products_df.columns:
+            for name in list(self._below):
+                self.check(name, self._ledger.on_hand(name)[0])
+            return
+        levels = {}
+        for row in products_df[['name', 'reorder_level']].itertuples(index=False):
+            if row.name and not pd.isna(row.reorder_level):
+                levels[row.name] = float(row.reorder_level)
+        with self._lock:
+            # Flagged products that lost their level are re-checked too, which unflags them
+            names = self._levels.keys() | self._below.keys() | levels.keys()
+            self._levels = levels
+        for name in names:
+            self.check(name, self._ledger.on_hand(name)[0])
+
+    def check(self, product_name, quantity):
+        """Re-evaluate one product. Used as the ledger's change callback."""
+        level = self._levels.get(product_name)
+        with self._lock:
+            if level is None:
+                self._below.pop(product_name, None)
+                return
+            if quantity <= level:
+                if product_name not in self._below:
+                    self._alerts.appendleft({
+                        'product_name': product_name,
+                        'on_hand': quantity,
+                        'reorder_level': level,
+                        'time': datetime.now()
+                    })
+                self._below[product_name] = quantity
+            else:
+                self._below.pop(product_name, None)
+
+    def apply(self, table, action, records):
+        """data_manager write notification: follow catalogue changes."""
+        if table != "products":
+            return
+        if action == "refresh":
+            generation = shared_cache.generation("products")
+            if self._synced != generation:
+                self.set_levels(shared_cache.table("products"))
+                self._synced = generation
+            return
+        for record in records:
+            name = record.get('name')
+            if not name:
+                continue
+            with self._lock:
+                if action == "insert" and record.get('reorder_level') is not None:
+                    self._levels[name] = float(record['reorder_level'])
+                elif action == "delete":
+                    self._levels.pop(name, None)
+            self.check(name, self._ledger.on_hand(name)[0])
+
+    def low_stock(self):
+        """Products at or below their reorder level, lowest cover first."""
+        with self._lock:
+            rows = [
+                {'product_name': name, 'on_hand': qty, 'reorder_level': self._levels.get(name)}
+                for name, qty in self._below.items()
+            ]
+        # A product whose level was just removed is unflagged by its next check
+        rows = [row for row in rows if row['reorder_level'] is not None]
+        return sorted(rows, key=lambda row: row['on_hand'] - row['reorder_level'])
+
+    def recent_alerts(self):
+        """Most recent threshold crossings, newest first."""
+        with self._lock:
+            return list(self._alerts)
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_monitor():
+    """Return the process-wide reorder monitor, building it on first use."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            inventory = ledger.get_ledger()
+            monitor = ReorderMonitor(inventory)
+            inventory.on_change(monitor.check)
+            dm.subscribe(monitor.apply)
+            monitor._synced = shared_cache.generation("products")
+            monitor.set_levels(shared_cache.table("products"))
+            _monitor = monitor
+        return _monitor
+
+
+def main():
+    low = get_monitor().low_stock()
+    if not low:
+        print("All products above reorder level.")
+        return 0
+    print(f"{len(low)} product(s) at or below reorder level:")
+    for row in low:
+        print(f"  {row['product_name']}: {row['on_hand']:g} on hand (reorder at {row['reorder_level']:g})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
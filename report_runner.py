@@ -0,0 +1,53 @@
+"""Headless runner that precomputes every dashboard report.
+
+Usage:
+    python report_runner.py [--output data/reports]
+
+Suitable for cron, e.g. nightly:
+    0 2 * * * cd /path/to/app && python report_runner.py
+"""
+import argparse
+import sys
+import time
+
+import data_manager as dm
+import reports
+
+
+def run(output_dir=reports.REPORTS_DIR):
+    """Load the source tables once, compute all reports and save them."""
+    started = time.perf_counter()
+    # Taken before the download, so rows written meanwhile leave the reports looking stale
+    sources = {table: dm.get_table_fingerprint(table) for table in ("stock_out", "stock_in")}
+    sales_df = dm.get_stock_out()
+    stock_df = dm.get_stock_in()
+    loaded = time.perf_counter()
+
+    results = reports.compute_all_reports(sales_df, stock_df)
+    computed = time.perf_counter()
+
+    reports.save_reports(results, sources, output_dir)
+    saved = time.perf_counter()
+
+    print(f"Loaded {len(sales_df)} sales and {len(stock_df)} stock rows in {loaded - started:.2f}s")
+    print(f"Computed {len(results)} reports in {computed - loaded:.2f}s")
+    print(f"Saved to {output_dir} in {saved - computed:.2f}s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute dashboard reports")
+    parser.add_argument("--output", default=reports.REPORTS_DIR,
+                        help="Directory to write report files to")
+    args = parser.parse_args(argv)
+
+    try:
+        run(args.output)
+    except Exception as e:
+        print(f"Error generating reports: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""Pure report functions behind the dashboard and search pages.
+
+Every function takes DataFrames and returns DataFrames (or plain dicts), so
+the same code serves the Streamlit pages and the headless report runner.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+EXPIRY_CATEGORIES = [
+    "Expired",
+    "Expiring Soon (< 30 days)",
+    "Medium Term (30-90 days)",
+    "Long Term (> 90 days)"
+]
+
+# Search page options -> sales column, None meaning every text column
+SEARCH_COLUMNS = {
+    "All Fields": None,
+    "Order Number": "order_number",
+    "Product Name": "product_name",
+    "Batch Number": "batch_number",
+    "Customer Name": "customer_name",
+    "SKU": "sku"
+}
+
+REPORTS_DIR = os.path.join("data", "reports")
+MANIFEST_FILE = "manifest.json"
+
+
+### PREPARATION ###
+
+def prepare_sales(sales_df):
+    """Parse dates and add the derived columns every sales report needs."""
+    df = sales_df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    if 'best_before' in df.columns:
+        df['best_before'] = pd.to_datetime(df['best_before'])
+    df['month'] = df['date'].dt.strftime('%Y-%m')
+    df['day_of_week'] = df['date'].dt.day_name()
+    return df
+
+def prepare_stock(stock_df, today=None):
+    """Parse dates and add stock value and days-to-expiry columns."""
+    df = stock_df.copy()
+    df['stock_value'] = df['quantity'] * df['package_size'] * df['price_per_unit']
+    df['best_before'] = pd.to_datetime(df['best_before'])
+    df['use_by_date'] = pd.to_datetime(df['use_by_date'])
+
+    today = pd.Timestamp(today or datetime.now().date())
+    df['days_to_best_before'] = (df['best_before'] - today).dt.days
+    df['days_to_use_by'] = (df['use_by_date'] - today).dt.days
+    df['expiration_category'] = np.select(
+        [
+            df['days_to_best_before'] < 0,
+            df['days_to_best_before'] < 30,
+            df['days_to_best_before'] < 90
+        ],
+        EXPIRY_CATEGORIES[:3],
+        default=EXPIRY_CATEGORIES[3]
+    )
+    return df
+
+
+### SALES REPORTS ###
+
+def dashboard_metrics(sales):
+    """Headline numbers for the dashboard cards."""
+    return {
+        "total_revenue": float(sales['total_price'].sum()),
+        "total_orders": int(sales['order_number'].nunique()),
+        "total_customers": int(sales['customer_name'].nunique()),
+        "total_products_sold": int(sales['quantity'].sum())
+    }
+
+def orders_summary(sales):
+    """One row per order with its products, quantity and total."""
+    return sales.groupby('order_number').agg({
+        'date': 'first',
+        'customer_name': 'first',
+        'product_name': lambda x: ', '.join(set(x)),
+        'quantity': 'sum',
+        'total_price': 'sum',
+        'delivery_method': 'first'
+    }).reset_index()
+
+def filter_sales(sales, search_text="", search_type="All Fields", date_range=None,
+                 best_before_range=None):
+    """Sales lines matching the search page's text and date filters."""
+    filtered = sales
+    if search_text:
+        column = SEARCH_COLUMNS[search_type]
+        columns = [col for col in SEARCH_COLUMNS.values() if col] if column is None else [column]
+        mask = pd.Series(False, index=filtered.index)
+        for col in columns:
+            mask |= filtered[col].fillna('').str.contains(search_text, case=False, na=False)
+        filtered = filtered[mask]
+
+    if date_range is not None:
+        filtered = filtered[
+            (filtered['date'] >= pd.to_datetime(date_range[0])) &
+            (filtered['date'] <= pd.to_datetime(date_range[1]))
+        ]
+    if best_before_range is not None:
+        filtered = filtered[
+            (filtered['best_before'] >= pd.to_datetime(best_before_range[0])) &
+            (filtered['best_before'] <= pd.to_datetime(best_before_range[1]))
+        ]
+    return filtered
+
+def sales_by_product(sales):
+    return sales.groupby('product_name').agg({
+        'quantity': 'sum',
+        'total_price': 'sum'
+    }).reset_index().sort_values('total_price', ascending=False)
+
+def sales_by_customer(sales):
+    customer_sales = sales.groupby('customer_name').agg({
+        'order_number': 'nunique',
+        'quantity': 'sum',
+        'total_price': 'sum'
+    }).reset_index().sort_values('total_price', ascending=False)
+    customer_sales.columns = ['Customer', 'Orders', 'Units', 'Total Sales']
+    return customer_sales
+
+def monthly_sales(sales):
+    return sales.groupby('month').agg({
+        'order_number': 'nunique',
+        'quantity': 'sum',
+        'total_price': 'sum'
+    }).reset_index()
+
+def weekday_sales(sales):
+    return sales.groupby('day_of_week').agg({
+        'order_number': 'nunique',
+        'quantity': 'sum',
+        'total_price': 'sum'
+    }).reindex(DAY_ORDER).reset_index()
+
+def daily_sales(sales, days=30, end_date=None):
+    """Revenue per day over the last `days` days, with empty days as zero."""
+    end_date = end_date or datetime.now().date()
+    start_date = end_date - pd.Timedelta(days=days)
+    by_day = sales.groupby(sales['date'].dt.normalize())['total_price'].sum()
+    all_dates = pd.date_range(start=start_date, end=end_date)
+    return by_day.reindex(all_dates, fill_value=0).rename_axis('date').reset_index()
+
+
+### CUSTOMER REPORTS ###
+
+RFM_SEGMENTS = [
+    "Champions", "Loyal Customers", "Potential Loyalists", "New Customers",
+    "At Risk", "Can't Lose Them", "Hibernating", "Lost"
+]
+
+def _quantile_score(values, bins=5):
+    """Score 1..bins by percentile rank, higher values scoring higher."""
+    pct = values.rank(method='average', pct=True)
+    return np.ceil(pct * bins).clip(1, bins).astype(int)
+
+def rfm_analysis(sales, as_of=None):
+    """Recency, frequency and monetary value per customer, with 1-5 scores.
+
+    All three metrics come from a single groupby. Recency is days since the
+    customer's last order as of `as_of` (default: the latest sale).
+    """
+    columns = ['customer_name', 'last_order', 'recency_days', 'frequency', 'monetary',
+               'r_score', 'f_score', 'm_score', 'rfm_score', 'segment']
+    customers = sales.dropna(subset=['customer_name'])
+    if customers.empty:
+        return pd.DataFrame(columns=columns)
+
+    rfm = customers.groupby('customer_name').agg(
+        last_order=('date', 'max'),
+        frequency=('order_number', 'nunique'),
+        monetary=('total_price', 'sum')
+    ).reset_index()
+
+    as_of = pd.Timestamp(as_of) if as_of is not None else rfm['last_order'].max()
+    rfm['recency_days'] = (as_of - rfm['last_order']).dt.days
+
+    # Fewer days since the last order is better, so rank the negation
+    rfm['r_score'] = _quantile_score(-rfm['recency_days'])
+    rfm['f_score'] = _quantile_score(rfm['frequency'])
+    rfm['m_score'] = _quantile_score(rfm['monetary'])
+    rfm['rfm_score'] = rfm['r_score'] * 100 + rfm['f_score'] * 10 + rfm['m_score']
+
+    r, f = rfm['r_score'], rfm['f_score']
+    rfm['segment'] = np.select(
+        [
+            (r >= 4) & (f >= 4),
+            (r >= 3) & (f >= 3),
+            (r >= 4) & (f >= 2),
+            (r >= 4),
+            (r == 3) | ((r == 2) & (f >= 3)),
+            (r <= 2) & (f >= 4),
+            (r == 2)
+        ],
+        RFM_SEGMENTS[:7],
+        default=RFM_SEGMENTS[7]
+    )
+    return rfm[columns].sort_values('rfm_score', ascending=False, ignore_index=True)
+
+def rfm_segment_counts(rfm):
+    """Customers and revenue per RFM segment, in segment order."""
+    return rfm.groupby('segment').agg(
+        customers=('customer_name', 'size'),
+        revenue=('monetary', 'sum')
+    ).reindex(RFM_SEGMENTS, fill_value=0).reset_index()
+
+def cohort_retention(sales):
+    """Monthly customer retention by first-purchase cohort.
+
+    Returns (retention, cohort_sizes): retention has one row per cohort
+    month and one column per months since first purchase, holding the share
+    of the cohort that ordered in that month. Cells after the latest month
+    in the data are NaN, giving the usual triangle.
+    """
+    activity = sales[['customer_name', 'date']].dropna()
+    if activity.empty:
+        return pd.DataFrame(), pd.Series(dtype=int)
+
+    # Months as integers so cohort age is plain subtraction
+    month = activity['date'].dt.year * 12 + activity['date'].dt.month - 1
+    active = pd.DataFrame({'customer_name': activity['customer_name'], 'month': month}).drop_duplicates()
+    active['cohort'] = active.groupby('customer_name')['month'].transform('min')
+    active['age'] = active['month'] - active['cohort']
+
+    counts = active.groupby(['cohort', 'age']).size().unstack(fill_value=0)
+    cohort_sizes = counts[0]
+    retention = counts.div(cohort_sizes, axis=0)
+
+    # Blank out ages the cohort has not reached yet
+    last_month = month.max()
+    reached = (last_month - retention.index.to_numpy())[:, None] >= retention.columns.to_numpy()[None, :]
+    retention = retention.where(reached)
+
+    labels = [f"{code // 12}-{code % 12 + 1:02d}" for code in retention.index]
+    retention.index = labels
+    cohort_sizes.index = labels
+    return retention, cohort_sizes
+
+
+### STOCK REPORTS ###
+
+def stock_value_by_type(stock):
+    return stock.groupby('type').agg({
+        'stock_value': 'sum',
+        'quantity': 'sum'
+    }).reset_index()
+
+def stock_value_details(stock):
+    return stock.groupby(['type', 'product_name']).agg({
+        'quantity': 'sum',
+        'stock_value': 'sum'
+    }).reset_index().sort_values(['type', 'stock_value'], ascending=[True, False])
+
+def expiry_summary(stock):
+    return stock.groupby('expiration_category').agg({
+        'quantity': 'sum',
+        'stock_value': 'sum'
+    }).reindex(EXPIRY_CATEGORIES, fill_value=0).reset_index()
+
+def expiring_soon(stock):
+    soon = stock[stock['expiration_category'] == EXPIRY_CATEGORIES[1]]
+    return soon.sort_values('days_to_best_before')[
+        ['product_name', 'batch_number', 'quantity', 'best_before', 'days_to_best_before']
+    ]
+
+
+### ALL REPORTS ###
+
+def compute_all_reports(sales_df, stock_df, today=None):
+    """Compute every dashboard report from the raw tables.
+
+    Each table is prepared once and shared by all of its reports.
+    """
+    results = {}
+
+    if not sales_df.empty:
+        sales = prepare_sales(sales_df)
+        results.update({
+            "dashboard_metrics": pd.DataFrame([dashboard_metrics(sales)]),
+            "orders_summary": orders_summary(sales),
+            "sales_by_product": sales_by_product(sales),
+            "sales_by_customer": sales_by_customer(sales),
+            "monthly_sales": monthly_sales(sales),
+            "weekday_sales": weekday_sales(sales),
+            "daily_sales": daily_sales(sales, end_date=today)
+        })
+
+    if not stock_df.empty:
+        stock = prepare_stock(stock_df, today=today)
+        results.update({
+            "stock_value_by_type": stock_value_by_type(stock),
+            "stock_value_details": stock_value_details(stock),
+            "expiry_summary": expiry_summary(stock),
+            "expiring_soon": expiring_soon(stock)
+        })
+
+    return results
+
+def save_reports(reports, sources, directory=REPORTS_DIR):
+    """Write each report to CSV plus a manifest of their column types and source tables.
+
+    sources maps each table to the fingerprint (see
+    data_manager.get_table_fingerprint) of the rows the reports were built from.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, frame in reports.items():
+        frame.to_csv(os.path.join(directory, f"{name}.csv"), index=False)
+
+    manifest = {
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "reports": sorted(reports),
+        # CSV keeps no types, so dates would come back as text and nullable ints as floats
+        "dtypes": {name: {column: str(dtype) for column, dtype in frame.dtypes.items()}
+                   for name, frame in reports.items()},
+        "sources": {table: list(fingerprint) for table, fingerprint in sources.items()}
+    }
+    # Write the manifest last so readers never see a half-written set
+    tmp_path = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+def load_manifest(directory=REPORTS_DIR):
+    """Return the saved manifest, or None if no reports have been generated."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_report(name, directory=REPORTS_DIR):
+    """Load one saved report with its original column types, or None if it is missing."""
+    path = os.path.join(directory, f"{name}.csv")
+    if not os.path.exists(path):
+        return None
+    dtypes = ((load_manifest(directory) or {}).get("dtypes") or {}).get(name, {})
+    dates = [column for column, dtype in dtypes.items() if dtype.startswith("datetime64")]
+    try:
+        df = pd.read_csv(path, parse_dates=dates,
+                         dtype={column: dtype for column, dtype in dtypes.items() if column not in dates})
+        for column in dates:
+            df[column] = df[column].astype(dtypes[column])
+    except (TypeError, ValueError) as e:
+        print(f"Error loading saved report {name}: {str(e)}")
+        return None
+    return df
+
+def is_current(manifest, table, fingerprint):
+    """Whether the saved reports were built from the rows with this fingerprint."""
+    return (manifest is not None and fingerprint is not None
+            and manifest.get("sources", {}).get(table) == list(fingerprint))
@@ -0,0 +1,263 @@
+"""Process-wide cache of tables and derived artefacts, shared by all sessions.
+
+Streamlit runs the script once per browser session, and st.cache_data hands
+every caller its own unpickled copy. Here each table and each derived
+artefact (prepared frames, report tables) is held once per server process.
+Callers get shallow copies; with pandas copy-on-write enabled those share
+memory with the cached frame until the caller modifies them, so the cached
+data can never be changed through a view.
+
+Tables are revalidated when data_manager's version for them changes or
+after SALES_CACHE_TTL seconds: the table's fingerprint (row count, max id,
+max updated_at) is fetched first and the rows are only downloaded again if
+it differs, much like an HTTP conditional GET. Each download gets a new
+generation number. Derived artefacts are keyed on the generations of the
+tables they depend on, so they survive a refresh that found nothing new,
+and are evicted least-recently-used once their total size exceeds
+SALES_CACHE_BUDGET_MB.
+
+When a background refresher runs (see warmer.py) it sets
+background_refresh, and readers no longer revalidate tables on TTL expiry:
+the refresher calls refresh() on its own schedule and swaps the new rows in
+while readers keep using the old ones.
+
+New rows found by a TTL revalidation or refresh() are announced with
+data_manager.mark_changed(), like a change from another process, so the
+structures that follow a table incrementally reload it as well.
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import data_manager as dm
+
+pd.set_option('mode.copy_on_write', True)
+
+CACHE_BUDGET_MB = float(os.environ.get("SALES_CACHE_BUDGET_MB", "256"))
+TABLE_TTL = float(os.environ.get("SALES_CACHE_TTL", "300"))
+
+# data_manager loader per table, looked up at load time so wrapped
+# (e.g. profiled) versions are used
+TABLE_LOADERS = {
+    "stock_out": "get_stock_out",
+    "stock_in": "get_stock_in",
+    "wastage": "get_wastage",
+    "products": "get_products"
+}
+
+
+def _view(value):
+    """Cheap read-only view of a cached value."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_view(item) for item in value)
+    return value
+
+def _size_of(value):
+    """Approximate memory held by a cached value, in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(_size_of(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_size_of(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class SharedCache:
+    """Tables and derived artefacts held once per process."""
+
+    def __init__(self, budget_bytes, table_ttl):
+        self.budget_bytes = budget_bytes
+        self.table_ttl = table_ttl
+        self.background_refresh = False
+        self._lock = threading.Lock()
+        self._tables = {}               # name -> (version, checked_at, frame, fingerprint, generation)
+        self._generations = itertools.count(1)
+        self._derived = OrderedDict()   # (key, generations) -> (value, size)
+        self._derived_bytes = 0
+        self._key_locks = {}            # one loader per table / artefact at a time
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    ### TABLES ###
+
+    def table(self, name):
+        """A view of a table, loading it if it changed or expired."""
+        return _view(self._fresh_entry(name, count_hit=True)[2])
+
+    def generation(self, name):
+        """Number that changes only when a table's rows are downloaded again."""
+        return self._fresh_entry(name)[4]
+
+    def fingerprint(self, name):
+        """Server fingerprint of the rows table() returns, None if it could not be fetched."""
+        return self._fresh_entry(name)[3]
+
+    def _fresh_entry(self, name, count_hit=False):
+        version = dm.get_table_version(name)
+        entry = self._tables.get(name)
+        if self._is_fresh(entry, version):
+            self.hits += count_hit
+            return entry
+
+        with self._key_lock(("table", name)):
+            # Another session may have loaded it while we waited
+            entry = self._tables.get(name)
+            if self._is_fresh(entry, version):
+                return entry
+            new_entry = self._revalidate(name, version, entry)
+            unannounced = self._stamp_unannounced(name, version, entry, new_entry)
+        if unannounced:
+            dm.mark_changed(name)
+        return new_entry
+
+    def refresh(self, name):
+        """Revalidate a table now, whatever its TTL. True if its rows were downloaded again.
+
+        Readers keep getting the old rows until the new entry replaces them.
+        """
+        version = dm.get_table_version(name)
+        with self._key_lock(("table", name)):
+            entry = self._tables.get(name)
+            new_entry = self._revalidate(name, version, entry)
+            unannounced = self._stamp_unannounced(name, version, entry, new_entry)
+        if unannounced:
+            dm.mark_changed(name)
+        return new_entry[4] != (entry[4] if entry else None)
+
+    def _stamp_unannounced(self, name, version, entry, new_entry):
+        """Whether a revalidation found rows no write notification announced.
+
+        That happens when the table expired or was refreshed without its
+        version changing. The caller then sends a "refresh" notification
+        once the key lock is released, so incremental structures re-read
+        the table. The entry is stamped with the version that notification
+        will produce, so they get these rows instead of a second download;
+        any other write in between bumps the version past it.
+        """
+        if entry is None or entry[0] != version or new_entry[4] == entry[4]:
+            return False
+        self._tables[name] = (version + 1,) + new_entry[1:]
+        return True
+
+    def _revalidate(self, name, version, entry):
+        """Check a table's fingerprint, download it if it changed, and store the new entry."""
+        fingerprint = self._fingerprint(name)
+        if entry is not None and fingerprint is not None and fingerprint == entry[3]:
+            # Unchanged on the server: keep the rows, skip the download
+            self.revalidated += 1
+            entry = (version, time.monotonic(), entry[2], fingerprint, entry[4])
+        else:
+            self.misses += 1
+            frame = getattr(dm, TABLE_LOADERS[name])()
+            entry = (version, time.monotonic(), frame, fingerprint, next(self._generations))
+        self._tables[name] = entry
+        return entry
+
+    def _fingerprint(self, name):
+        try:
+            return dm.get_table_fingerprint(name)
+        except Exception as e:
+            print(f"Error fetching fingerprint for {name}: {str(e)}")
+            return None
+
+    def _is_fresh(self, entry, version):
+        return (entry is not None and entry[0] == version
+                and (self.background_refresh or time.monotonic() - entry[1] < self.table_ttl))
+
+    def invalidate(self, name):
+        """Drop a table and everything derived from it."""
+        self._tables.pop(name, None)
+        with self._lock:
+            for key in [key for key in self._derived if name in dict(key[1])]:
+                self._drop(key)
+
+    ### DERIVED ARTEFACTS ###
+
+    def derived(self, key, depends_on, compute):
+        """A view of compute(), cached until a table in depends_on changes.
+
+        key identifies the artefact and must include any parameters it was
+        computed with, e.g. ("product_pairs", min_orders).
+        """
+        full_key = (key, tuple((name, self.generation(name)) for name in depends_on))
+        with self._lock:
+            if full_key in self._derived:
+                self._derived.move_to_end(full_key)
+                self.hits += 1
+                return _view(self._derived[full_key][0])
+
+        with self._key_lock(("derived", key)):
+            with self._lock:
+                if full_key in self._derived:
+                    return _view(self._derived[full_key][0])
+            self.misses += 1
+            value = compute()
+            self._store(full_key, value)
+        return _view(value)
+
+    def _store(self, full_key, value):
+        size = _size_of(value)
+        with self._lock:
+            # Older versions of the same artefact are no longer reachable
+            for key in [key for key in self._derived if key[0] == full_key[0]]:
+                self._drop(key)
+            self._derived[full_key] = (value, size)
+            self._derived_bytes += size
+            while self._derived_bytes > self.budget_bytes and len(self._derived) > 1:
+                self._drop(next(iter(self._derived)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, size = self._derived.pop(key)
+        self._derived_bytes -= size
+
+    def stats(self):
+        """Sizes and hit counts, for diagnostics."""
+        with self._lock:
+            table_bytes = sum(_size_of(entry[2]) for entry in self._tables.values())
+            return {
+                "tables": len(self._tables),
+                "table_mb": table_bytes / 1e6,
+                "derived": len(self._derived),
+                "derived_mb": self._derived_bytes / 1e6,
+                "budget_mb": self.budget_bytes / 1e6,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions
+            }
+
+
+cache = SharedCache(CACHE_BUDGET_MB * 1e6, TABLE_TTL)
+
+def table(name):
+    """A view of a table from the process-wide cache."""
+    return cache.table(name)
+
+def derived(key, depends_on, compute):
+    """A view of a derived artefact from the process-wide cache."""
+    return cache.derived(key, depends_on, compute)
+
+def generation(name):
+    """Generation of a table in the process-wide cache."""
+    return cache.generation(name)
+
+def fingerprint(name):
+    """Fingerprint of a table in the process-wide cache."""
+    return cache.fingerprint(name)
@@ -0,0 +1,54 @@
+"""Custom CSS for the app, minified once per process.
+
+Streamlit drops elements a rerun does not emit, so the style block is sent
+on every rerun; keeping it small keeps that cheap. Only the classes the
+pages use are defined here.
+"""
+import re
+
+_CSS = """
+.card {
+    background-color: #f8f9fa;
+    border-radius: 0.5rem;
+    padding: 1.5rem;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+    margin-bottom: 1rem;
+}
+.stat-card {
+    text-align: center;
+    padding: 1rem;
+    border-radius: 0.5rem;
+    background-color: #f1f8e9;
+}
+.metric-label {
+    font-size: 0.9rem;
+    color: #546e7a;
+}
+.metric-value {
+    font-size: 1.8rem;
+    font-weight: bold;
+    color: #2e7d32;
+}
+.order-container {
+    border: 1px solid #e0e0e0;
+    border-radius: 0.5rem;
+    padding: 1rem;
+    margin-bottom: 0.8rem;
+    background-color: white;
+}
+.form-section {
+    background-color: #f8f9fa;
+    padding: 1.5rem;
+    border-radius: 0.5rem;
+    margin-bottom: 1.5rem;
+}
+"""
+
+
+def _minify(css):
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+CUSTOM_CSS = f"<style>{_minify(_CSS)}</style>"
@@ -1,3 +1,4 @@
+import importlib
 import random
 import string
 from datetime import datetime
@@ -19,3 +20,15 @@ def validate_date_format(date_str):
 def format_date(date_obj):
     """Format date object to string"""
     return date_obj.strftime('%Y-%m-%d')
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
@@ -0,0 +1,209 @@
+"""Background refresher that keeps tables and derived data warm.
+
+Without it the first rerun after a change pays for downloading the table
+and recomputing every report built on it. The warmer is a daemon thread in
+the app server process that does that work instead:
+
+- every tick it polls the change feed, so writes from other processes are
+  applied (and incremental structures re-read their tables) on this
+  thread rather than in a user's rerun;
+- it reloads tables whose version changed, and every
+  SALES_WARMER_INTERVAL seconds revalidates all of them against their
+  server fingerprints (the shared cache stops doing that on TTL expiry
+  while the warmer runs);
+- it then recomputes each registered task whose tables changed since it
+  last ran. Derived tasks go through shared_cache.derived(), so the new
+  value replaces the old one in a single step and a rerun never sees a
+  half-built one. Process-wide singletons (ledger, catalogue, ...) are
+  built by their first run; after that they follow the "refresh"
+  notification the shared cache sends when it downloads new rows, which
+  here happens on this thread.
+
+Tables and tasks run on up to SALES_WARMER_WORKERS threads. A task that
+fails is retried after SALES_WARMER_RETRY seconds, doubling on every
+further failure up to SALES_WARMER_MAX_BACKOFF; until then readers compute
+it themselves as before. Set SALES_WARMER=0 to turn the warmer off.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import change_feed
+import data_manager as dm
+import shared_cache
+
+ENABLED = os.environ.get("SALES_WARMER", "1").strip().lower() not in ("0", "false", "no", "off")
+INTERVAL = float(os.environ.get("SALES_WARMER_INTERVAL", "60"))
+WORKERS = int(os.environ.get("SALES_WARMER_WORKERS", "2"))
+RETRY = float(os.environ.get("SALES_WARMER_RETRY", "5"))
+MAX_BACKOFF = float(os.environ.get("SALES_WARMER_MAX_BACKOFF", "600"))
+
+# Seconds between ticks when nothing wakes the warmer sooner
+TICK = change_feed.POLL_INTERVAL
+
+
+class TaskStatus:
+    """Outcome of the runs of one warmer task."""
+
+    def __init__(self, name):
+        self.name = name
+        self.inputs = None      # table generations the last successful run saw
+        self.last_run = None
+        self.seconds = 0.0
+        self.runs = 0
+        self.failures = 0       # consecutive
+        self.error = None
+        self.retry_at = 0.0
+
+    def due(self, now):
+        return now >= self.retry_at
+
+    def succeeded(self, inputs, seconds):
+        self.inputs = inputs
+        self.last_run = datetime.now()
+        self.seconds = seconds
+        self.runs += 1
+        self.failures = 0
+        self.error = None
+        self.retry_at = 0.0
+
+    def failed(self, error, now):
+        self.last_run = datetime.now()
+        self.failures += 1
+        self.error = str(error)
+        self.retry_at = now + min(RETRY * 2 ** (self.failures - 1), MAX_BACKOFF)
+
+
+class Warmer(threading.Thread):
+    """Reloads changed tables and recomputes the tasks built on them."""
+
+    def __init__(self, tasks, interval=INTERVAL, workers=WORKERS):
+        super().__init__(name="cache-warmer", daemon=True)
+        self.interval = interval
+        self._tasks = {}            # name -> (tables, compute)
+        self._status = {}           # name -> TaskStatus
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="cache-warmer")
+        self._last_revalidated = time.monotonic()
+        self.cycles = 0
+        self.update(tasks)
+
+    def update(self, tasks):
+        """Replace the tasks: {name: (tables, compute)}. Keeps the status of known names."""
+        with self._lock:
+            self._tasks = dict(tasks)
+            for name in self._tasks:
+                self._status.setdefault(name, TaskStatus(name))
+
+    def notify(self, table, action, records):
+        """data_manager write notification: warm up again without waiting for the tick."""
+        self._wake.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.cycle()
+            except Exception as e:
+                print(f"Error warming caches: {str(e)}")
+            self._wake.wait(TICK)
+            self._wake.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        self.join()
+        self._pool.shutdown(wait=False)
+
+    def cycle(self):
+        """One pass: apply the change feed, refresh tables, then recompute stale tasks."""
+        self.cycles += 1
+        change_feed.poll(force=True)
+
+        now = time.monotonic()
+        revalidate = now - self._last_revalidated >= self.interval
+        if revalidate:
+            self._last_revalidated = now
+        # Tables first, so tasks sharing a table do not each wait on its download
+        load = shared_cache.cache.refresh if revalidate else shared_cache.generation
+        self._run_all([(f"table:{name}", None, lambda name=name: load(name))
+                       for name in change_feed.ALL_TABLES])
+
+        with self._lock:
+            tasks = list(self._tasks.items())
+            failing = {name for name in change_feed.ALL_TABLES
+                       if self._status[f"table:{name}"].failures}
+        jobs = []
+        for name, (tables, compute) in tasks:
+            if failing.intersection(tables):
+                continue    # waits for its tables to load again
+            inputs = tuple(shared_cache.generation(table) for table in tables)
+            if inputs != self._status[name].inputs:
+                jobs.append((name, inputs, compute))
+        self._run_all(jobs)
+
+    def _run_all(self, jobs):
+        """Run (name, inputs, compute) jobs on the pool, skipping those backing off."""
+        now = time.monotonic()
+        with self._lock:
+            for name, _, _ in jobs:
+                self._status.setdefault(name, TaskStatus(name))
+            jobs = [job for job in jobs if self._status[job[0]].due(now)]
+        for future in [self._pool.submit(self._run_one, *job) for job in jobs]:
+            future.result()
+
+    def _run_one(self, name, inputs, compute):
+        status = self._status[name]
+        started = time.monotonic()
+        try:
+            compute()
+        except Exception as e:
+            print(f"Error warming {name}: {str(e)}")
+            status.failed(e, time.monotonic())
+        else:
+            status.succeeded(inputs, time.monotonic() - started)
+
+    def status(self):
+        """One row per table and task, for diagnostics."""
+        now = time.monotonic()
+        with self._lock:
+            statuses = list(self._status.values())
+        return [
+            {
+                'task': status.name,
+                'last_run': status.last_run,
+                'seconds': status.seconds,
+                'runs': status.runs,
+                'failures': status.failures,
+                'retry_in': max(status.retry_at - now, 0.0) if status.failures else None,
+                'error': status.error
+            }
+            for status in statuses
+        ]
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+def start(tasks):
+    """Start the process-wide warmer, or update its tasks if it runs. Returns whether it runs."""
+    global _warmer
+    if not ENABLED:
+        return False
+    with _warmer_lock:
+        if _warmer is None:
+            warmer = Warmer(tasks)
+            shared_cache.cache.background_refresh = True
+            dm.subscribe(warmer.notify)
+            warmer.start()
+            _warmer = warmer
+        else:
+            _warmer.update(tasks)
+    return True
+
+def get_warmer():
+    """The running warmer, or None."""
+    return _warmer
@@ -0,0 +1,191 @@
+"""Wastage rates per product, supplier and batch.
+
+Wastage rows are joined to the stock_in delivery they came from on
+(product_name, batch_number). The stock_in side is held in a hash index
+keyed on that pair, and both sides are kept as running totals updated from
+data_manager write notifications, so a view never re-merges the tables.
+"""
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+import data_manager as dm
+import shared_cache
+from ledger import record_key, to_number
+
+UNKNOWN_SUPPLIER = "Unknown"
+
+
+class WastageAnalytics:
+    """Running wastage totals joined to stock-in batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Join index: (product, batch) -> received quantity, cost and supplier
+        self._received_qty = defaultdict(float)
+        self._received_cost = defaultdict(float)
+        # (product, batch) -> {stock_in id: supplier}, the latest row's supplier winning
+        self._suppliers = defaultdict(dict)
+        # (product, batch) -> wasted quantity and cost
+        self._wasted_qty = defaultdict(float)
+        self._wasted_cost = defaultdict(float)
+        # (month, product) -> wasted cost
+        self._monthly_cost = defaultdict(float)
+        # (table, id) -> what was added, so deletes can be reversed
+        self._entries = {}
+        # table -> shared_cache generation last synced from
+        self._synced = {}
+
+    def apply(self, table, action, records):
+        """Apply a data_manager write notification."""
+        if table not in ("stock_in", "wastage"):
+            return
+        if action == "refresh":
+            generation = shared_cache.generation(table)
+            if self._synced.get(table) != generation:
+                self.sync(table, shared_cache.table(table))
+                self._synced[table] = generation
+            return
+        with self._lock:
+            for record in records:
+                entry_id = (table, record.get('id'))
+                if action == "insert":
+                    if record.get('id') is not None and entry_id in self._entries:
+                        continue
+                    entry = self._add(table, record)
+                    if record.get('id') is not None:
+                        self._entries[entry_id] = entry
+                else:
+                    entry = self._entries.pop(entry_id, None)
+                    if entry is not None:
+                        self._subtract(table, record.get('id'), entry)
+
+    def load(self, stock_in_df, wastage_df):
+        """Apply every existing row. Rows already seen are skipped."""
+        for table, df in (("stock_in", stock_in_df), ("wastage", wastage_df)):
+            if not df.empty:
+                self.apply(table, "insert", df.to_dict('records'))
+
+    def sync(self, table, df):
+        """Bring one table's rows in line with its current contents."""
+        current = df.to_dict('records') if not df.empty else []
+        ids = {record.get('id') for record in current}
+        with self._lock:
+            stale = [{'id': entry_id} for (entry_table, entry_id) in self._entries
+                     if entry_table == table and entry_id not in ids]
+        self.apply(table, "delete", stale)
+        self.apply(table, "insert", current)
+
+    def _add(self, table, record):
+        key = record_key(record)
+        qty = to_number(record.get('quantity'))
+        if table == "stock_in":
+            cost = qty * to_number(record.get('package_size')) * to_number(record.get('price_per_unit'))
+            self._received_qty[key] += qty
+            self._received_cost[key] += cost
+            if record.get('supplier_name'):
+                self._suppliers[key][record.get('id')] = record['supplier_name']
+            return key, qty, cost, None
+
+        cost = to_number(record.get('total_cost'))
+        month = str(record.get('date') or '')[:7]
+        self._wasted_qty[key] += qty
+        self._wasted_cost[key] += cost
+        self._monthly_cost[(month, key[0])] += cost
+        return key, qty, cost, month
+
+    def _subtract(self, table, record_id, entry):
+        key, qty, cost, month = entry
+        if table == "stock_in":
+            self._received_qty[key] -= qty
+            self._received_cost[key] -= cost
+            suppliers = self._suppliers.get(key)
+            if suppliers is not None:
+                suppliers.pop(record_id, None)
+                if not suppliers:
+                    del self._suppliers[key]
+        else:
+            self._wasted_qty[key] -= qty
+            self._wasted_cost[key] -= cost
+            self._monthly_cost[(month, key[0])] -= cost
+
+    def _supplier(self, key):
+        suppliers = self._suppliers.get(key)
+        return next(reversed(suppliers.values())) if suppliers else UNKNOWN_SUPPLIER
+
+    def by_batch(self):
+        """Wastage per product batch, with the supplier and quantity received."""
+        with self._lock:
+            rows = [
+                {
+                    'product_name': key[0],
+                    'batch_number': key[1],
+                    'supplier_name': self._supplier(key),
+                    'received_qty': self._received_qty.get(key, 0.0),
+                    'wasted_qty': qty,
+                    'wasted_cost': self._wasted_cost[key]
+                }
+                for key, qty in self._wasted_qty.items() if qty
+            ]
+        result = pd.DataFrame(rows, columns=['product_name', 'batch_number', 'supplier_name',
+                                             'received_qty', 'wasted_qty', 'wasted_cost'])
+        return _with_rate(result)
+
+    def by_product(self):
+        """Wastage per product, as a share of everything received."""
+        with self._lock:
+            received = defaultdict(float)
+            for (product, _), qty in self._received_qty.items():
+                received[product] += qty
+        return self._group(['product_name'], received_by=received)
+
+    def by_supplier(self):
+        """Wastage per supplier, as a share of everything received from them."""
+        with self._lock:
+            received = defaultdict(float)
+            for key, qty in self._received_qty.items():
+                received[self._supplier(key)] += qty
+        return self._group(['supplier_name'], received_by=received)
+
+    def cost_trend(self):
+        """Wasted cost per month and product."""
+        with self._lock:
+            rows = [
+                {'month': month, 'product_name': product, 'wasted_cost': cost}
+                for (month, product), cost in self._monthly_cost.items() if cost
+            ]
+        return pd.DataFrame(rows, columns=['month', 'product_name', 'wasted_cost']).sort_values('month')
+
+    def _group(self, columns, received_by):
+        batches = self.by_batch()
+        grouped = batches.groupby(columns).agg({
+            'wasted_qty': 'sum',
+            'wasted_cost': 'sum'
+        }).reset_index()
+        grouped.insert(1, 'received_qty', grouped[columns[0]].map(received_by).fillna(0.0))
+        return _with_rate(grouped).sort_values('wasted_cost', ascending=False, ignore_index=True)
+
+
+def _with_rate(df):
+    """Add wasted / received as a rate, blank where nothing was received."""
+    received = df['received_qty'].where(df['received_qty'] > 0)
+    df['wastage_rate'] = df['wasted_qty'] / received
+    return df
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+def get_wastage_analytics():
+    """Return the process-wide wastage analytics, building them on first use."""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            analytics = WastageAnalytics()
+            # Subscribe before loading; rows seen twice are skipped by id
+            dm.subscribe(analytics.apply)
+            analytics._synced = {table: shared_cache.generation(table) for table in ("stock_in", "wastage")}
+            analytics.load(shared_cache.table("stock_in"), shared_cache.table("wastage"))
+            _analytics = analytics
+        return _analytics